@@ -0,0 +1,760 @@
+"""
+Local stand-in for a Snowpark session used by the offline benchmarks.
+
+- session.sql(): the Snowflake dialect used in this repo is translated to SQLite and run
+  against an in-memory database holding the synthetic account (see synthetic.py).
+- session.table()/create_dataframe(): rows are processed in Python. Snowpark column
+  expressions are evaluated for the functions used by the crawler, including the ROW_NUMBER
+  and running SUM windows of the sample byte budget; anything else (UDF calls) evaluates to
+  NULL and, as in SQL, NULL filters drop the row. PCTG_NONNULL priorities are all NULL, so
+  'nonnull' sampling keeps rows in table order.
+- CALL ...CATALOG_TABLE / CATALOG_BATCH runs tables.generate_description(s) in process. Its statements and the
+  simulated Cortex COMPLETE latency make up the call duration, which is scheduled on a
+  virtual clock with limited warehouse concurrency, so the crawl polling loop never sleeps.
+- With failure_every, the first COMPLETE of one in failure_every prompts fails (COMPLETE raises,
+  TRY_COMPLETE returns NULL) so failed tasks and retry_failed runs can be measured.
+
+Every executed statement is counted in FakeSession.metrics.
+"""
+
+import datetime
+import functools
+import heapq
+import json
+import re
+import zlib
+
+import pandas as pd
+from snowflake.snowpark import Row
+
+try: # Client-side AST capture inspects the call stack for every column expression; a server would turn it off
+    from snowflake.snowpark._internal.utils import AstFlagSource, set_ast_state
+    set_ast_state(AstFlagSource.SERVER, False)
+except ImportError:
+    pass
+
+STRING_LITERAL = re.compile(r"('(?:[^'\\]|\\.|'')*')")
+INFORMATION_SCHEMA = re.compile(r'\b(\w+)\.INFORMATION_SCHEMA\.(TABLES|COLUMNS)\b', re.IGNORECASE)
+THREE_PART_NAME = re.compile(r'\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b')
+CALL_ARGUMENT = re.compile(r"(\w+)\s*=>\s*('(?:[^'\\]|\\.)*'|\[(?:'(?:[^'\\]|\\.)*'|[^\]'])*\]|[^,)\s]+)", re.DOTALL)
+ARRAY_ITEM = re.compile(r"'(?:[^'\\]|\\.)*'")
+
+# Latency factor of small Cortex models; one in SMALL_MODEL_UNCERTAIN of their answers is the uncertainty phrase
+SMALL_MODEL_FACTORS = {'mistral-7b': 0.3, 'llama3.1-8b': 0.3, 'llama3.2-3b': 0.2}
+SMALL_MODEL_UNCERTAIN = 10
+UNCERTAIN_RESPONSE = '確信をもってテーブルの説明を生成できません'
+
+
+class VirtualClock:
+    """Simulated time in seconds. Replaces time.sleep during a benchmark run."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class LatencyModel:
+    """Simulated costs in seconds for statements, procedure calls and Cortex COMPLETE."""
+
+    def __init__(self, query_s = 0.05, proc_start_s = 1.0, cortex_s = 0.8, cortex_s_per_kb = 0.02, concurrency = 8,
+                 cortex_parallelism = 8, parse_s_per_kb = 0.01):
+        self.query_s = query_s
+        self.parse_s_per_kb = parse_s_per_kb # Parsing/compiling statement text; bound values are not parsed
+        self.proc_start_s = proc_start_s
+        self.cortex_s = cortex_s
+        self.cortex_s_per_kb = cortex_s_per_kb
+        self.concurrency = concurrency
+        self.cortex_parallelism = cortex_parallelism # Rows completed concurrently by one set-based COMPLETE query
+
+    def complete(self, prompt_bytes, model = None):
+        return (self.cortex_s + self.cortex_s_per_kb * prompt_bytes / 1024) * SMALL_MODEL_FACTORS.get(model, 1)
+
+
+class FakeAsyncJob:
+    """AsyncJob returned by collect_nowait, done once the virtual clock reaches done_at."""
+
+    def __init__(self, session, rows, done_at, error = None):
+        self._session = session
+        self._rows = rows
+        self._error = error
+        self.done_at = done_at
+
+    def is_done(self):
+        return self._session.clock.now >= self.done_at
+
+    def result(self):
+        self._session.clock.now = max(self._session.clock.now, self.done_at)
+        if self._error is not None:
+            raise self._error
+        return self._rows
+
+
+class FakeQuery:
+    """Result of session.sql(). Statement runs when an action is called."""
+
+    def __init__(self, session, query, params):
+        self._session = session
+        self._query = query
+        self._params = params or []
+
+    def collect(self):
+        return self._session._execute(self._query, self._params)
+
+    def to_pandas(self):
+        rows = self._session._execute(self._query, self._params) # Not via collect(): one action per statement
+        columns = list(rows[0].asDict()) if rows else self._session._last_columns
+        return pd.DataFrame([list(r) for r in rows], columns = columns)
+
+    toPandas = to_pandas
+
+    def count(self):
+        return len(self._session._execute(self._query, self._params))
+
+    def collect_nowait(self):
+        return self._session._execute_async(self._query, self._params)
+
+
+class FakeWriter:
+    def __init__(self, df):
+        self._df = df
+
+    def save_as_table(self, table_name, mode = "append", column_order = "name", **kwargs):
+        session = self._df._session
+        name = table_name if isinstance(table_name, str) else '.'.join(table_name)
+        if mode == 'overwrite':
+            session._run_internal(f'DELETE FROM {session.quote_name(name)}')
+        rows = self._df._rows()
+        session._insert_rows(name, rows)
+        session._record(f'INSERT INTO {name}', len(rows))
+
+    saveAsTable = save_as_table
+
+
+class FakeDataFrame:
+    """Row-based stand-in for a Snowpark DataFrame. Transformations are applied lazily."""
+
+    def __init__(self, session, source, ops = ()):
+        self._session = session
+        self._source = source # callable returning list of dicts
+        self._ops = list(ops)
+
+    def _with(self, op):
+        return FakeDataFrame(self._session, self._source, self._ops + [op])
+
+    # Transformations
+    def filter(self, condition):
+        return self._with(('filter', condition))
+
+    where = filter
+
+    def select(self, *cols):
+        if len(cols) == 1 and isinstance(cols[0], (list, tuple)):
+            cols = cols[0]
+        return self._with(('select', list(cols)))
+
+    def with_column(self, name, col):
+        return self._with(('with_column', (name, col)))
+
+    withColumn = with_column
+
+    def join(self, right, on, how = 'inner', **kwargs):
+        """Inner hash join on equality of one expression of each side."""
+
+        def rows():
+            left_expr, right_expr = on._expression.children
+            index = {}
+            for r in right._rows():
+                index.setdefault(evaluate(right_expr, r), []).append(r)
+            return [{**l, **r} for l in self._rows() for r in index.get(evaluate(left_expr, l), [])]
+        return FakeDataFrame(self._session, rows)
+
+    def drop(self, *cols):
+        return self._with(('drop', [c if isinstance(c, str) else column_name(c) for c in cols]))
+
+    def sample(self, frac = None, n = None):
+        return self._with(('limit', n if n is not None else None))
+
+    def limit(self, n):
+        return self._with(('limit', n))
+
+    def sort(self, *cols, **kwargs):
+        return self
+
+    order_by = orderBy = sort
+
+    def __getitem__(self, name):
+        from snowflake.snowpark.functions import col
+        return col(name)
+
+    @property
+    def write(self):
+        return FakeWriter(self)
+
+    @property
+    def columns(self):
+        rows = self._rows()
+        return list(rows[0]) if rows else []
+
+    # Actions
+    def collect(self):
+        rows = self._rows()
+        self._session._record('SELECT', len(rows))
+        return [Row(**r) for r in rows]
+
+    def to_pandas(self):
+        rows = self._rows()
+        self._session._record('SELECT', len(rows))
+        return pd.DataFrame(rows)
+
+    toPandas = to_pandas
+
+    def count(self):
+        rows = self._rows()
+        self._session._record('SELECT COUNT(*)', 1)
+        return len(rows)
+
+    def cache_result(self):
+        rows = self._rows()
+        self._session._record('CREATE TEMPORARY TABLE', len(rows))
+        return FakeDataFrame(self._session, lambda: [dict(r) for r in rows])
+
+    def merge(self, source, join_expr, clauses, **kwargs):
+        """Upserts source rows into table on the first column named in join_expr."""
+
+        session = self._session
+        key = next(iter(attribute_names(join_expr._expression)))
+        rows = source._rows()
+        name = self._table_name
+        existing = {r[0] for r in session._run_internal(f'SELECT {key} FROM {session.quote_name(name)}')}
+        updated = [r for r in rows if r.get(key) in existing]
+        for r in updated:
+            assignments = ', '.join(f'{c} = ?' for c in r if c != key)
+            session._run_internal(f'UPDATE {session.quote_name(name)} SET {assignments} WHERE {key} = ?',
+                                  [v for c, v in r.items() if c != key] + [r[key]])
+        session._insert_rows(name, [r for r in rows if r.get(key) not in existing])
+        session._record(f'MERGE INTO {name}', len(rows))
+
+    def _rows(self):
+        rows = [dict(r) for r in self._source()]
+        for op, arg in self._ops:
+            if op == 'filter':
+                rows = [r for r in rows if evaluate(arg._expression, r) is True] # NULL condition drops row
+            elif op == 'select':
+                if any(contains_aggregate(c._expression) for c in arg if not isinstance(c, str)):
+                    rows = [{column_name(c): evaluate(c._expression, {}, rows) for c in arg}]
+                else:
+                    rows = [{name: value for name, value in project(arg, r)} for r in rows]
+            elif op == 'with_column':
+                name, col = arg
+                if type(col._expression).__name__ == 'WindowExpression':
+                    for r, value in zip(rows, evaluate_window(col._expression, rows)):
+                        r[name.upper()] = value
+                else:
+                    for r in rows:
+                        r[name.upper()] = evaluate(col._expression, r)
+            elif op == 'drop':
+                names = {n.strip('"').upper() for n in arg}
+                rows = [{k: v for k, v in r.items() if k not in names} for r in rows]
+            elif op == 'limit':
+                rows = rows[:arg]
+        return rows
+
+
+def unquote(name):
+    if name.startswith('"') and name.endswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name.upper()
+
+
+def column_name(col):
+    expr = col._expression
+    if type(expr).__name__ in ('Alias', 'UnresolvedAttribute'):
+        return unquote(expr.name)
+    return str(expr)
+
+
+def attribute_names(expr):
+    if type(expr).__name__ == 'UnresolvedAttribute':
+        yield unquote(expr.name)
+    for child in getattr(expr, 'children', None) or []:
+        yield from attribute_names(child)
+
+
+def contains_aggregate(expr):
+    if type(expr).__name__ == 'FunctionExpression' and expr.name.lower() == 'array_agg':
+        return True
+    return any(contains_aggregate(c) for c in getattr(expr, 'children', None) or [])
+
+
+def project(cols, row):
+    for c in cols:
+        if isinstance(c, str):
+            yield unquote(c) if c.startswith('"') else c.upper(), row.get(unquote(c))
+        else:
+            yield column_name(c), evaluate(c._expression, row)
+
+
+def to_json(value):
+    return value if isinstance(value, str) else json.dumps(value, default = str)
+
+
+SCALAR_FUNCTIONS = {
+    'substring': lambda s, start, length: None if s is None else str(s)[start - 1:start - 1 + length],
+    'to_json': lambda v: None if v is None else json.dumps(v, default = str),
+    'length': lambda s: None if s is None else len(s),
+    'iff': lambda c, a, b: a if c else b,
+    'to_variant': lambda v: v,
+    'to_char': lambda v: None if v is None else to_json(v),
+    'to_varchar': lambda v: None if v is None else to_json(v),
+    'array_slice': lambda a, start, end: None if a is None else list(a)[start:end],
+    'to_array': lambda v: None if v is None else (v if isinstance(v, list) else [v]),
+    'coalesce': lambda *a: next((v for v in a if v is not None), None),
+}
+
+COMPARISONS = {
+    'EqualTo': lambda a, b: a == b,
+    'NotEqualTo': lambda a, b: a != b,
+    'LessThan': lambda a, b: a < b,
+    'LessThanOrEqual': lambda a, b: a <= b,
+    'GreaterThan': lambda a, b: a > b,
+    'GreaterThanOrEqual': lambda a, b: a >= b,
+}
+
+ARITHMETIC = {
+    'Add': lambda a, b: a + b,
+    'Subtract': lambda a, b: a - b,
+    'Multiply': lambda a, b: a * b,
+    'Divide': lambda a, b: a / b if b else None,
+}
+
+
+def evaluate(expr, row, rows = None):
+    """Evaluates Snowpark expression on row dict. Unsupported expressions evaluate to None."""
+
+    kind = type(expr).__name__
+    children = getattr(expr, 'children', None) or []
+    if kind == 'Alias':
+        return evaluate(expr.child, row, rows)
+    if kind == 'UnresolvedAttribute':
+        return row.get(unquote(expr.name))
+    if kind == 'Literal':
+        return expr.value
+    if kind in COMPARISONS:
+        left, right = (evaluate(c, row, rows) for c in children)
+        return None if left is None or right is None else COMPARISONS[kind](left, right)
+    if kind in ARITHMETIC:
+        left, right = (evaluate(c, row, rows) for c in children)
+        return None if left is None or right is None else ARITHMETIC[kind](left, right)
+    if kind in ('And', 'Or'):
+        left, right = (evaluate(c, row, rows) for c in children)
+        if kind == 'And':
+            return False if False in (left, right) else (None if None in (left, right) else True)
+        return True if True in (left, right) else (None if None in (left, right) else False)
+    if kind in ('IsNull', 'IsNotNull'):
+        return (evaluate(children[0], row, rows) is None) == (kind == 'IsNull')
+    if kind == 'Not':
+        value = evaluate(children[0], row, rows)
+        return None if value is None else not value
+    if kind == 'WithinGroup':
+        return evaluate(children[0], row, rows)
+    if kind == 'FunctionExpression':
+        name = expr.name.lower()
+        if name == 'object_construct' and children and type(children[0]).__name__ == 'Star':
+            return {k: v for k, v in row.items() if v is not None}
+        if name == 'array_agg':
+            return [evaluate(children[0], r) for r in rows or []]
+        if name in SCALAR_FUNCTIONS:
+            return SCALAR_FUNCTIONS[name](*(evaluate(c, row, rows) for c in children))
+    return None
+
+
+def evaluate_window(expr, rows):
+    """Returns values of window expression for rows, in row order.
+
+    Supports ROW_NUMBER and a running SUM over the ORDER BY of the window (ties are ordered by input,
+    as in a ROWS frame); without ORDER BY, SUM is the total. Partitions are not supported.
+    Other window functions evaluate to None.
+    """
+
+    def compare(a, b):
+        for order in expr.window_spec.order_spec:
+            x, y = evaluate(order.child, a), evaluate(order.child, b)
+            if x == y:
+                continue
+            if x is None or y is None: # NULLS LAST
+                return 1 if x is None else -1
+            descending = type(order.direction).__name__ == 'Descending'
+            return (-1 if x < y else 1) * (-1 if descending else 1)
+        return 0
+
+    function = expr.window_function
+    name = function.name.lower() if type(function).__name__ == 'FunctionExpression' else ''
+    ordered = sorted(range(len(rows)), key = functools.cmp_to_key(lambda i, j: compare(rows[i], rows[j])))
+    values = [None] * len(rows)
+    if name == 'row_number':
+        for rank, i in enumerate(ordered, 1):
+            values[i] = rank
+    elif name == 'sum':
+        terms = [evaluate(function.children[0], r) for r in rows]
+        if not expr.window_spec.order_spec:
+            total = sum(t for t in terms if t is not None)
+            return [total] * len(rows)
+        running = 0
+        for i in ordered:
+            running += terms[i] or 0
+            values[i] = running
+    return values
+
+
+class FakeSession:
+    """Snowpark session stand-in backed by SQLite. See module docstring."""
+
+    def __init__(self, connection, latency = None, data_rows = None, failure_every = 0):
+        self.connection = connection
+        self.failure_every = failure_every
+        self._failed_prompts = set() # Prompts whose first COMPLETE failed; they succeed when retried
+        self.latency = latency or LatencyModel()
+        self.clock = VirtualClock()
+        self.data_rows = data_rows # callable(tablename) -> list of row dicts for synthetic tables
+        self.metrics = {'queries': 0, 'rows': 0, 'statement_bytes': 0, 'param_bytes': 0, 'prompt_bytes': 0,
+                        'cortex_calls': 0, 'describes': 0}
+        self.call_metrics = {'calls': 0, 'statement_bytes': 0, 'param_bytes': 0, 'submit_s': 0.0} # CALLs submitted
+        self.model_metrics = {} # model -> {'calls', 'cortex_s'}
+        self._slots = [0.0] * self.latency.concurrency
+        self._call_elapsed = None # Duration of CATALOG_TABLE call being simulated
+        self._last_columns = []
+        self._query_tag = None
+        register_functions(connection)
+
+    # Snowpark API
+    def sql(self, query, params = None):
+        return FakeQuery(self, query, params)
+
+    def table(self, name):
+        name = name if isinstance(name, str) else '.'.join(name)
+        if self._is_table(name):
+            df = FakeDataFrame(self, lambda: self._table_rows(name))
+        else:
+            df = FakeDataFrame(self, lambda: self.data_rows(name))
+        df._table_name = name
+        return df
+
+    def create_dataframe(self, data, schema = None):
+        if isinstance(data, pd.DataFrame):
+            rows = data.to_dict('records')
+        else:
+            names = schema.names if hasattr(schema, 'names') else schema # StructType or list of names
+            rows = [dict(zip([s.upper() for s in names], r)) for r in data]
+        return FakeDataFrame(self, lambda: [dict(r) for r in rows])
+
+    createDataFrame = create_dataframe
+
+    @property
+    def query_tag(self):
+        return self._query_tag
+
+    @query_tag.setter
+    def query_tag(self, tag): # Snowpark issues ALTER SESSION for each change
+        self._query_tag = tag
+        self._record(f"ALTER SESSION SET QUERY_TAG = '{tag}'", 0)
+
+    # Accounting
+    def elapse(self, seconds):
+        if self._call_elapsed is not None:
+            self._call_elapsed += seconds
+        else:
+            self.clock.now += seconds
+
+    def _record(self, query, rows, params = None):
+        statement_bytes = len(query.encode())
+        self.metrics['queries'] += 1
+        self.metrics['rows'] += rows
+        self.metrics['statement_bytes'] += statement_bytes
+        self.metrics['param_bytes'] += sum(len(str(p).encode()) for p in params or [])
+        self.elapse(self.latency.query_s + self.latency.parse_s_per_kb * statement_bytes / 1024)
+
+    # Statement execution
+    def quote_name(self, name):
+        return '"' + '.'.join(p.strip('"').upper() for p in name.split('.')) + '"'
+
+    def _is_table(self, name):
+        return bool(self._run_internal("SELECT 1 FROM sqlite_master WHERE name = ?", [self.quote_name(name).strip('"')]))
+
+    def _table_rows(self, name):
+        cursor = self.connection.execute(f'SELECT * FROM {self.quote_name(name)}')
+        columns = [d[0].upper() for d in cursor.description]
+        return [dict(zip(columns, r)) for r in cursor.fetchall()]
+
+    def _insert_rows(self, name, rows):
+        for r in rows:
+            self._run_internal(f'INSERT INTO {self.quote_name(name)} ({", ".join(r)}) VALUES ({", ".join("?" * len(r))})',
+                               [to_json(v) if isinstance(v, (list, dict)) else v for v in r.values()])
+
+    def _run_internal(self, query, params = ()):
+        return self.connection.execute(query, params).fetchall()
+
+    def _execute(self, query, params):
+        statement = query.strip().rstrip(';').strip()
+        head = statement[:30].upper()
+        if head.startswith('CALL'):
+            rows, done_at = self._call(statement, params)
+            self.clock.now = max(self.clock.now, done_at)
+            return rows
+        if head.startswith('EXECUTE IMMEDIATE'): # Comment blocks; every statement succeeds
+            rows = [Row('[]')]
+        elif head.startswith('SHOW DATABASES'):
+            rows = [Row(name = r[0]) for r in self._run_internal('SELECT DATABASE_NAME FROM "SNOWFLAKE.ACCOUNT_USAGE.DATABASES"')]
+        elif head.startswith('DESCRIBE TABLE'):
+            self.metrics['describes'] += 1
+            rows = self._describe(statement.split()[2])
+        elif 'CORTEX.COMPLETE(' in statement.upper():
+            rows = [Row(RESPONSE = self._complete_json(*params[:2]))]
+        elif 'CORTEX.TRY_COMPLETE' in statement.upper() and head.startswith('INSERT'):
+            rows = self._column_complete(statement.split()[2], *params)
+        elif 'CORTEX.TRY_COMPLETE' in statement.upper():
+            rows = self._batch_complete(*params)
+        elif 'AS WATERMARK' in statement.upper():
+            rows = self._watermarks()
+        elif 'ACCESS_HISTORY' in statement.upper() and 'DAY_OF_WEEK' not in statement.upper():
+            rows = self._access_counts(*params)
+        elif 'ACCESS_HISTORY' in statement.upper():
+            rows = self._access_history(statement, params)
+        else:
+            cursor = self.connection.execute(translate(statement), params)
+            self._last_columns = [d[0].upper() for d in cursor.description] if cursor.description else []
+            rows = [Row(**dict(zip(self._last_columns, r))) for r in cursor.fetchall()]
+        self._record(query, len(rows), params)
+        return rows
+
+    def _execute_async(self, query, params):
+        statement = query.strip()
+        if statement[:4].upper() == 'CALL':
+            submitted = self.clock.now
+            self._record(query, 0, params)
+            self.call_metrics['calls'] += 1
+            self.call_metrics['statement_bytes'] += len(query.encode())
+            self.call_metrics['param_bytes'] += sum(len(str(p).encode()) for p in params or [])
+            self.call_metrics['submit_s'] += self.clock.now - submitted
+            try:
+                rows, done_at = self._call(statement, params)
+                return FakeAsyncJob(self, rows, done_at)
+            except Exception as e:
+                return FakeAsyncJob(self, None, self.clock.now, e)
+        return FakeAsyncJob(self, self._execute(query, params), self.clock.now)
+
+    def _describe(self, tablename):
+        database, schema, table = (p.strip('"') for p in tablename.split('.'))
+        return [Row(name = r[0], type = r[1]) for r in self._run_internal(
+            'SELECT COLUMN_NAME, DATA_TYPE FROM "INFORMATION_SCHEMA.COLUMNS" '
+            'WHERE TABLE_CATALOG = ? AND TABLE_SCHEMA = ? AND TABLE_NAME = ? ORDER BY ORDINAL_POSITION',
+            [database, schema, table])]
+
+    def _access_history(self, statement, params):
+        database = re.search(r"LIKE\s+'([^'%.]+)\.%'", statement)
+        cursor = self.connection.execute("""
+            SELECT ACCESS_DATE, DAY_OF_WEEK, HOUR_OF_DAY, OBJ_NAME AS TABLE_FULL_NAME, COUNT(DISTINCT QUERY_ID) AS ACCESS_COUNT
+            FROM "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY"
+            WHERE OBJ_DOMAIN = 'Table' AND OBJ_NAME LIKE ?
+            GROUP BY 1, 2, 3, 4
+            ORDER BY ACCESS_DATE
+            """, [f'{database.group(1)}.%' if database else '%'])
+        self._last_columns = [d[0].upper() for d in cursor.description]
+        return [Row(**dict(zip(self._last_columns, r))) for r in cursor.fetchall()]
+
+    def _access_counts(self, days, prefix):
+        """Crawl priority of main.py: distinct queries per table (synthetic history spans one month, days ignored)."""
+
+        return [Row(TABLENAME = name, ACCESS_COUNT = count) for name, count in self._run_internal("""
+            SELECT OBJ_NAME, COUNT(DISTINCT QUERY_ID) FROM "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY"
+            WHERE OBJ_DOMAIN = 'Table' AND OBJ_NAME LIKE ?
+            GROUP BY 1
+            """, [prefix])]
+
+    def _watermarks(self):
+        """Cache watermarks of catalog.py: per database tables/catalog high-water marks and latest access."""
+        rows = self._run_internal("""
+            SELECT 'tables', TABLE_CATALOG, MAX(LAST_ALTERED) || '/' || COUNT(*) FROM "INFORMATION_SCHEMA.TABLES" GROUP BY 2
+            UNION ALL
+            SELECT 'catalog', SUBSTR(TABLENAME, 1, INSTR(TABLENAME, '.') - 1), MAX(CREATED_ON)
+            FROM "DATA_CATALOG.TABLE_CATALOG.TABLE_CATALOG" GROUP BY 2
+            UNION ALL
+            SELECT 'usage', NULL, MAX(ACCESS_DATE) FROM "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY"
+            """)
+        return [Row(KIND = kind, NAME = name, WATERMARK = watermark) for kind, name, watermark in rows]
+
+    def _batch_complete(self, model, prompts):
+        """Set-based TRY_COMPLETE over JSON list of PROMPT and key columns; rows run cortex_parallelism at a time."""
+
+        latencies, rows = [], []
+        call_elapsed, self._call_elapsed = self._call_elapsed, 0.0
+        for p in json.loads(prompts):
+            self._call_elapsed = 0.0
+            rows.append(Row(**{k: v for k, v in p.items() if k != 'PROMPT' and isinstance(v, str)},
+                            RESPONSE = self.complete(model, p['PROMPT'])))
+            latencies.append(self._call_elapsed)
+        self._call_elapsed = call_elapsed
+        self.elapse(max(max(latencies, default = 0), sum(latencies) / self.latency.cortex_parallelism))
+        return rows
+
+    def _column_complete(self, tablename, model, prompts):
+        """INSERT of COLUMN_CATALOG: one set-based TRY_COMPLETE per table describing all its columns."""
+
+        responses = {r['TABLENAME']: r['RESPONSE'] for r in self._batch_complete(model, prompts)}
+        rows = [{'TABLENAME': p['TABLENAME'], 'COLUMN_NAME': name, 'DATA_TYPE': data_type,
+                 'DESCRIPTION': responses[p['TABLENAME']], 'CREATED_ON': self.clock.now}
+                for p in json.loads(prompts) for name, data_type in p['COLUMNS']]
+        self._insert_rows(tablename, rows)
+        return [Row(**{'number of rows inserted': len(rows)})]
+
+    def _call(self, statement, params = None):
+        """Runs CATALOG_TABLE/CATALOG_BATCH in process and returns its rows and simulated completion time.
+
+        Arguments are literals or ? bound in order from params (PARSE_JSON(?) decodes a JSON array).
+        """
+
+        import tables
+
+        procedure = statement.split('(')[0].split()[-1].split('.')[-1].upper()
+        params = iter(params or [])
+        args = {}
+        for name, value in CALL_ARGUMENT.findall(statement):
+            if '?' in value:
+                bound = next(params)
+                args[name.lower()] = json.loads(bound) if value.upper().startswith('PARSE_JSON') else bound
+            else:
+                args[name.lower()] = unescape(value)
+        if procedure not in ('CATALOG_TABLE', 'CATALOG_BATCH'):
+            raise NotImplementedError(f'Procedure {procedure} is not simulated')
+        self._call_elapsed = self.latency.proc_start_s
+        try:
+            if procedure == 'CATALOG_BATCH':
+                result = tables.generate_descriptions(self,
+                                                      args['tablenames'],
+                                                      args['prompts'],
+                                                      args.get('sampling_mode', 'fast'),
+                                                      int(args.get('n', 5)),
+                                                      args.get('model', 'mistral-large2'),
+                                                      args.get('column_types'))
+            else:
+                result = tables.generate_description(self,
+                                                     args['tablename'],
+                                                     args['prompt'],
+                                                     args.get('sampling_mode', 'fast'),
+                                                     int(args.get('n', 5)),
+                                                     args.get('model', 'mistral-large2'),
+                                                     args.get('update_comment', 'TRUE').upper() == 'TRUE',
+                                                     args.get('column_types', ''))
+            duration = self._call_elapsed
+        finally:
+            self._call_elapsed = None
+        start = max(self.clock.now, heapq.heappop(self._slots))
+        heapq.heappush(self._slots, start + duration)
+        return [Row(**{procedure: json.dumps(result)})], start + duration
+
+    # Cortex
+    def _complete_json(self, model, prompt):
+        """COMPLETE with options: JSON with choices and token usage (about 4 bytes per token)."""
+        response = self.complete(model, prompt)
+        if response is None:
+            raise RuntimeError('Simulated COMPLETE failure')
+        tokens = (len(str(prompt).encode()) + len(response.encode())) // 4
+        return json.dumps({'choices': [{'messages': response}], 'usage': {'total_tokens': tokens}})
+
+    def complete(self, model, prompt):
+        prompt_bytes = len(str(prompt).encode())
+        self.metrics['cortex_calls'] += 1
+        self.metrics['prompt_bytes'] += prompt_bytes
+        seconds = self.latency.complete(prompt_bytes, model)
+        self.elapse(seconds)
+        stats = self.model_metrics.setdefault(model, {'calls': 0, 'cortex_s': 0.0})
+        stats['calls'] += 1
+        stats['cortex_s'] += seconds
+        key = zlib.crc32(str(prompt).encode())
+        if self.failure_every and key % self.failure_every == 0 and key not in self._failed_prompts:
+            self._failed_prompts.add(key)
+            return None
+        if model in SMALL_MODEL_FACTORS and zlib.crc32(str(prompt).encode()) % SMALL_MODEL_UNCERTAIN == 0:
+            return UNCERTAIN_RESPONSE
+        return f'{model} による説明文'
+
+
+def unescape(value):
+    if value.startswith('['): # Array constant of string literals
+        return [unescape(item) for item in ARRAY_ITEM.findall(value)]
+    if value.startswith("'") and value.endswith("'"):
+        return value[1:-1].replace("\\'", "'")
+    return value
+
+
+def translate(query):
+    """Rewrites Snowflake SQL used in this repo into SQLite."""
+
+    parts = STRING_LITERAL.split(query)
+    for i in range(0, len(parts), 2): # Even parts are outside string literals
+        part = parts[i]
+        part = re.sub(r'::\w+', '', part)
+        part = re.sub(r'TABLE\(FLATTEN\(INPUT\s*=>\s*PARSE_JSON\(\?\)\)\)', 'json_each(?)', part, flags = re.IGNORECASE)
+        part = re.sub(r'\b((?:\w+\.)?value):(\w+)', r"json_extract(\1, '$.\2')", part, flags = re.IGNORECASE)
+        part = re.sub(r'CURRENT_TIMESTAMP\(\)', 'CURRENT_TIMESTAMP', part, flags = re.IGNORECASE)
+        part = re.sub(r'WITHIN\s+GROUP\s*\(\s*ORDER\s+BY[^)]*\)', '', part, flags = re.IGNORECASE)
+        part = INFORMATION_SCHEMA.sub(lambda m: f'(SELECT * FROM "INFORMATION_SCHEMA.{m.group(2).upper()}" '
+                                                f"WHERE TABLE_CATALOG = '{m.group(1).upper()}')", part)
+        part = THREE_PART_NAME.sub(lambda m: '"' + '.'.join(g.upper() for g in m.groups()) + '"', part)
+        parts[i] = part
+    return ''.join(parts)
+
+
+class ListAgg:
+    def __init__(self):
+        self.values, self.separator = [], ''
+
+    def step(self, value, separator = ''):
+        self.separator = separator
+        if value is not None:
+            self.values.append(str(value))
+
+    def finalize(self):
+        return self.separator.join(self.values)
+
+
+class ArrayAgg:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(json.loads(value) if isinstance(value, str) and value[:1] in '[{' else value)
+
+    def finalize(self):
+        return json.dumps(self.values)
+
+
+@functools.lru_cache(maxsize = 8)
+def parse_array(value):
+    return frozenset(v if isinstance(v, (str, int, float)) else json.dumps(v) for v in json.loads(value))
+
+
+def dateadd(part, value, timestamp):
+    """DATEADD with quoted date part over SQLite CURRENT_TIMESTAMP strings."""
+    if value is None or timestamp is None:
+        return None
+    shifted = datetime.datetime.fromisoformat(str(timestamp)) + datetime.timedelta(**{part.lower() + 's': value})
+    return shifted.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def register_functions(connection):
+    connection.create_function('STARTSWITH', 2, lambda s, p: None if s is None else int(s.startswith(p)))
+    connection.create_function('REGEXP_REPLACE', 3, lambda s, p, r: None if s is None else re.sub(p, r, s))
+    connection.create_function('CONCAT', -1, lambda *a: None if None in a else ''.join(str(x) for x in a))
+    connection.create_function('IFF', 3, lambda c, a, b: a if c else b)
+    connection.create_function('PARSE_JSON', 1, lambda s: s)
+    connection.create_function('ARRAY_CONSTRUCT', -1, lambda *a: json.dumps(list(a)))
+    connection.create_function('ARRAY_CONTAINS', 2, lambda v, a: int(v in parse_array(a)))
+    connection.create_function('DATEADD', 3, dateadd)
+    connection.create_function('POWER', 2, lambda x, y: None if x is None or y is None else x ** y)
+    connection.create_function('LEAST', -1, lambda *a: None if None in a else min(a))
+    connection.create_function('GREATEST', -1, lambda *a: None if None in a else max(a))
+    connection.create_aggregate('LISTAGG', 2, ListAgg)
+    connection.create_aggregate('ARRAY_AGG', 1, ArrayAgg)
@@ -0,0 +1,385 @@
+"""
+Offline benchmark of the crawl pipeline and the Streamlit data loaders.
+
+Runs main.run_table_catalog and the catalog.py data loaders against a FakeSession over a
+synthetic account for each scale and reports per stage: calls, wall time, simulated time,
+statement count, rows fetched, statement/prompt bytes and peak Python memory, plus the size of the
+catalog and usage frames held by the app against their object-dtype equivalent. The first
+render of catalog.py and a rerender after its watermark TTL are checked against the page
+budget in streamlit/query_stats.py, import time of the procedure handler modules
+against HANDLER_IMPORT_BUDGET_MS, and sample_tbl for one statement per table and no DESCRIBE.
+
+    python benchmarks/run_benchmarks.py --scales 10,1000,50000
+
+Requires pandas and snowflake-snowpark-python (no connection is opened).
+"""
+
+import argparse
+import ast
+import contextlib
+import functools
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'streamlit'))
+
+import pandas as pd
+
+import synthetic
+from fake_session import FakeSession, LatencyModel
+from query_stats import CountingSession, QueryStats, QueryBudgetExceeded, check_budget
+
+# Functions timed as stages: (module, attribute). Nested stages are counted inclusively.
+CRAWL_STAGES = [
+    ('main', 'run_table_catalog'),
+    ('tables', 'get_crawlable_tbls'),
+    ('tables', 'get_all_tables'),
+    ('tables', 'generate_description'),
+    ('tables', 'generate_descriptions'),
+    ('tables', 'sample_tbl'),
+    ('tables', 'add_records_to_catalog'),
+    ('tables', 'apply_comments'),
+    ('columns', 'catalog_columns'),
+    ('columns', 'copy_cluster_columns'),
+    ('schemas', 'add_schema_summaries'),
+    ('routing', 'write_routes'),
+    ('runs', 'start_run'),
+    ('runs', 'complete_tasks'),
+    ('runs', 'finish_run'),
+    ('runs', 'write_spans'),
+]
+HANDLER_MODULES = ['tables', 'runs', 'prompts'] # Imported by CATALOG_TABLE/CATALOG_BATCH on every call
+HANDLER_IMPORT_BUDGET_MS = 100
+LOADERS = ['get_watermarks', 'catalog_watermark', 'usage_watermark', 'get_snapshot', 'get_catalog_slice',
+           'get_usage_delta', 'get_snapshot_usage', 'get_usage_slice', 'get_databases', 'get_table_catalog',
+           'get_all_table_catalogs', 'get_table_usage_stats', 'get_all_usage_stats']
+METRICS = ['queries', 'rows', 'statement_bytes', 'param_bytes', 'prompt_bytes', 'describes']
+
+
+class StageRecorder:
+    """Accumulates wall time, simulated time, session metrics and peak memory per stage."""
+
+    def __init__(self, session, memory = True):
+        self.session = session
+        self.memory = memory
+        self.stages = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        before = dict(self.session.metrics)
+        frame = {'peak': 0}
+        if self.memory:
+            self._propagate_peak()
+        self._stack.append(frame)
+        start, sim_start = time.perf_counter(), self.session.clock.now
+        try:
+            yield
+        finally:
+            wall, sim = time.perf_counter() - start, self.session.clock.now - sim_start
+            self._stack.pop()
+            if self.memory:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+            stats = self.stages.setdefault(name, dict({'calls': 0, 'wall_s': 0.0, 'sim_s': 0.0, 'peak_mb': 0.0},
+                                                      **{m: 0 for m in METRICS}))
+            stats['calls'] += 1
+            stats['wall_s'] += wall
+            stats['sim_s'] += sim
+            stats['peak_mb'] = max(stats['peak_mb'], frame['peak'] / 2 ** 20)
+            for m in METRICS:
+                stats[m] += self.session.metrics[m] - before[m]
+
+    def _propagate_peak(self):
+        """Folds peak memory reached so far into enclosing stage before a nested stage resets it."""
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class StreamlitShim:
+    """Minimal st namespace so catalog.py loaders run outside Streamlit.
+
+    cache_data memoizes on the repr of the arguments and ignores ttl/max_entries; expiry is
+    simulated by calling clear() on a loader, as st.cache_data does.
+    """
+
+    def cache_data(self, fn = None, **kwargs):
+        def decorate(f):
+            cache = {}
+
+            @functools.wraps(f)
+            def wrapper(*args, **kw):
+                key = repr((args, sorted(kw.items())))
+                if key not in cache:
+                    cache[key] = f(*args, **kw)
+                return cache[key]
+            wrapper.clear = cache.clear
+            return wrapper
+        return decorate(fn) if callable(fn) else decorate
+
+    def error(self, message):
+        raise RuntimeError(message)
+
+
+def load_loaders(session, names = LOADERS, path = os.path.join(ROOT, 'streamlit', 'catalog.py')):
+    """Returns namespace with data loader functions and constants of catalog.py bound to session."""
+
+    with open(path, encoding = 'utf-8') as f:
+        tree = ast.parse(f.read())
+    namespace = {'st': StreamlitShim(), 'session': session, 'pd': pd}
+    constants = [node for node in tree.body if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)
+                 and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets)]
+    body = constants + [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in names]
+    exec(compile(ast.Module(body = body, type_ignores = []), path, 'exec'), namespace)
+    return namespace
+
+
+def frame_memory(frame):
+    """Returns (MB of frame, MB of same frame with object strings and int64 numbers) by memory_usage(deep=True)."""
+
+    expanded = frame.astype({c: object if isinstance(t, pd.CategoricalDtype) else 'int64'
+                             for c, t in frame.dtypes.items()
+                             if isinstance(t, pd.CategoricalDtype) or pd.api.types.is_integer_dtype(t)})
+    return tuple(float(f.memory_usage(deep = True).sum()) / 2 ** 20 for f in (frame, expanded))
+
+
+def crawl_arguments(args):
+    """Keyword arguments of DATA_CATALOG call used for benchmark run."""
+
+    return dict(target_database = 'BENCH_DB',
+                catalog_database = 'DATA_CATALOG',
+                catalog_schema = 'TABLE_CATALOG',
+                catalog_table = 'TABLE_CATALOG',
+                target_schema = '',
+                include_tables = None,
+                exclude_tables = None,
+                replace_catalog = True,
+                sampling_mode = 'fast',
+                update_comment = True,
+                n = 5,
+                model = 'mistral-large2',
+                resume_run_id = '',
+                prompt_template = args.prompt_template,
+                comment_dry_run = False,
+                run_id = '',
+                engine = args.engine,
+                batch_size = args.batch_size,
+                column_catalog = not args.no_column_catalog,
+                schema_summary = args.schema_summary,
+                small_model = args.small_model,
+                small_max_columns = args.small_max_columns,
+                cluster_shards = not args.no_cluster_shards,
+                retry_failed = False,
+                max_attempts = 3,
+                max_tables = args.max_tables,
+                max_prompt_tokens = args.max_prompt_tokens,
+                max_runtime_s = args.max_runtime_s)
+
+
+def run_scale(n_tables, args):
+    import main
+    import runs
+
+    connection = synthetic.build_account(n_tables, tables_per_schema = args.tables_per_schema,
+                                         accesses_per_table = args.accesses_per_table, shard_size = args.shard_size)
+    latency = LatencyModel(query_s = args.query_latency_ms / 1000,
+                           proc_start_s = args.proc_start_ms / 1000,
+                           cortex_s = args.cortex_latency_ms / 1000,
+                           parse_s_per_kb = args.parse_ms_per_kb / 1000,
+                           concurrency = args.concurrency)
+    session = FakeSession(connection, latency, synthetic.row_generator(connection), failure_every = args.failure_every)
+    recorder = StageRecorder(session, memory = not args.no_memory)
+    if recorder.memory:
+        tracemalloc.start()
+
+    patches = [mock.patch('time.sleep', session.clock.sleep)]
+    if args.failure_every: # Failed tables due for retry at once
+        patches.append(mock.patch.object(runs, 'RETRY_BACKOFF_S', 0))
+    for module, attribute in CRAWL_STAGES:
+        target = sys.modules.get(module) or __import__(module)
+        patches.append(mock.patch.object(target, attribute, recorder.wrap(attribute, getattr(target, attribute))))
+    with contextlib.ExitStack() as stack:
+        for p in patches:
+            stack.enter_context(p)
+        main.run_table_catalog(session, **crawl_arguments(args))
+        submitted = dict(session.call_metrics)
+        status, reason = connection.execute('SELECT STATUS, STOP_REASON FROM "DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS" '
+                                            'ORDER BY rowid LIMIT 1').fetchone()
+        if status == 'STOPPED': # Share of accesses covered by tables cataloged within budget
+            cataloged, covered, total = connection.execute('''
+                SELECT COUNT(DISTINCT t.TABLENAME),
+                       (SELECT COUNT(*) FROM "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY" a
+                        WHERE a.OBJ_NAME IN (SELECT TABLENAME FROM "DATA_CATALOG.TABLE_CATALOG.TABLE_CATALOG")),
+                       (SELECT COUNT(*) FROM "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY")
+                FROM "DATA_CATALOG.TABLE_CATALOG.TABLE_CATALOG" t''').fetchone()
+            recorder.stages['run_table_catalog']['stopped'] = {'reason': reason, 'cataloged': cataloged,
+                                                               'accesses': covered / total if total else 0.0}
+        if args.failure_every: # Retry queue of tables failed above
+            tasks = '"DATA_CATALOG.TABLE_CATALOG.CRAWL_TASKS"'
+            failed = connection.execute(f"SELECT COUNT(*) FROM {tasks} WHERE STATUS = 'FAILED'").fetchone()[0]
+            with recorder.stage('retry_failed'):
+                main.run_table_catalog.__wrapped__(session, **dict(crawl_arguments(args), retry_failed = True))
+            retry_run = connection.execute('SELECT RUN_ID FROM "DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS" '
+                                           'ORDER BY rowid DESC LIMIT 1').fetchone()[0]
+            retried = dict(connection.execute(f'SELECT STATUS, COUNT(*) FROM {tasks} WHERE RUN_ID = ? GROUP BY 1',
+                                              [retry_run]).fetchall())
+            recorder.stages['retry_failed']['retry'] = {'failed': failed, 'retried': sum(retried.values()),
+                                                        'still_failed': retried.get('FAILED', 0)}
+
+        # First (uncached) render of catalog.py counted against its page budget
+        first_stats = QueryStats('catalog')
+        loaders = load_loaders(CountingSession(session, first_stats))
+        for name in LOADERS:
+            loaders[name] = recorder.wrap(f'catalog.{name}', loaders[name])
+        render = lambda: (loaders['get_databases'](),
+                          loaders['get_all_table_catalogs'](loaders['get_watermarks']()),
+                          loaders['get_all_usage_stats'](loaders['get_watermarks']()))
+        with recorder.stage('catalog (loaders)'):
+            _, catalog, usage = render()
+        recorder.stages['catalog (loaders)']['frames'] = {'catalog': frame_memory(catalog),
+                                                          'usage': frame_memory(usage)}
+
+        # Rerender after WATERMARK_TTL: only the watermark statement runs while nothing changed
+        loaders['get_watermarks'].clear()
+        rerender_stats = QueryStats('catalog')
+        loaders['session'] = CountingSession(session, rerender_stats)
+        with recorder.stage('catalog (rerender)'):
+            render()
+
+    if recorder.memory:
+        tracemalloc.stop()
+    # Per model Cortex usage and routing outcomes of crawl
+    models = {model: dict(stats, outcomes = {}) for model, stats in session.model_metrics.items()}
+    for model, outcome, count in connection.execute(
+            'SELECT MODEL, OUTCOME, COUNT(*) FROM "DATA_CATALOG.TABLE_CATALOG.CRAWL_ROUTES" GROUP BY 1, 2'):
+        models.setdefault(model, {'calls': 0, 'cortex_s': 0.0, 'outcomes': {}})['outcomes'][outcome] = count
+    recorder.stages['run_table_catalog']['models'] = models
+    recorder.stages['run_table_catalog']['submitted'] = submitted
+    for name, stats in [('catalog (loaders)', first_stats), ('catalog (rerender)', rerender_stats)]:
+        try:
+            check_budget(stats)
+            budget = 'ok'
+        except QueryBudgetExceeded as e:
+            budget = str(e)
+        recorder.stages[name]['budget'] = budget
+    return recorder.stages
+
+
+def measure_handler_imports(repeat = 3):
+    """Returns best wall time in ms of importing procedure handler modules in a fresh interpreter."""
+
+    code = ('import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); '
+            f'import {", ".join(HANDLER_MODULES)}; print((time.perf_counter() - start) * 1000)')
+    timings = [float(subprocess.run([sys.executable, '-c', code, os.path.join(ROOT, 'src')],
+                                    capture_output = True, text = True, check = True).stdout)
+               for _ in range(repeat)]
+    return min(timings)
+
+
+def sampling_budget(stats):
+    """Returns 'ok' if sample_tbl issued one statement per table and no DESCRIBE, else what was exceeded."""
+
+    if stats['queries'] > stats['calls'] or stats['describes']:
+        return (f"{stats['queries']:,} statements for {stats['calls']:,} tables, "
+                f"{stats['describes']:,} DESCRIBE in sample_tbl")
+    return 'ok'
+
+
+def report(results):
+    columns = ['calls', 'wall_s', 'sim_s', 'queries', 'rows', 'statement_bytes', 'param_bytes', 'prompt_bytes', 'peak_mb']
+    for n_tables, stages in results.items():
+        crawl = stages['run_table_catalog']
+        print(f'\n== {n_tables} tables ({n_tables / crawl["sim_s"]:.2f} tables per simulated second) ==')
+        print(f'{"stage":<32}' + ''.join(f'{c:>16}' for c in columns))
+        for name, stats in stages.items():
+            cells = [f'{stats[c]:>16.2f}' if isinstance(stats[c], float) else f'{stats[c]:>16,}' for c in columns]
+            print(f'{name:<32}' + ''.join(cells))
+            if 'stopped' in stats:
+                r = stats['stopped']
+                print(f'{"":<32}stopped by {r["reason"]}: {r["cataloged"]:,} tables cataloged, '
+                      f'{r["accesses"]:.1%} of accesses covered')
+            if 'retry' in stats:
+                r = stats['retry']
+                print(f'{"":<32}failed tasks: {r["failed"]:,}, retried: {r["retried"]:,}, still failed: {r["still_failed"]:,}')
+            if 'budget' in stats:
+                print(f'{"":<32}page budget: {stats["budget"]}')
+            if name == 'sample_tbl':
+                print(f'{"":<32}sampling budget: {sampling_budget(stats)}')
+            for model, m in stats.get('models', {}).items():
+                outcomes = ', '.join(f'{o}={c:,}' for o, c in sorted(m['outcomes'].items()))
+                print(f'{"":<32}{model}: {m["calls"]:,} completions, {m["cortex_s"]:.1f} cortex s ({outcomes})')
+            if stats.get('submitted', {}).get('calls'):
+                c = stats['submitted']
+                print(f'{"":<32}CALL submission: {c["calls"]:,} calls, {c["statement_bytes"] / c["calls"]:,.0f} statement bytes'
+                      f' + {c["param_bytes"] / c["calls"]:,.0f} bound bytes, {c["submit_s"] / c["calls"] * 1000:.1f} ms per call')
+            for frame, (mb, object_mb) in stats.get('frames', {}).items():
+                print(f'{"":<32}{frame} frame: {mb:.2f} MB ({object_mb:.2f} MB as object/int64)')
+
+
+def main_cli(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default = '10,1000,50000', help = 'Comma separated table counts')
+    parser.add_argument('--tables-per-schema', type = int, default = 100)
+    parser.add_argument('--prompt-template', default = 'samples', help = 'Template name in prompts.templates')
+    parser.add_argument('--query-latency-ms', type = float, default = 50)
+    parser.add_argument('--proc-start-ms', type = float, default = 1000, help = 'Simulated procedure sandbox start')
+    parser.add_argument('--cortex-latency-ms', type = float, default = 800)
+    parser.add_argument('--parse-ms-per-kb', type = float, default = 10, help = 'Simulated parse/compile cost of statement text')
+    parser.add_argument('--concurrency', type = int, default = 8, help = 'Concurrent procedure calls on warehouse')
+    parser.add_argument('--engine', default = 'procedure', help = "DATA_CATALOG engine: 'procedure' or 'batch'")
+    parser.add_argument('--batch-size', type = int, default = 50, help = 'Tables per CATALOG_BATCH call')
+    parser.add_argument('--no-column-catalog', action = 'store_true', help = 'Skip column descriptions (COLUMN_CATALOG)')
+    parser.add_argument('--schema-summary', default = 'ddl', help = "How schema_tables is summarized: 'ddl' or 'llm'")
+    parser.add_argument('--small-model', default = '', help = 'Route tables with few columns to this model')
+    parser.add_argument('--small-max-columns', type = int, default = 20, help = 'Largest table routed to --small-model')
+    parser.add_argument('--accesses-per-table', type = int, default = 5, help = 'Synthetic ACCESS_HISTORY rows per table')
+    parser.add_argument('--shard-size', type = int, default = 0, help = 'Synthetic tables per family of monthly shards')
+    parser.add_argument('--no-cluster-shards', action = 'store_true', help = 'Describe every shard table separately')
+    parser.add_argument('--failure-every', type = int, default = 0,
+                        help = 'Fail first COMPLETE of one in N prompts and run retry_failed afterwards')
+    parser.add_argument('--max-tables', type = int, default = 0, help = 'DATA_CATALOG max_tables budget (0 = unlimited)')
+    parser.add_argument('--max-prompt-tokens', type = int, default = 0, help = 'DATA_CATALOG max_prompt_tokens budget')
+    parser.add_argument('--max-runtime-s', type = int, default = 0, help = 'DATA_CATALOG max_runtime_s budget (wall clock)')
+    parser.add_argument('--no-memory', action = 'store_true', help = 'Skip tracemalloc (faster)')
+    parser.add_argument('--json', help = 'Write results to JSON file')
+    parser.add_argument('--enforce-budgets', action = 'store_true', help = 'Exit non-zero if a query, sampling or import budget is exceeded')
+    args = parser.parse_args(argv)
+
+    import_ms = measure_handler_imports()
+    print(f'handler import: {import_ms:.1f} ms (budget {HANDLER_IMPORT_BUDGET_MS} ms)')
+    results = {}
+    for n_tables in [int(s) for s in args.scales.split(',')]:
+        results[n_tables] = run_scale(n_tables, args)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent = 2)
+    exceeded = [stages[name]['budget'] for stages in results.values()
+                for name in ('catalog (loaders)', 'catalog (rerender)') if stages[name]['budget'] != 'ok']
+    exceeded += [f'{n_tables} tables: {sampling_budget(stages["sample_tbl"])}' for n_tables, stages in results.items()
+                 if 'sample_tbl' in stages and sampling_budget(stages['sample_tbl']) != 'ok']
+    if import_ms > HANDLER_IMPORT_BUDGET_MS:
+        exceeded.append(f'handler import {import_ms:.1f} ms > {HANDLER_IMPORT_BUDGET_MS} ms')
+    if args.enforce_budgets and exceeded:
+        sys.exit('Budget exceeded: ' + '; '.join(exceeded))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,136 @@
+"""
+Synthetic Snowflake account for the offline benchmarks.
+
+Builds INFORMATION_SCHEMA.TABLES/COLUMNS, ACCOUNT_USAGE.DATABASES/ACCESS_HISTORY and the
+DATA_CATALOG state tables (parsed from setup.sql) in SQLite, and generates sample rows for
+the synthetic tables on demand.
+"""
+
+import os
+import random
+import re
+import sqlite3
+
+SETUP_SQL = os.path.join(os.path.dirname(__file__), '..', 'setup.sql')
+CATALOG_TABLE_DDL = re.compile(r'CREATE OR REPLACE TABLE (DATA_CATALOG\.TABLE_CATALOG\.\w+) \((.*?)\n\s*\);', re.DOTALL)
+
+# (data type, weight) of synthetic columns
+COLUMN_TYPES = [('NUMBER', 30), ('TEXT', 30), ('TIMESTAMP_NTZ', 10), ('DATE', 8), ('BOOLEAN', 6),
+                ('FLOAT', 8), ('VARIANT', 6), ('VECTOR', 2)]
+WORDS = ['customer', 'order', 'product', 'sales', 'region', 'store', 'event', 'session', 'payment', 'item',
+         'campaign', 'user', 'account', 'invoice', 'shipment', 'price', 'amount', 'status', 'code', 'name']
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+INFORMATION_SCHEMA_DDL = [
+    '''CREATE TABLE "INFORMATION_SCHEMA.TABLES" (TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, TABLE_OWNER,
+       ROW_COUNT, BYTES, IS_TEMPORARY, COMMENT, CREATED, LAST_ALTERED)''',
+    '''CREATE TABLE "INFORMATION_SCHEMA.COLUMNS" (TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME,
+       ORDINAL_POSITION, DATA_TYPE, COMMENT)''',
+    'CREATE INDEX COLUMNS_BY_TABLE ON "INFORMATION_SCHEMA.COLUMNS" (TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)',
+    'CREATE TABLE "SNOWFLAKE.ACCOUNT_USAGE.DATABASES" (DATABASE_NAME, DELETED)',
+    '''CREATE TABLE "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY" (QUERY_ID, ACCESS_DATE, DAY_OF_WEEK, HOUR_OF_DAY,
+       OBJ_DOMAIN, OBJ_NAME)''',
+]
+
+
+def catalog_tables(path = SETUP_SQL):
+    """Returns dict of DATA_CATALOG table name to column names as defined in setup.sql"""
+
+    with open(path, encoding = 'utf-8') as f:
+        setup = f.read()
+    result = {}
+    for name, body in CATALOG_TABLE_DDL.findall(setup):
+        columns = []
+        for line in body.splitlines():
+            line = line.split('--')[0].strip().lstrip(',').strip()
+            if line:
+                columns.append(line.split()[0].upper())
+        result[name.upper()] = columns
+    return result
+
+
+def build_account(n_tables, database = 'BENCH_DB', tables_per_schema = 100, accesses_per_table = 5, seed = 0,
+                  shard_size = 0):
+    """Returns SQLite connection holding synthetic account with n_tables tables in database.
+
+    With shard_size, consecutive tables form families of shard_size monthly shards (F00000_EVENTS_2020_01, ...)
+    sharing the columns of their first shard. Accesses per table are heavy tailed (Pareto) with mean
+    accesses_per_table, so a few hot tables lead the crawl priority.
+    """
+
+    rng = random.Random(seed)
+    usage_rng = random.Random(seed + 1) # Separate stream so tables and columns do not depend on accesses
+    connection = sqlite3.connect(':memory:', check_same_thread = False)
+    for ddl in INFORMATION_SCHEMA_DDL:
+        connection.execute(ddl)
+    for name, columns in catalog_tables().items():
+        connection.execute(f'CREATE TABLE "{name}" ({", ".join(columns)})')
+        if 'RUN_ID' in columns and 'TABLENAME' in columns:
+            connection.execute(f'CREATE INDEX "{name}_BY_RUN" ON "{name}" (RUN_ID, TABLENAME)')
+    connection.executemany('INSERT INTO "SNOWFLAKE.ACCOUNT_USAGE.DATABASES" VALUES (?, NULL)',
+                           [(database,), ('DATA_CATALOG',)])
+
+    types, weights = zip(*COLUMN_TYPES)
+    tables, columns, accesses = [], [], []
+    for i in range(n_tables):
+        schema = f'S{i // tables_per_schema:04d}'
+        family, month = divmod(i, shard_size) if shard_size else (i, 0)
+        table = f'F{family:05d}_EVENTS_{2020 + month // 12}_{month % 12 + 1:02d}' if shard_size else f'T{i:06d}'
+        table_type = 'VIEW' if rng.random() < 0.1 else 'BASE TABLE'
+        comment = f'{rng.choice(WORDS)} {rng.choice(WORDS)} table' if rng.random() < 0.5 else None
+        tables.append((database, schema, table, table_type, 'SYSADMIN', rng.randint(1, 10 ** 7),
+                       rng.randint(10 ** 3, 10 ** 10), 'NO', comment, '2024-01-01 00:00:00', '2025-01-01 00:00:00'))
+        if month == 0 or i % tables_per_schema == 0: # New column signature unless shard of family in same schema
+            n_columns = min(int(rng.lognormvariate(2.3, 0.8)) + 2, 600)
+            family_columns = []
+            for position in range(1, n_columns + 1):
+                column_name = f'{rng.choice(WORDS).upper()}_{position}'
+                data_type = rng.choices(types, weights)[0]
+                comment = f'{rng.choice(WORDS)} column' if rng.random() < 0.2 else None
+                family_columns.append((column_name, position, data_type, comment))
+        columns.extend((database, schema, table) + c for c in family_columns)
+        for q in range(min(int(accesses_per_table * usage_rng.paretovariate(1.5) / 3), 50 * accesses_per_table)):
+            day = usage_rng.randint(1, 90)
+            accesses.append((f'{i}-{q}', f'2025-01-{day % 28 + 1:02d}', DAYS[day % 7], usage_rng.randint(0, 23),
+                             'Table', f'{database}.{schema}.{table}'))
+    connection.executemany('INSERT INTO "INFORMATION_SCHEMA.TABLES" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', tables)
+    connection.executemany('INSERT INTO "INFORMATION_SCHEMA.COLUMNS" VALUES (?, ?, ?, ?, ?, ?, ?)', columns)
+    connection.executemany('INSERT INTO "SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY" VALUES (?, ?, ?, ?, ?, ?)', accesses)
+    connection.commit()
+    return connection
+
+
+def row_generator(connection, n_rows = 10, seed = 0):
+    """Returns callable producing n_rows synthetic row dicts for fully qualified table name."""
+
+    text = ' '.join(WORDS) * 20
+    blob = {w: text[:160] for w in WORDS[:8]} # JSON blob
+    vector = [i / 1024 for i in range(1024)]
+
+    def value(rng, data_type):
+        if data_type == 'NUMBER':
+            return rng.randint(0, 10 ** 6)
+        if data_type == 'FLOAT':
+            return rng.random() * 1000
+        if data_type == 'TEXT': # Mostly short codes, some free text
+            start = rng.randint(0, 100)
+            return text[start:start + rng.choice([8, 8, 8, 24, 1500])]
+        if data_type in ('DATE', 'TIMESTAMP_NTZ'):
+            return f'2025-01-{rng.randint(1, 28):02d}'
+        if data_type == 'BOOLEAN':
+            return rng.random() < 0.5
+        if data_type == 'VARIANT':
+            return dict(blob)
+        if data_type == 'VECTOR':
+            return list(vector)
+        return None
+
+    def rows(tablename):
+        database, schema, table = tablename.split('.')
+        columns = connection.execute('SELECT COLUMN_NAME, DATA_TYPE FROM "INFORMATION_SCHEMA.COLUMNS" '
+                                     'WHERE TABLE_CATALOG = ? AND TABLE_SCHEMA = ? AND TABLE_NAME = ? '
+                                     'ORDER BY ORDINAL_POSITION', [database, schema, table]).fetchall()
+        rng = random.Random(f'{seed}-{tablename}')
+        return [{name: value(rng, data_type) for name, data_type in columns} for _ in range(n_rows)]
+
+    return rows
@@ -12,37 +12,110 @@ CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.TABLE_CATALOG (
   ,EMBEDDINGS VECTOR(FLOAT, 1024)
   );
 
+-- カラム単位の説明と埋め込み（クロール時にテーブルごとに1回の COMPLETE で全カラムを説明）
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.COLUMN_CATALOG (
+  TABLENAME VARCHAR
+  ,COLUMN_NAME VARCHAR
+  ,DATA_TYPE VARCHAR
+  ,DESCRIPTION VARCHAR
+  ,CREATED_ON TIMESTAMP
+  ,EMBEDDINGS VECTOR(FLOAT, 1024)
+  );
+
+-- スキーマ単位の要約（schema_tables としてスキーマ内の全テーブルのプロンプトで共有、スキーマのフィンガープリントでキャッシュ）
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.SCHEMA_SUMMARIES (
+  SCHEMA_NAME VARCHAR
+  ,FINGERPRINT VARCHAR -- SHA-256(要約方式 || モデル || スキーマ内テーブルの DDL)
+  ,MODE VARCHAR -- ddl / llm
+  ,SUMMARY VARCHAR
+  ,CREATED_ON TIMESTAMP
+  );
+
+-- クロール実行の状態管理（中断した実行を resume_run_id で再開するために使用）
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS (
+  RUN_ID VARCHAR
+  ,TARGET_DATABASE VARCHAR
+  ,TARGET_SCHEMA VARCHAR
+  ,MODEL VARCHAR
+  ,STATUS VARCHAR -- RUNNING / CANCELLING / COMPLETED / PARTIAL / CANCELLED / STOPPED / FAILED
+  ,STOP_REASON VARCHAR -- STOPPED の場合に上限に達した予算: max_tables / max_prompt_tokens / max_runtime_s
+  ,ERROR VARCHAR -- FAILED の場合に DATA_CATALOG が送出したエラー
+  ,COMMENT_STATEMENTS INTEGER
+  ,STARTED_ON TIMESTAMP
+  ,ENDED_ON TIMESTAMP
+  );
+
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.CRAWL_TASKS (
+  RUN_ID VARCHAR
+  ,TABLENAME VARCHAR
+  ,STATUS VARCHAR -- PENDING / RUNNING / SUCCEEDED / FAILED / CATALOGED
+  ,ATTEMPTS INTEGER
+  ,DESCRIPTION VARCHAR
+  ,ERROR VARCHAR
+  ,ERROR_TYPE VARCHAR -- 失敗した段階: sample / complete / comment / call / escalated
+  ,NEXT_ATTEMPT_ON TIMESTAMP -- 失敗したテーブルを retry_failed で再試行できる時刻（試行ごとに待ち時間が倍増）
+  ,CLUSTER_OF VARCHAR -- 説明と埋め込みを共有する代表テーブル（シャードテーブルのみ）
+  ,STARTED_ON TIMESTAMP
+  ,ENDED_ON TIMESTAMP
+  );
+
+-- クロール実行のステージ別処理時間（ステートメントは QUERY_TAG の run_id / stage で QUERY_HISTORY と結合可能）
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.CRAWL_METRICS (
+  RUN_ID VARCHAR
+  ,STAGE VARCHAR -- select_tables / metadata / dispatch / wait / sample / complete / catalog / comments / columns
+  ,TABLENAME VARCHAR
+  ,STARTED_ON TIMESTAMP
+  ,ENDED_ON TIMESTAMP
+  ,DURATION_MS INTEGER
+  ,BYTES INTEGER
+  ,TOKENS INTEGER
+  );
+
+-- テーブルごとのモデル選択（small_model 指定時は小さいテーブルを small_model に送り、不確か・長すぎ・不正な説明は model で再生成）
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.CRAWL_ROUTES (
+  RUN_ID VARCHAR
+  ,TABLENAME VARCHAR
+  ,MODEL VARCHAR
+  ,REASON VARCHAR -- default / small / large / escalated:<理由>
+  ,OUTCOME VARCHAR -- accepted / escalated:<理由> / error / empty / uncertain / too_long / invalid
+  ,COLUMNS INTEGER
+  ,TOKENS INTEGER
+  ,STARTED_ON TIMESTAMP
+  ,ENDED_ON TIMESTAMP
+  ,DURATION_MS INTEGER
+  );
+
+-- 実行・モデル別のスループット
+CREATE OR REPLACE VIEW DATA_CATALOG.TABLE_CATALOG.CRAWL_MODEL_THROUGHPUT AS
+SELECT RUN_ID,
+       MODEL,
+       COUNT(*) AS TABLES,
+       COUNT_IF(OUTCOME = 'accepted') AS ACCEPTED,
+       COUNT_IF(STARTSWITH(OUTCOME, 'escalated')) AS ESCALATED,
+       SUM(TOKENS) AS TOKENS,
+       AVG(DURATION_MS) AS AVG_DURATION_MS,
+       COUNT(*) * 1000 / NULLIF(DATEDIFF(millisecond, MIN(STARTED_ON), MAX(ENDED_ON)), 0) AS TABLES_PER_SECOND
+FROM DATA_CATALOG.TABLE_CATALOG.CRAWL_ROUTES
+GROUP BY RUN_ID, MODEL;
+
 /*** マーケットプレイスデータ一覧のEmbeddingを作成 ***/
- -- Step 0: マーケットプレイスで受領したデータ一覧の確認
-USE SCHEMA DATA_CATALOG.TABLE_CATALOG;
-
-show available listings in data exchange snowflake_data_marketplace;
-
--- Step 1: 一時テーブルを作成して中間データを保存
-CREATE OR REPLACE TEMPORARY TABLE temp_embedding_listings AS
-WITH available_listings AS (
-    SELECT *
-    FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))
-    -- WHERE "is_share_imported" = true 自社で取得したデータのみである場合
-)
-SELECT
-    REGEXP_SUBSTR("metadata", '"title":"([^"]+)"', 1, 1, 'e', 1) AS title,
-    REGEXP_SUBSTR("metadata", '"description":"([^"]*)"', 1, 1, 'e', 1) AS description
-FROM available_listings;
-
-SELECT * FROM temp_embedding_listings LIMIT 10;
--- Step 2: 最終テーブルを作成し、埋め込みを生成
-CREATE OR REPLACE TABLE marketplace_embedding_listings AS
-SELECT 
-    title,
-    description,
-    SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', description) AS embeddings
-FROM temp_embedding_listings;
-
-SELECT * FROM data_catalog.table_catalog.marketplace_embedding_listings LIMIT 10;
-
--- オプション: 一時テーブルを削除
-DROP TABLE IF EXISTS temp_embedding_listings;
+-- REFRESH_LISTINGS プロシージャ（後述）がタイトルと説明のハッシュで差分を取り、新規・変更分だけ埋め込みを生成
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.MARKETPLACE_EMBEDDING_LISTINGS (
+  TITLE VARCHAR
+  ,DESCRIPTION VARCHAR
+  ,EMBEDDINGS VECTOR(FLOAT, 1024)
+  ,LISTING_HASH VARCHAR -- SHA2(TITLE || '\n' || DESCRIPTION)
+  );
+
+-- リスティング更新の実行記録
+CREATE OR REPLACE TABLE DATA_CATALOG.TABLE_CATALOG.LISTING_REFRESHES (
+  REFRESHED_ON TIMESTAMP
+  ,LISTINGS INTEGER
+  ,EMBEDDED INTEGER
+  ,REMOVED INTEGER
+  ,UNCHANGED INTEGER
+  ,DURATION_MS INTEGER
+  );
 
 
 /*** Git 連携 ***/
@@ -71,7 +144,7 @@ COPY FILES
 COPY FILES
   INTO @DATA_CATALOG.TABLE_CATALOG.SRC_FILES
   FROM @DATA_CATALOG.TABLE_CATALOG.git_data_crawler_itagaki/branches/main/streamlit/
-  FILES=('catalog.py', 'environment.yml');
+  FILES=('catalog.py', 'query_stats.py', 'environment.yml');
 
 COPY FILES
   INTO @DATA_CATALOG.TABLE_CATALOG.SRC_FILES/pages/
@@ -98,15 +171,35 @@ CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.CATALOG_TABLE(
                                                           sampling_mode string DEFAULT 'fast', 
                                                           n integer DEFAULT 5,
                                                           model string DEFAULT 'mistral-large2',
-                                                          update_comment boolean Default TRUE)
+                                                          update_comment boolean Default TRUE,
+                                                          column_types string DEFAULT '')
 RETURNS VARIANT
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.10'
-IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/tables.py', '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/prompts.py')
-PACKAGES = ('snowflake-snowpark-python','joblib', 'pandas', 'snowflake-ml-python')
+IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/tables.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/runs.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/prompts.py')
+PACKAGES = ('snowflake-snowpark-python') -- Cortex は SQL で呼び出すため最小構成
 HANDLER = 'tables.generate_description'
 EXECUTE AS CALLER;
 
+-- 複数テーブルを1回の呼び出しで処理（engine => 'batch'）。Cortex は SQL で呼び出すため snowflake-ml-python は不要
+CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.CATALOG_BATCH(
+                                                          tablenames ARRAY,
+                                                          prompts ARRAY,
+                                                          sampling_mode string DEFAULT 'fast', 
+                                                          n integer DEFAULT 5,
+                                                          model string DEFAULT 'mistral-large2',
+                                                          column_types ARRAY DEFAULT null)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/tables.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/runs.py')
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'tables.generate_descriptions'
+EXECUTE AS CALLER;
+
 CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.DATA_CATALOG(target_database string, 
                                                          catalog_database string,
                                                          catalog_schema string,
@@ -118,18 +211,81 @@ CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.DATA_CATALOG(target_datab
                                                          sampling_mode string DEFAULT 'fast', 
                                                          update_comment boolean Default TRUE,
                                                          n integer DEFAULT 5,
-                                                         model string DEFAULT 'mistral-large2'
+                                                         model string DEFAULT 'mistral-large2',
+                                                         resume_run_id string DEFAULT '',
+                                                         prompt_template string DEFAULT '',
+                                                         comment_dry_run boolean DEFAULT FALSE,
+                                                         run_id string DEFAULT '',
+                                                         engine string DEFAULT 'procedure',
+                                                         batch_size integer DEFAULT 50,
+                                                         column_catalog boolean DEFAULT TRUE,
+                                                         schema_summary string DEFAULT 'ddl',
+                                                         small_model string DEFAULT '',
+                                                         small_max_columns integer DEFAULT 20,
+                                                         cluster_shards boolean DEFAULT TRUE,
+                                                         retry_failed boolean DEFAULT FALSE,
+                                                         max_attempts integer DEFAULT 3,
+                                                         max_tables integer DEFAULT 0,
+                                                         max_prompt_tokens integer DEFAULT 0,
+                                                         max_runtime_s integer DEFAULT 0
                                                          )
 RETURNS TABLE()
 LANGUAGE PYTHON
 RUNTIME_VERSION = '3.10'
-PACKAGES = ('snowflake-snowpark-python','pandas', 'snowflake-ml-python')
+PACKAGES = ('snowflake-snowpark-python','pandas') -- pandas: to_pandas() of table lists and schema metadata
 IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/tables.py',
            '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/main.py',
-           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/prompts.py')
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/runs.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/prompts.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/columns.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/schemas.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/routing.py',
+           '@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/shards.py')
 HANDLER = 'main.run_table_catalog'
 EXECUTE AS CALLER;
 
+-- マーケットプレイスのリスティングの埋め込みを差分更新（初回は全件）
+CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.REFRESH_LISTINGS(catalog_database string DEFAULT 'DATA_CATALOG',
+                                                              catalog_schema string DEFAULT 'TABLE_CATALOG',
+                                                              exchange string DEFAULT 'SNOWFLAKE_DATA_MARKETPLACE')
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/listings.py')
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'listings.refresh_listings'
+EXECUTE AS CALLER;
+
+CALL DATA_CATALOG.TABLE_CATALOG.REFRESH_LISTINGS();
+SELECT * FROM DATA_CATALOG.TABLE_CATALOG.MARKETPLACE_EMBEDDING_LISTINGS LIMIT 10;
+
+-- 定期的に更新する場合
+-- CREATE OR REPLACE TASK DATA_CATALOG.TABLE_CATALOG.REFRESH_LISTINGS_TASK
+--   WAREHOUSE = 'SAKURAGI_WH'
+--   SCHEDULE = 'USING CRON 0 3 * * * Asia/Tokyo'
+--   AS CALL DATA_CATALOG.TABLE_CATALOG.REFRESH_LISTINGS();
+-- ALTER TASK DATA_CATALOG.TABLE_CATALOG.REFRESH_LISTINGS_TASK RESUME;
+
+-- アプリの起動を速くするためのスナップショット（テーブル一覧・説明・利用統計を Parquet でステージに出力）
+CREATE OR REPLACE STAGE DATA_CATALOG.TABLE_CATALOG.SNAPSHOTS;
+
+CREATE OR REPLACE PROCEDURE DATA_CATALOG.TABLE_CATALOG.CATALOG_SNAPSHOT(catalog_database string DEFAULT 'DATA_CATALOG',
+                                                              catalog_schema string DEFAULT 'TABLE_CATALOG')
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.10'
+IMPORTS = ('@DATA_CATALOG.TABLE_CATALOG.SRC_FILES/snapshot.py')
+PACKAGES = ('snowflake-snowpark-python')
+HANDLER = 'snapshot.write_snapshot'
+EXECUTE AS CALLER;
+
+-- 定期的に更新する場合
+-- CREATE OR REPLACE TASK DATA_CATALOG.TABLE_CATALOG.CATALOG_SNAPSHOT_TASK
+--   WAREHOUSE = 'SAKURAGI_WH'
+--   SCHEDULE = 'USING CRON 0 * * * * Asia/Tokyo'
+--   AS CALL DATA_CATALOG.TABLE_CATALOG.CATALOG_SNAPSHOT();
+-- ALTER TASK DATA_CATALOG.TABLE_CATALOG.CATALOG_SNAPSHOT_TASK RESUME;
+
 /*** SiS 作成***/
 -- 2025_01バンドル以前
 CREATE OR REPLACE STREAMLIT DATA_CATALOG.TABLE_CATALOG.DATA_CATALOG_APP
@@ -0,0 +1,93 @@
+def get_column_catalog(catalog_database, catalog_schema):
+    """Returns fully qualified name of column catalog table"""
+
+    return f'{catalog_database}.{catalog_schema}.COLUMN_CATALOG'
+
+def build_column_prompts(descriptions, schema_df):
+    """Returns list of {TABLENAME, PROMPT, COLUMNS} of described tables found in schema_df. COLUMNS are [name, type] pairs."""
+
+    import json
+
+    from prompts import column_prompt
+
+    tables = schema_df.drop_duplicates('TABLENAME').set_index('TABLENAME')
+    prompts = []
+    for tablename, description in descriptions.items():
+        if tablename not in tables.index:
+            continue
+        prompts.append({'TABLENAME': tablename,
+                        'PROMPT': column_prompt.format(tablename = tablename,
+                                                       description = description,
+                                                       table_columns = tables.at[tablename, 'COLUMN_INFO']),
+                        'COLUMNS': json.loads(tables.at[tablename, 'COLUMN_TYPES'])})
+    return prompts
+
+def catalog_columns(session, catalog_database, catalog_schema, model, descriptions, schema_df, batch_size = 200):
+    """Describes columns with one COMPLETE per table and replaces their COLUMN_CATALOG rows. Returns number of tables.
+
+    Each batch is one DELETE and one INSERT: TRY_COMPLETE returns a JSON object of column name to
+    description per table, which is flattened against the table's columns and embedded in the same statement.
+    Columns missing from the response keep a NULL description and are embedded by name and type.
+    """
+
+    import json
+
+    column_tbl = get_column_catalog(catalog_database, catalog_schema)
+    prompts = build_column_prompts(descriptions, schema_df)
+    for i in range(0, len(prompts), batch_size):
+        batch = prompts[i:i + batch_size]
+        session.sql(f"""
+        DELETE FROM {column_tbl}
+        WHERE ARRAY_CONTAINS(TABLENAME::VARIANT, PARSE_JSON(?))
+        """, params=[json.dumps([p['TABLENAME'] for p in batch])]).collect()
+        session.sql(f"""
+        INSERT INTO {column_tbl} (TABLENAME, COLUMN_NAME, DATA_TYPE, DESCRIPTION, CREATED_ON, EMBEDDINGS)
+        WITH responses AS (
+            SELECT p.value:TABLENAME::STRING AS TABLENAME,
+                   p.value:COLUMNS AS COLUMNS,
+                   TRY_PARSE_JSON(REGEXP_SUBSTR(SNOWFLAKE.CORTEX.TRY_COMPLETE(?, p.value:PROMPT::STRING),
+                                                '[{{].*[}}]', 1, 1, 's')) AS RESPONSE
+            FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) p
+        ), described AS (
+            SELECT r.TABLENAME,
+                   c.value[0]::STRING AS COLUMN_NAME,
+                   c.value[1]::STRING AS DATA_TYPE,
+                   NULLIF(GET(r.RESPONSE, c.value[0]::STRING)::STRING, '') AS DESCRIPTION
+            FROM responses r, TABLE(FLATTEN(INPUT => r.COLUMNS)) c
+        )
+        SELECT TABLENAME,
+               COLUMN_NAME,
+               DATA_TYPE,
+               DESCRIPTION,
+               CURRENT_TIMESTAMP(),
+               SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large',
+                   TABLENAME || '.' || COLUMN_NAME || ' (' || DATA_TYPE || '): ' || COALESCE(DESCRIPTION, ''))
+        FROM described
+        """, params=[model, json.dumps(batch)]).collect()
+    return len(prompts)
+
+def copy_cluster_columns(session, catalog_database, catalog_schema, cluster_of, batch_size = 1000):
+    """Copies COLUMN_CATALOG rows of cluster representatives to their shard tables. Returns number of tables.
+
+    cluster_of is a dict of shard table to representative. Shards share the representative's column
+    signature, so its column descriptions and embeddings are reused without COMPLETE or embedding calls.
+    """
+
+    import json
+
+    column_tbl = get_column_catalog(catalog_database, catalog_schema)
+    members = [{'TABLENAME': t, 'CLUSTER_OF': rep} for t, rep in cluster_of.items()]
+    for i in range(0, len(members), batch_size):
+        batch = members[i:i + batch_size]
+        session.sql(f"""
+        DELETE FROM {column_tbl}
+        WHERE ARRAY_CONTAINS(TABLENAME::VARIANT, PARSE_JSON(?))
+        """, params=[json.dumps([m['TABLENAME'] for m in batch])]).collect()
+        session.sql(f"""
+        INSERT INTO {column_tbl} (TABLENAME, COLUMN_NAME, DATA_TYPE, DESCRIPTION, CREATED_ON, EMBEDDINGS)
+        SELECT m.value:TABLENAME::STRING, c.COLUMN_NAME, c.DATA_TYPE, c.DESCRIPTION, c.CREATED_ON, c.EMBEDDINGS
+        FROM {column_tbl} c
+        JOIN TABLE(FLATTEN(INPUT => PARSE_JSON(?))) m
+          ON c.TABLENAME = m.value:CLUSTER_OF::STRING
+        """, params=[json.dumps(batch)]).collect()
+    return len(members)
@@ -0,0 +1,65 @@
+def get_listing_tables(catalog_database, catalog_schema):
+    """Returns fully qualified names of marketplace listing embedding and listing refresh tables"""
+
+    return (f'{catalog_database}.{catalog_schema}.MARKETPLACE_EMBEDDING_LISTINGS',
+            f'{catalog_database}.{catalog_schema}.LISTING_REFRESHES')
+
+def dml_count(rows, column):
+    """Returns affected row count of INSERT/DELETE result (0 when statement touched no rows)"""
+
+    return rows[0][column] if rows else 0
+
+def refresh_listings(session,
+                     catalog_database = 'DATA_CATALOG',
+                     catalog_schema = 'TABLE_CATALOG',
+                     exchange = 'SNOWFLAKE_DATA_MARKETPLACE'):
+    """Embeds only new or changed marketplace listings and deletes removed ones. Returns refresh stats.
+
+    Listings are identified by SHA2 of title and description, so a changed listing is removed and
+    re-embedded once. Stats are appended to LISTING_REFRESHES.
+    """
+
+    import time
+
+    start = time.time()
+    listings_tbl, refreshes_tbl = get_listing_tables(catalog_database, catalog_schema)
+    current_tbl = f'{catalog_database}.{catalog_schema}.CURRENT_LISTINGS' # Not in caller's current schema
+    session.sql(f"SHOW AVAILABLE LISTINGS IN DATA EXCHANGE {exchange}").collect()
+    session.sql(f"""
+    CREATE OR REPLACE TEMPORARY TABLE {current_tbl} AS
+    WITH available_listings AS (
+        SELECT
+            REGEXP_SUBSTR("metadata", '"title":"([^"]+)"', 1, 1, 'e', 1) AS TITLE,
+            REGEXP_SUBSTR("metadata", '"description":"([^"]*)"', 1, 1, 'e', 1) AS DESCRIPTION
+        FROM TABLE(RESULT_SCAN(LAST_QUERY_ID())) -- SHOW above
+    )
+    SELECT DISTINCT TITLE,
+                    DESCRIPTION,
+                    SHA2(COALESCE(TITLE, '') || '\\n' || COALESCE(DESCRIPTION, '')) AS LISTING_HASH
+    FROM available_listings
+    """).collect()
+    removed = dml_count(session.sql(f"""
+    DELETE FROM {listings_tbl}
+    WHERE LISTING_HASH IS NULL
+    OR LISTING_HASH NOT IN (SELECT LISTING_HASH FROM {current_tbl})
+    """).collect(), 'number of rows deleted')
+    embedded = dml_count(session.sql(f"""
+    INSERT INTO {listings_tbl} (TITLE, DESCRIPTION, EMBEDDINGS, LISTING_HASH)
+    SELECT TITLE,
+           DESCRIPTION,
+           SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', DESCRIPTION),
+           LISTING_HASH
+    FROM {current_tbl}
+    WHERE LISTING_HASH NOT IN (SELECT LISTING_HASH FROM {listings_tbl})
+    """).collect(), 'number of rows inserted')
+    listings = session.sql(f"SELECT COUNT(*) AS N FROM {current_tbl}").collect()[0]['N']
+    stats = {'LISTINGS': listings,
+             'EMBEDDED': embedded,
+             'REMOVED': removed,
+             'UNCHANGED': listings - embedded,
+             'DURATION_MS': round((time.time() - start) * 1000)}
+    session.sql(f"""
+    INSERT INTO {refreshes_tbl} (REFRESHED_ON, LISTINGS, EMBEDDED, REMOVED, UNCHANGED, DURATION_MS)
+    SELECT CURRENT_TIMESTAMP(), ?, ?, ?, ?, ?
+    """, params=[stats['LISTINGS'], stats['EMBEDDED'], stats['REMOVED'], stats['UNCHANGED'], stats['DURATION_MS']]).collect()
+    return stats
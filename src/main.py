@@ -48,7 +48,7 @@
 #     import pandas as pd
 #     import snowflake.snowpark.functions as F
 
-#     from tables import get_crawlable_tbls, get_unique_context, get_all_tables, add_records_to_catalog
+#     from tables import get_crawlable_tbls, get_unique_context, get_all_tables, add_records_to_catalog, apply_comments
 #     from prompts import start_prompt
 
 #     tables = get_crawlable_tbls(session, target_database, target_schema, 
@@ -124,6 +124,89 @@
 
 
 
+MAX_IN_FLIGHT = 100 # Procedure calls submitted but not yet finished
+BYTES_PER_TOKEN = 4 # Prompt token estimate of submitted CALL for max_prompt_tokens until usage is reported
+
+def build_prompt(tablename, template, fields, schema_df):
+    """Returns (prompt, column types) of table, using only placeholders of template. Both are bound as parameters."""
+
+    import json
+
+    prompt_args = {'tablename': tablename}
+    if 'table_columns' in fields:
+        prompt_args['table_columns'] = schema_df[schema_df.TABLENAME == tablename]['COLUMN_INFO'].to_numpy().item()
+    if 'table_comment' in fields:
+        prompt_args['table_comment'] = schema_df[schema_df.TABLENAME == tablename]['TABLE_COMMENT'].to_numpy().item()
+    if 'schema_tables' in fields: # One summary per schema, built in metadata stage
+        prompt_args['schema_tables'] = schema_df[schema_df.TABLENAME == tablename]['SCHEMA_SUMMARY'].to_numpy().item()
+    column_types = ''
+    if 'table_samples' in fields: # Samples gathered during CATALOG_TABLE sproc
+        prompt_args['table_samples'] = '{table_samples}'
+        # Column types passed along so sproc builds sampling projection without describing table
+        column_types = json.dumps(json.loads(schema_df[schema_df.TABLENAME == tablename]['COLUMN_TYPES'].to_numpy().item()))
+    prompt = template.format(**prompt_args)
+    return prompt, column_types
+
+def get_catalog_table_call(tablenames,
+                           template,
+                           fields,
+                           schema_df,
+                           catalog_database,
+                           catalog_schema,
+                           sampling_mode,
+                           n,
+                           model):
+    """Returns (CALL statement, bind parameters) of CATALOG_TABLE for single table.
+
+    Statement text is the same for every table so it stays small and prompts need no quoting.
+    """
+
+    tablename = tablenames[0]
+    prompt, column_types = build_prompt(tablename, template, fields, schema_df)
+    return f"""
+    CALL {catalog_database}.{catalog_schema}.CATALOG_TABLE(
+                                    tablename => ?,
+                                    prompt => ?,
+                                    sampling_mode => ?,
+                                    n => ?,
+                                    model => ?,
+                                    update_comment => FALSE,
+                                    column_types => ?)
+    """, [tablename, prompt, sampling_mode, int(n), model, column_types]
+
+def get_catalog_batch_call(tablenames,
+                           template,
+                           fields,
+                           schema_df,
+                           catalog_database,
+                           catalog_schema,
+                           sampling_mode,
+                           n,
+                           model):
+    """Returns (CALL statement, bind parameters) of CATALOG_BATCH for batch of tables.
+
+    Arrays are bound as JSON strings, so statement text is the same for every batch.
+    """
+
+    import json
+
+    prompts, column_types = zip(*(build_prompt(t, template, fields, schema_df) for t in tablenames))
+    return f"""
+    CALL {catalog_database}.{catalog_schema}.CATALOG_BATCH(
+                                    tablenames => PARSE_JSON(?)::ARRAY,
+                                    prompts => PARSE_JSON(?)::ARRAY,
+                                    sampling_mode => ?,
+                                    n => ?,
+                                    model => ?,
+                                    column_types => PARSE_JSON(?)::ARRAY)
+    """, [json.dumps(list(tablenames)), json.dumps(prompts, ensure_ascii = False), sampling_mode, int(n), model,
+          json.dumps(column_types)]
+
+ENGINES = { # Execution engine: builds CALL statement and bind parameters of one dispatch unit of tables
+    'procedure': get_catalog_table_call, # One CATALOG_TABLE call per table
+    'batch': get_catalog_batch_call, # One CATALOG_BATCH call per batch_size tables
+}
+
 def run_table_catalog(session,
                       target_database, 
                       catalog_database,
@@ -136,7 +219,23 @@ def run_table_catalog(session,
                       sampling_mode,
                       update_comment,
                       n,
-                      model):
+                      model,
+                      resume_run_id,
+                      prompt_template,
+                      comment_dry_run,
+                      run_id,
+                      engine,
+                      batch_size,
+                      column_catalog = True,
+                      schema_summary = 'ddl',
+                      small_model = '',
+                      small_max_columns = 20,
+                      cluster_shards = True,
+                      retry_failed = False,
+                      max_attempts = 3,
+                      max_tables = 0,
+                      max_prompt_tokens = 0,
+                      max_runtime_s = 0):
     
     """
     Catalogs data contained in Snowflake Database/Schema.
@@ -145,6 +244,11 @@ def run_table_catalog(session,
     - tablename
     - description of data contained in respective table
 
+    Progress of each table is written to CRAWL_RUNS/CRAWL_TASKS in catalog schema
+    as it changes state so that an interrupted run can be resumed.
+    Timing of each stage and table is written to CRAWL_METRICS and statements are tagged with
+    run id and stage (QUERY_TAG) so they can be joined to QUERY_HISTORY.
+
     Args:
         target_database (string): Snowflake database to catalog.
         catalog_database (string): Snowflake database to store table catalog.
@@ -161,8 +265,54 @@ def run_table_catalog(session,
                                 - Pass 'nonnull' to prioritize least null records for table samples.
                                 - Passing 'nonnull' will take considerably longer to run.
         update_comment (bool): If True, update table's current comments. Defaults to False
+                               Comments are written in a bulk phase after all descriptions are generated.
         n (int): Number of records to sample from table. Defaults to 5.
         model (string): Cortex model to generate table descriptions. Defaults to 'mistral-7b'.
+        resume_run_id (string, Optional): Run id of interrupted run to resume.
+                                          Only pending or failed tables of that run are re-dispatched
+                                          and table selection arguments are ignored.
+        prompt_template (string, Optional): Name of prompt template in prompts.templates.
+                                            Defaults to template registered for model.
+                                            Only context used by template placeholders is gathered.
+        comment_dry_run (bool): If True, count COMMENT statements of comment phase without executing them.
+                                Count is recorded in CRAWL_RUNS.COMMENT_STATEMENTS.
+        run_id (string, Optional): Run id to register new run under so caller can follow progress
+                                   in CRAWL_TASKS before call returns. Generated if omitted.
+                                   Setting CRAWL_RUNS.STATUS to CANCELLING stops dispatching of new tables.
+        engine (string): How tables are distributed to procedure calls. One of ['procedure' (Default), 'batch']
+                         - Pass 'procedure' to describe each table in its own CATALOG_TABLE call.
+                         - Pass 'batch' to describe batch_size tables per CATALOG_BATCH call with one
+                           set-based Cortex query, paying procedure start once per batch.
+        batch_size (int): Number of tables per CATALOG_BATCH call. Defaults to 50.
+        column_catalog (bool): If True, describe columns of each described table with one COMPLETE call per table
+                               and write them with embeddings to COLUMN_CATALOG. Defaults to True.
+        schema_summary (string): How schema_tables context is summarized, once per schema. One of ['ddl' (Default), 'llm']
+                                 - Pass 'ddl' to list tables with key columns first as condensed DDL.
+                                 - Pass 'llm' to have model summarize entities and keys of condensed DDL.
+                                 Summaries are cached in SCHEMA_SUMMARIES by schema fingerprint.
+        small_model (string, Optional): Cortex model for tables with at most small_max_columns columns.
+                                        Tables whose description is uncertain, too long or invalid are
+                                        escalated to model. Routing decisions are written to CRAWL_ROUTES.
+        small_max_columns (int): Largest number of columns of table routed to small_model. Defaults to 20.
+        cluster_shards (bool): If True, tables sharing a name pattern with numeric suffix (e.g. EVENTS_2024_01)
+                               and column signature are described once by their latest table. Other tables
+                               of the cluster reuse its description with their suffix, its embedding and
+                               its column descriptions. Defaults to True.
+        retry_failed (bool): If True, only tables of target database/schema whose latest task failed are crawled,
+                             once their retry backoff has passed and while they have fewer than max_attempts
+                             attempts. Failures are recorded in CRAWL_TASKS (ERROR, ERROR_TYPE, NEXT_ATTEMPT_ON)
+                             and never written to catalog. Retried tables replace their catalog row
+                             even if replace_catalog is False. Defaults to False.
+        max_attempts (int): Attempts of table across runs after which retry_failed runs skip it. Defaults to 3.
+        max_tables (int, Optional): Tables dispatched to model per run. 0 (Default) means no limit.
+        max_prompt_tokens (int, Optional): Prompt tokens per run, estimated from submitted CALLs until
+                                           COMPLETE reports usage. 0 (Default) means no limit.
+        max_runtime_s (int, Optional): Seconds after start of run after which no CALL is submitted.
+                                       0 (Default) means no limit.
+
+    With a budget, tables are dispatched in order of recent accesses in ACCESS_HISTORY (name order if it cannot
+    be read). Once a budget is reached, calls in flight finish and the rest stay PENDING; the run is closed as
+    STOPPED and can be resumed.
 
     Returns:
         Table
@@ -171,78 +321,246 @@ def run_table_catalog(session,
     import json
     import time
 
-    import pandas as pd
     import snowflake.snowpark.functions as F
 
-    from tables import get_crawlable_tbls, get_unique_context, get_all_tables, add_records_to_catalog
-    from prompts import start_prompt
-
-    tables = get_crawlable_tbls(session, target_database, target_schema, 
-                                catalog_database, catalog_schema, catalog_table,
-                                replace_catalog)
-    if include_tables:
-        tables = list(set(tables).intersection(set(include_tables)))
-    elif exclude_tables:
-        tables = list(set(tables).difference(set(exclude_tables)))
-    else:
-        tables = tables
-    if tables:
-        context_db, context_schemas = get_unique_context(tables) # Database and set of Schemas to crawl
-        schema_df = get_all_tables(session, context_db, context_schemas) # Contains all tables in schema(s)
-        async_jobs = []
-        for t in tables:
-            current_schema = t.split('.')[1]
-            prompt_args = { # Samples gathered during CATALOG_TABLE sproc
-                'tablename': t,
-                'table_columns': schema_df[schema_df.TABLENAME == t]['COLUMN_INFO'].to_numpy().item(),
-                'table_comment': schema_df[schema_df.TABLENAME == t]['TABLE_COMMENT'].to_numpy().item(),
-                'schema_tables': schema_df[schema_df.TABLE_SCHEMA == current_schema]\
-                                .groupby('TABLE_SCHEMA')['TABLE_DDL']\
-                                .apply(list).to_numpy().item()[0]
-            }
-            # Samples passed later via double {{table_samples}}
-            prompt = start_prompt.format(**prompt_args).replace("'", "\\'") 
-            query = f"""
-            CALL {catalog_database}.{catalog_schema}.CATALOG_TABLE(
-                                            tablename => '{t}',
-                                            prompt => '{prompt}',
-                                            sampling_mode => '{sampling_mode}',
-                                            n => {n},
-                                            model => '{model}',
-                                            update_comment => {update_comment})
-            """
-            async_jobs.append(session.sql(query).collect_nowait())
-
-        n = 20 # Give 20 seconds to finish first
-        while not any(job.is_done() for job in async_jobs):
-            time.sleep(n)
-            n = 60 # Now check every minute
-            pass
-
-        results = [json.loads(job.result()[0][0]) for job in async_jobs if job.is_done()]
-        # there is a bit of latency between when the query is done and when it is available in the query history
-        while len(results) != len(tables):
-            results = [json.loads(job.result()[0][0]) for job in async_jobs if job.is_done()]
-            time.sleep(60)
-            pass
-        
-        df = session.create_dataframe(pd.DataFrame.from_records(results))\
-                    .withColumn('EMBEDDINGS',
-                                F.call_udf('SNOWFLAKE.CORTEX.EMBED_TEXT_1024',
-                                           'multilingual-e5-large',
-                                           F.col('DESCRIPTION')))\
-                    .withColumn('CREATED_ON', F.current_timestamp())
-        
-        add_records_to_catalog(session,
-                               catalog_database,
-                               catalog_schema,
-                               catalog_table,
-                               df,
-                               replace_catalog)
+    from tables import get_crawlable_tbls, get_unique_context, get_all_tables, add_records_to_catalog, apply_comments
+    from tables import get_table_access_counts
+    from columns import catalog_columns, copy_cluster_columns
+    from schemas import add_schema_summaries
+    from routing import count_columns, route_tables, check_description, write_routes
+    from shards import cluster_tables, variant_description
+    from runs import start_run, resume_run, get_resumable_tbls, dispatch_tasks, complete_tasks, get_run_results, finish_run
+    from runs import get_retry_tbls, span, set_query_tag, write_spans, is_cancel_requested, exhausted_budget, fail_run
+    from runs import requeue_tasks
+    from prompts import get_template, template_fields
+
+    started_run = time.time()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Use one of {list(ENGINES)}")
+    build_call = ENGINES[engine]
+    call_size = max(int(batch_size), 1) if engine == 'batch' else 1
+    template = get_template(model, prompt_template)
+    fields = template_fields(template)
+    query_tag = session.query_tag # Restored once run is finished
+    spans = [] # Timing spans not yet written to CRAWL_METRICS
+    routed = [] # Routing decisions not yet written to CRAWL_ROUTES
+    routing = bool(small_model) and small_model != model
+
+    try:
+        attempts = None # Attempts of earlier runs of retried tables
+        if resume_run_id:
+            run_id = resume_run_id
+            resume_run(session, catalog_database, catalog_schema, run_id)
+            tables = get_resumable_tbls(session, catalog_database, catalog_schema, run_id)
+        else:
+            with span(spans, 'select_tables'):
+                if retry_failed: # Retry queue only
+                    attempts = get_retry_tbls(session, catalog_database, catalog_schema, catalog_table,
+                                              target_database, target_schema, max_attempts)
+                    tables = list(attempts)
+                else:
+                    tables = get_crawlable_tbls(session, target_database, target_schema, 
+                                                catalog_database, catalog_schema, catalog_table,
+                                                replace_catalog)
+            if include_tables:
+                tables = list(set(tables).intersection(set(include_tables)))
+            elif exclude_tables:
+                tables = list(set(tables).difference(set(exclude_tables)))
+            else:
+                tables = tables
+            run_id = start_run(session, catalog_database, catalog_schema,
+                               target_database, target_schema, model, tables, run_id, attempts) if tables else None
+        schema_df = None
+        if tables:
+            set_query_tag(session, run_id, 'metadata')
+            with span(spans, 'metadata'):
+                if routing or cluster_shards or {'table_columns', 'table_comment', 'schema_tables', 'table_samples'} & fields: # Schema metadata only fetched if used
+                    context_db, context_schemas = get_unique_context(tables) # Database and set of Schemas to crawl
+                    schema_df = get_all_tables(session, context_db, context_schemas) # Contains all tables in schema(s)
+                if 'schema_tables' in fields:
+                    schema_df = add_schema_summaries(session, catalog_database, catalog_schema, schema_df,
+                                                     schema_summary, model)
+            column_counts = count_columns(schema_df) if schema_df is not None else {}
+            routes = route_tables(tables, column_counts, model, small_model, small_max_columns)
+            # Shards wait PENDING for their representative and are only dispatched if it fails
+            clusters = cluster_tables(tables, schema_df) if cluster_shards and schema_df is not None else {}
+            shards = {t for members in clusters.values() for t in members}
+            limits = {'max_tables': int(max_tables or 0), 'max_prompt_tokens': int(max_prompt_tokens or 0),
+                      'max_runtime_s': int(max_runtime_s or 0)}
+            access_counts = {}
+            if any(limits.values()): # Most accessed tables first; a cluster counts accesses of all its tables
+                with span(spans, 'prioritize'):
+                    context_db, context_schemas = get_unique_context(tables)
+                    context_schema = next(iter(context_schemas)).split('.')[1] if len(context_schemas) == 1 else ''
+                    try:
+                        access_counts = get_table_access_counts(session, context_db, context_schema)
+                    except Exception: # ACCESS_HISTORY needs Enterprise edition and access to SNOWFLAKE database
+                        access_counts = {} # Name order instead
+            priority = {t: access_counts.get(t, 0) + sum(access_counts.get(m, 0) for m in clusters.get(t, []))
+                        for t in tables}
+            set_query_tag(session, run_id, 'dispatch')
+            pending = sorted((t for t in tables if t not in shards), key = lambda t: (-priority[t], t))
+            if not any(limits.values()): # Every table is described anyway, so small model tables go first
+                pending.sort(key = lambda t: routes[t][0] != small_model) # and escalations overlap large tables
+            used = dict.fromkeys(limits, 0)
+            counted = set() # Tables charged to max_tables; escalations are redispatched without charge
+            async_jobs = {}
+            cancelled = False
+            budget = None # Budget whose limit stopped dispatching
+            # Calls are kept to MAX_IN_FLIGHT so a cancelled run or a run out of budget stops dispatching and keeps
+            # the rest PENDING. Tasks finished by each poll are recorded in one statement so completed work survives
+            # cancellation; the loop only sleeps when a poll neither dispatched nor finished anything
+            while (pending and not cancelled and not budget) or async_jobs:
+                dispatched, finished = [], []
+                if pending and not cancelled and not budget and len(async_jobs) < MAX_IN_FLIGHT:
+                    with span(spans, 'dispatch') as dispatch_span: # Prompt building and submission of CALLs
+                        dispatch_span['BYTES'] = 0
+                        while pending and len(async_jobs) < MAX_IN_FLIGHT:
+                            used['max_runtime_s'] = time.time() - started_run
+                            budget = exhausted_budget(limits, used)
+                            if budget:
+                                break
+                            head = pending[:call_size]
+                            call_model = routes[head[0]][0]
+                            call_tables = [t for t in head if routes[t][0] == call_model]
+                            if limits['max_tables']: # Tables beyond budget stay PENDING
+                                fresh = [t for t in call_tables if t not in counted][:limits['max_tables'] - used['max_tables']]
+                                call_tables = [t for t in call_tables if t in counted or t in fresh]
+                            pending = pending[len(head):] if call_tables == head else [t for t in pending if t not in call_tables]
+                            query, params = build_call(call_tables, template, fields, schema_df,
+                                                       catalog_database, catalog_schema,
+                                                       sampling_mode, n, call_model)
+                            call_bytes = len(query.encode()) + sum(len(str(p).encode()) for p in params)
+                            async_jobs[call_tables[0]] = (call_tables, session.sql(query, params=params).collect_nowait(),
+                                                          call_model, time.time(), call_bytes // BYTES_PER_TOKEN)
+                            dispatch_span['BYTES'] += call_bytes
+                            dispatched.extend(call_tables)
+                            used['max_prompt_tokens'] += call_bytes // BYTES_PER_TOKEN
+                            used['max_tables'] += len(set(call_tables) - counted)
+                            counted.update(call_tables)
+                        if dispatched:
+                            dispatch_tasks(session, catalog_database, catalog_schema, run_id, dispatched)
+                with span(spans, 'wait'): # Polling of CALLs and idle sleep, apart from dispatch and recording
+                    for key, (call_tables, job, call_model, started, estimated_tokens) in list(async_jobs.items()):
+                        if not job.is_done():
+                            continue
+                        try:
+                            result = json.loads(job.result()[0][0])
+                            call_spans = result.get('SPANS', [])
+                            spans.extend(call_spans) # Sample/complete spans timed inside procedure
+                            outcomes = {r['TABLENAME']: (r['DESCRIPTION'], r.get('ERROR'), r.get('ERROR_TYPE'))
+                                        for r in result.get('RESULTS', [result])}
+                        except Exception as e:
+                            call_spans = []
+                            outcomes = {t: (None, str(e), 'call') for t in call_tables}
+                        reported_tokens = sum(s['TOKENS'] or 0 for s in call_spans)
+                        if reported_tokens: # Usage reported by COMPLETE replaces estimate
+                            used['max_prompt_tokens'] += reported_tokens - estimated_tokens
+                        for t, (description, error, error_type) in outcomes.items(): # Batch calls return one result per table
+                            reason = 'error' if error is not None else check_description(description)
+                            if not routing and reason != 'error': # Quality is only checked when model can redo table
+                                reason = None
+                            if reason == 'error' and error is None: # No description returned
+                                error, error_type, description = description or 'No description returned', 'complete', None
+                            escalate = routing and reason is not None and call_model == small_model
+                            routed.append({'TABLENAME': t, 'MODEL': call_model, 'REASON': routes[t][1],
+                                           'OUTCOME': f'escalated:{reason}' if escalate else (reason or 'accepted'),
+                                           'COLUMNS': column_counts.get(t),
+                                           'TOKENS': sum(s['TOKENS'] or 0 for s in call_spans if s['TABLENAME'] == t) or None,
+                                           'STARTED_ON': started, 'ENDED_ON': time.time()})
+                            if escalate: # Retried with model; FAILED until redispatched so an interrupted run can resume it
+                                routes[t] = (model, f'escalated:{reason}')
+                                pending.append(t)
+                                error = error or f'Escalated to {model}: {reason}'
+                                error_type = error_type or 'escalated'
+                                description = None
+                            finished.append({'TABLENAME': t, 'DESCRIPTION': description,
+                                             'ERROR': error, 'ERROR_TYPE': error_type})
+                            if escalate or t not in clusters:
+                                continue
+                            if reason == 'error': # Shards are described one by one instead
+                                pending.extend(clusters.pop(t))
+                                continue
+                            finished.extend({'TABLENAME': member, 'CLUSTER_OF': t,
+                                             'DESCRIPTION': variant_description(description, t, member) if reason is None else description}
+                                            for member in clusters[t])
+                        del async_jobs[key]
+                    if not dispatched and not finished:
+                        time.sleep(10)
+                complete_tasks(session, catalog_database, catalog_schema, run_id, finished)
+                if pending and not cancelled and not budget:
+                    cancelled = is_cancel_requested(session, catalog_database, catalog_schema, run_id)
+                if len(spans) >= 1000: # Flush in bulk rather than per table
+                    write_spans(session, catalog_database, catalog_schema, run_id, spans)
+                    spans.clear()
+                if len(routed) >= 1000:
+                    write_routes(session, catalog_database, catalog_schema, run_id, routed)
+                    routed.clear()
+            # Escalations left when budget or cancellation stopped dispatching wait like any other table
+            requeue_tasks(session, catalog_database, catalog_schema, run_id,
+                          [t for t in pending if routes[t][1].startswith('escalated:')])
+
+        if run_id:
+            set_query_tag(session, run_id, 'catalog')
+            with span(spans, 'catalog'): # Embedding and catalog write
+                results = get_run_results(session, catalog_database, catalog_schema, run_id)
+                # Only representatives and unclustered tables are embedded; shards join their representative's embedding
+                embeddings = results.filter(F.col('CLUSTER_OF').is_null())\
+                                    .select(F.col('TABLENAME').alias('EMBEDDED_TABLE'),
+                                            F.call_udf('SNOWFLAKE.CORTEX.EMBED_TEXT_1024',
+                                                       'multilingual-e5-large',
+                                                       F.col('DESCRIPTION')).alias('EMBEDDINGS'))
+                df = results.join(embeddings, F.coalesce(results['CLUSTER_OF'], results['TABLENAME']) == embeddings['EMBEDDED_TABLE'])\
+                            .select('TABLENAME', 'DESCRIPTION', 'EMBEDDINGS')\
+                            .withColumn('CREATED_ON', F.current_timestamp())\
+                            .cache_result()
+            
+                add_records_to_catalog(session,
+                                       catalog_database,
+                                       catalog_schema,
+                                       catalog_table,
+                                       df,
+                                       # Retried and resumed tables may have a catalog row (e.g. legacy error rows)
+                                       replace_catalog or retry_failed or bool(resume_run_id))
+            result_rows = results.collect()
+            descriptions = {row['TABLENAME']: row['DESCRIPTION'] for row in result_rows}
+            cluster_of = {row['TABLENAME']: row['CLUSTER_OF'] for row in result_rows if row['CLUSTER_OF']}
+            comment_statements = None
+            if update_comment or comment_dry_run: # Comments applied in bulk once all descriptions are in
+                set_query_tag(session, run_id, 'comments')
+                with span(spans, 'comments'):
+                    comment_statements, failed_comments = apply_comments(session,
+                                                                         descriptions,
+                                                                         dry_run = comment_dry_run)
+                    # Described and cataloged, but FAILED so retry_failed runs comment them again
+                    complete_tasks(session, catalog_database, catalog_schema, run_id,
+                                   [{'TABLENAME': t, 'DESCRIPTION': descriptions[t], 'ERROR': error,
+                                     'ERROR_TYPE': 'comment', 'CLUSTER_OF': cluster_of.get(t)}
+                                    for t, error in failed_comments.items()])
+            described = {t: d for t, d in descriptions.items() if d} # Failed tables never reach run results
+            if column_catalog and described:
+                set_query_tag(session, run_id, 'columns')
+                with span(spans, 'columns'): # One COMPLETE per table for all of its columns, embedded in bulk
+                    unclustered = {t: d for t, d in described.items() if t not in cluster_of}
+                    if schema_df is None or not set(unclustered) <= set(schema_df['TABLENAME']):
+                        context_db, context_schemas = get_unique_context(list(described))
+                        schema_df = get_all_tables(session, context_db, context_schemas)
+                    catalog_columns(session, catalog_database, catalog_schema, model, unclustered, schema_df)
+                    copy_cluster_columns(session, catalog_database, catalog_schema,
+                                         {t: rep for t, rep in cluster_of.items() if t in described})
+            finish_run(session, catalog_database, catalog_schema, run_id, comment_statements, budget)
+            write_spans(session, catalog_database, catalog_schema, run_id, spans)
+            write_routes(session, catalog_database, catalog_schema, run_id, routed)
         
-        # df.write.save_as_table(table_name = [catalog_database, catalog_schema, catalog_table],
-        #                        mode = "append",
-        #                        column_order = "name")
-        return df
-    else:
-        return session.create_dataframe([['No new tables to crawl','']], schema=['TABLENAME', 'DESCRIPTION'])
+            # df.write.save_as_table(table_name = [catalog_database, catalog_schema, catalog_table],
+            #                        mode = "append",
+            #                        column_order = "name")
+            return df.withColumn('RUN_ID', F.lit(run_id))
+        else:
+            return session.create_dataframe([['No new tables to crawl','']], schema=['TABLENAME', 'DESCRIPTION'])
+    except Exception as e: # Run stays resumable; CRAWL_RUNS shows why it stopped instead of RUNNING
+        if run_id:
+            fail_run(session, catalog_database, catalog_schema, run_id, str(e))
+        raise
+    finally:
+        session.query_tag = query_tag
@@ -31,39 +31,120 @@ start_prompt = """
         """
 
 
-# start_prompt = """
-#                 あなたはデータベーステーブルのカタログ作成を担当するデータアナリストです。提供された詳細に基づいて、指定されたテーブルの簡単な説明文を50字以内で作成してください。
-#                 作成する説明文には、以下の情報を記述する必要があります。
-#                 テーブルに含まれるデータ、カラムの構成、 同じスキーマ内の関連テーブルと参照キーに関する重要な詳細
+sample_prompt = """
+                あなたはデータベーステーブルのカタログ作成を担当するデータアナリストです。提供された詳細に基づいて、指定されたテーブルの簡単な説明文を50字以内で作成してください。
+                作成する説明文には、以下の情報を記述する必要があります。
+                テーブルに含まれるデータ、カラムの構成、 同じスキーマ内の関連テーブルと参照キーに関する重要な詳細
                
-#                 指定されたテーブル名に対して、以下の情報が提供されます。
-#                 カラム情報、ユーザーが入力したコメント（利用可能な場合）、サンプル行、同じスキーマ内のテーブルとそのカラムのリスト（schema_tablesというラベルで示されます）
+                指定されたテーブル名に対して、以下の情報が提供されます。
+                カラム情報、ユーザーが入力したコメント（利用可能な場合）、サンプル行、同じスキーマ内のテーブルとそのカラムのリスト（schema_tablesというラベルで示されます）
                 
-#                 ベクター型のサンプルは切り捨てられていますが、切り捨てに関する言及はしないでください。
+                ベクター型のサンプルは切り捨てられていますが、切り捨てに関する言及はしないでください。
                 
-#                 テーブル名は、親データベースとスキーマ名がプレフィックスとして付与されています。
-#                 以下のルールに従ってください。
-#                 <ルール>
-#                 1. ベクトルの切り捨てについて言及しないでください。
-#                 2. 作成する説明文は簡潔にし、50文字以内で記述してください。
-#                 3. 説明文にはアポストロフィやシングルクォートを使用しないでください。
-#                 4. 不確かな場合は憶測をせず、「確信をもってテーブルの説明を生成できません」と返してください。
-#                 </ルール>
-#                 <tablename>
-#                 {tablename}
-#                 </tablename>
-#                 <table_columns>
-#                 {table_columns}
-#                 </table_columns>
-#                 <table_comment>
-#                 {table_comment}
-#                 </table_comment>
-#                 <table_samples>
-#                 {table_samples}
-#                 </table_samples>
-#                 <schema_tables>
-#                 {schema_tables}
-#                 </schema_tables>
-#                 説明:
-# """
+                テーブル名は、親データベースとスキーマ名がプレフィックスとして付与されています。
+                以下のルールに従ってください。
+                <ルール>
+                1. ベクトルの切り捨てについて言及しないでください。
+                2. 作成する説明文は簡潔にし、50文字以内で記述してください。
+                3. 説明文にはアポストロフィやシングルクォートを使用しないでください。
+                4. 不確かな場合は憶測をせず、「確信をもってテーブルの説明を生成できません」と返してください。
+                </ルール>
+                <tablename>
+                {tablename}
+                </tablename>
+                <table_columns>
+                {table_columns}
+                </table_columns>
+                <table_comment>
+                {table_comment}
+                </table_comment>
+                <table_samples>
+                {table_samples}
+                </table_samples>
+                <schema_tables>
+                {schema_tables}
+                </schema_tables>
+                説明:
+"""
+
+
+# Column descriptions of one table in one COMPLETE call (COLUMN_CATALOG). Response is parsed as JSON.
+column_prompt = """
+                あなたはデータベーステーブルのカタログ作成を担当するデータアナリストです。提供された詳細に基づいて、指定されたテーブルのすべてのカラムについて、それぞれ30字以内の簡単な説明文を作成してください。
+
+                指定されたテーブル名に対して、テーブルの説明文とカラム情報（カラム名、データ型、コメント）が提供されます。
+                テーブル名は、親データベースとスキーマ名がプレフィックスとして付与されています。
+                以下のルールに従ってください。
+                <ルール>
+                1. カラム名をキー、説明文を値とする JSON オブジェクトのみを出力し、それ以外の文章は含めないでください。
+                2. キーのカラム名は table_columns に記載されたとおりに記述してください。
+                3. 説明文にはアポストロフィやシングルクォートを使用しないでください。
+                4. 不確かなカラムは憶測をせず、値を空文字にしてください。
+                </ルール>
+                <tablename>
+                {tablename}
+                </tablename>
+                <table_description>
+                {description}
+                </table_description>
+                <table_columns>
+                {table_columns}
+                </table_columns>
+                JSON:
+"""
+
+
+# Summary of one schema injected as schema_tables into every table prompt of that schema (SCHEMA_SUMMARIES)
+schema_prompt = """
+                あなたはデータベースのカタログ作成を担当するデータアナリストです。提供されたテーブル一覧に基づいて、スキーマ全体の要約を作成してください。
+
+                スキーマ名と、スキーマ内のテーブルとそのカラムの一覧（キーらしいカラムが先頭）が提供されます。
+                以下のルールに従ってください。
+                <ルール>
+                1. スキーマが表す業務領域と主要なエンティティを2文以内で説明してください。
+                2. 続けて、主要なテーブルごとに1行で、テーブル名、表すエンティティ、キーとなるカラム、関連するテーブルを記述してください。
+                3. 全体で1500字以内にしてください。
+                4. 波括弧、アポストロフィやシングルクォートを使用しないでください。
+                </ルール>
+                <schema>
+                {schema}
+                </schema>
+                <schema_ddl>
+                {schema_ddl}
+                </schema_ddl>
+                要約:
+"""
+
+
+# Prompt templates selectable per run. Placeholders used by a template decide
+# which context stages (schema metadata, table samples) are executed.
+templates = {
+    'default': start_prompt,
+    'samples': sample_prompt,
+}
+
+# Models listed here use the named template unless a run specifies one explicitly
+model_templates = {}
+
+def register_template(name, template, models = ()):
+    """Registers prompt template under name and optionally as default for models"""
+
+    templates[name] = template
+    for model in models:
+        model_templates[model] = name
+
+def get_template(model, name = None):
+    """Returns prompt template by name, falling back to model's template and then default"""
+
+    if name:
+        if name not in templates:
+            raise ValueError(f"prompt_template must be one of {list(templates)}.")
+        return templates[name]
+    return templates[model_templates.get(model, 'default')]
+
+def template_fields(template):
+    """Returns set of placeholder names used by prompt template"""
+
+    from string import Formatter
 
+    return {field for _, field, _, _ in Formatter().parse(template) if field}
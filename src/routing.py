@@ -0,0 +1,78 @@
+UNCERTAIN_RESPONSE = '確信をもってテーブルの説明を生成できません' # Rule 4 of prompt templates
+MAX_DESCRIPTION_CHARS = 50 # Length limit of prompt templates
+PROMPT_TAGS = ('<tablename>', '<table_columns>', '<schema_tables>', '<ルール>', '説明:')
+
+def get_routes_table(catalog_database, catalog_schema):
+    """Returns fully qualified name of model routing decisions table"""
+
+    return f'{catalog_database}.{catalog_schema}.CRAWL_ROUTES'
+
+def count_columns(schema_df):
+    """Returns dict of fully qualified table name to number of columns from COLUMN_TYPES of schema_df"""
+
+    import json
+
+    return {t: len(json.loads(types)) for t, types in zip(schema_df['TABLENAME'], schema_df['COLUMN_TYPES'])}
+
+def route_tables(tablenames, column_counts, model, small_model = '', small_max_columns = 20):
+    """Returns dict of table to (model, reason) of first attempt.
+
+    Tables with at most small_max_columns columns go to small_model ('small'), all others and tables
+    of unknown size to model ('large'). Without small_model every table goes to model ('default').
+    """
+
+    if not small_model or small_model == model:
+        return {t: (model, 'default') for t in tablenames}
+    routes = {}
+    for t in tablenames:
+        small = column_counts.get(t) is not None and column_counts[t] <= small_max_columns
+        routes[t] = (small_model, 'small') if small else (model, 'large')
+    return routes
+
+def check_description(description, max_chars = MAX_DESCRIPTION_CHARS):
+    """Returns reason description is unusable ('error', 'empty', 'uncertain', 'too_long', 'invalid') or None if valid"""
+
+    from tables import ERROR_PREFIXES
+
+    if description is None or description.startswith(ERROR_PREFIXES):
+        return 'error'
+    description = description.strip()
+    if not description:
+        return 'empty'
+    if UNCERTAIN_RESPONSE in description:
+        return 'uncertain'
+    if len(description) > max_chars:
+        return 'too_long'
+    if any(tag in description for tag in PROMPT_TAGS): # Model echoed prompt instead of answering
+        return 'invalid'
+    return None
+
+def write_routes(session, catalog_database, catalog_schema, run_id, routes):
+    """Appends routing decisions of run to CRAWL_ROUTES in one write.
+
+    routes are dicts with TABLENAME, MODEL, REASON, OUTCOME, COLUMNS, TOKENS and STARTED_ON/ENDED_ON epoch seconds.
+    """
+
+    import datetime
+    from snowflake.snowpark.types import StructType, StructField, StringType, TimestampType, LongType
+
+    if not routes:
+        return
+    to_timestamp = lambda s: datetime.datetime.fromtimestamp(s, datetime.timezone.utc).replace(tzinfo = None)
+    schema = StructType([StructField('RUN_ID', StringType()),
+                         StructField('TABLENAME', StringType()),
+                         StructField('MODEL', StringType()),
+                         StructField('REASON', StringType()),
+                         StructField('OUTCOME', StringType()),
+                         StructField('COLUMNS', LongType()),
+                         StructField('TOKENS', LongType()),
+                         StructField('STARTED_ON', TimestampType()),
+                         StructField('ENDED_ON', TimestampType()),
+                         StructField('DURATION_MS', LongType())])
+    rows = [[run_id, r['TABLENAME'], r['MODEL'], r['REASON'], r['OUTCOME'], r['COLUMNS'], r['TOKENS'],
+             to_timestamp(r['STARTED_ON']), to_timestamp(r['ENDED_ON']),
+             round((r['ENDED_ON'] - r['STARTED_ON']) * 1000)] for r in routes]
+    session.create_dataframe(rows, schema = schema)\
+           .write.save_as_table(table_name = get_routes_table(catalog_database, catalog_schema),
+                                mode = "append",
+                                column_order = "name")
@@ -0,0 +1,301 @@
+import contextlib
+import json
+import time
+
+MAX_ATTEMPTS = 3 # Attempts of table across runs before retry_failed runs stop queueing it
+RETRY_BACKOFF_S = 300 # Wait before first retry of failed table, doubled on each further attempt
+MAX_RETRY_BACKOFF_S = 86400
+BUDGETS = ('max_tables', 'max_prompt_tokens', 'max_runtime_s') # Per run limits that stop dispatching, 0 = unlimited
+
+def get_state_tables(catalog_database, catalog_schema):
+    """Returns fully qualified names of crawl run and crawl task state tables"""
+
+    return (f'{catalog_database}.{catalog_schema}.CRAWL_RUNS',
+            f'{catalog_database}.{catalog_schema}.CRAWL_TASKS')
+
+def start_run(session,
+              catalog_database,
+              catalog_schema,
+              target_database,
+              target_schema,
+              model,
+              tablenames,
+              run_id = None,
+              attempts = None):
+    """Registers new crawl run and its tables as PENDING tasks. Returns run id (generated unless passed).
+
+    attempts is a dict of table to attempts of earlier runs (retry_failed runs) so the attempt cap spans runs.
+    """
+
+    import uuid
+
+    runs_tbl, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    run_id = run_id or str(uuid.uuid4())
+    session.sql(f"""
+    INSERT INTO {runs_tbl} (RUN_ID, TARGET_DATABASE, TARGET_SCHEMA, MODEL, STATUS, STARTED_ON)
+    SELECT ?, ?, ?, ?, 'RUNNING', CURRENT_TIMESTAMP()
+    """, params=[run_id, target_database, target_schema, model]).collect()
+    attempts = attempts or {}
+    session.create_dataframe([[run_id, t, 'PENDING', attempts.get(t, 0)] for t in tablenames],
+                             schema=['RUN_ID', 'TABLENAME', 'STATUS', 'ATTEMPTS'])\
+           .write.save_as_table(table_name = tasks_tbl,
+                                mode = "append",
+                                column_order = "name")
+    return run_id
+
+def resume_run(session, catalog_database, catalog_schema, run_id):
+    """Reopens run as RUNNING so its progress shows it working and a CANCELLING left by a stopped run is cleared."""
+
+    runs_tbl, _ = get_state_tables(catalog_database, catalog_schema)
+    session.sql(f"""
+    UPDATE {runs_tbl}
+    SET STATUS = 'RUNNING',
+        STOP_REASON = NULL,
+        ERROR = NULL,
+        ENDED_ON = NULL
+    WHERE RUN_ID = ?
+    """, params=[run_id]).collect()
+
+def get_resumable_tbls(session, catalog_database, catalog_schema, run_id):
+    """Returns list of tables in run that are pending, were interrupted or failed."""
+
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    query = f"""
+    SELECT TABLENAME
+    FROM {tasks_tbl}
+    WHERE RUN_ID = ?
+    AND STATUS IN ('PENDING', 'RUNNING', 'FAILED')
+    """
+    return [row['TABLENAME'] for row in session.sql(query, params=[run_id]).collect()]
+
+def dispatch_tasks(session, catalog_database, catalog_schema, run_id, tablenames):
+    """Marks tables of run as RUNNING and increments their attempt counter."""
+
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    session.sql(f"""
+    UPDATE {tasks_tbl}
+    SET STATUS = 'RUNNING',
+        ATTEMPTS = ATTEMPTS + 1,
+        STARTED_ON = CURRENT_TIMESTAMP(),
+        ENDED_ON = NULL,
+        ERROR = NULL,
+        ERROR_TYPE = NULL,
+        NEXT_ATTEMPT_ON = NULL
+    WHERE RUN_ID = ?
+    AND ARRAY_CONTAINS(TABLENAME::VARIANT, PARSE_JSON(?))
+    """, params=[run_id, json.dumps(tablenames)]).collect()
+
+def requeue_tasks(session, catalog_database, catalog_schema, run_id, tablenames):
+    """Marks tables of run as PENDING again, clearing their error, so the run can be resumed with them."""
+
+    if not tablenames:
+        return
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    session.sql(f"""
+    UPDATE {tasks_tbl}
+    SET STATUS = 'PENDING',
+        ENDED_ON = NULL,
+        ERROR = NULL,
+        ERROR_TYPE = NULL,
+        NEXT_ATTEMPT_ON = NULL
+    WHERE RUN_ID = ?
+    AND ARRAY_CONTAINS(TABLENAME::VARIANT, PARSE_JSON(?))
+    """, params=[run_id, json.dumps(tablenames)]).collect()
+
+def complete_tasks(session, catalog_database, catalog_schema, run_id, outcomes):
+    """Records finished tasks in one UPDATE as SUCCEEDED with their description or FAILED with error and error type.
+
+    outcomes are dicts with TABLENAME, DESCRIPTION, ERROR, ERROR_TYPE and CLUSTER_OF (representative table whose
+    description and embedding a shard table reuses). Failed tasks become due for retry after RETRY_BACKOFF_S
+    doubled per earlier attempt (NEXT_ATTEMPT_ON).
+    """
+
+    if not outcomes:
+        return
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    rows = [{'TABLENAME': o['TABLENAME'],
+             'STATUS': 'FAILED' if o.get('ERROR') is not None else 'SUCCEEDED',
+             'DESCRIPTION': o.get('DESCRIPTION'),
+             'ERROR': o.get('ERROR'),
+             'ERROR_TYPE': o.get('ERROR_TYPE') if o.get('ERROR') is not None else None,
+             'CLUSTER_OF': o.get('CLUSTER_OF')} for o in outcomes]
+    session.sql(f"""
+    UPDATE {tasks_tbl} AS t
+    SET STATUS = s.STATUS,
+        DESCRIPTION = s.DESCRIPTION,
+        ERROR = s.ERROR,
+        ERROR_TYPE = s.ERROR_TYPE,
+        CLUSTER_OF = s.CLUSTER_OF,
+        NEXT_ATTEMPT_ON = IFF(s.STATUS = 'FAILED',
+                              DATEADD('second', LEAST(? * POWER(2, GREATEST(t.ATTEMPTS - 1, 0)), ?), CURRENT_TIMESTAMP()),
+                              NULL),
+        ENDED_ON = CURRENT_TIMESTAMP()
+    FROM (
+        SELECT value:TABLENAME::STRING AS TABLENAME,
+               value:STATUS::STRING AS STATUS,
+               value:DESCRIPTION::STRING AS DESCRIPTION,
+               value:ERROR::STRING AS ERROR,
+               value:ERROR_TYPE::STRING AS ERROR_TYPE,
+               value:CLUSTER_OF::STRING AS CLUSTER_OF
+        FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?)))
+    ) AS s
+    WHERE t.RUN_ID = ?
+    AND t.TABLENAME = s.TABLENAME
+    """, params=[RETRY_BACKOFF_S, MAX_RETRY_BACKOFF_S, json.dumps(rows, ensure_ascii = False), run_id]).collect()
+
+def get_retry_tbls(session, catalog_database, catalog_schema, catalog_table, target_database, target_schema = '',
+                   max_attempts = MAX_ATTEMPTS):
+    """Returns dict of failed tables due for retry in database/schema to their attempts so far.
+
+    A table is due if its latest task FAILED with fewer than max_attempts attempts and its NEXT_ATTEMPT_ON
+    has passed. Catalog rows holding an error as description (written by earlier versions) are due as well
+    until a task of theirs exists.
+    """
+
+    from tables import ERROR_PREFIXES
+
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    prefix = f'{target_database}.{target_schema}.' if target_schema else f'{target_database}.'
+    legacy_errors = ' OR '.join('STARTSWITH(DESCRIPTION, ?)' for _ in ERROR_PREFIXES)
+    query = f"""
+    SELECT TABLENAME, MAX(ATTEMPTS) AS ATTEMPTS
+    FROM (
+        SELECT TABLENAME, ATTEMPTS
+        FROM (
+            SELECT TABLENAME, STATUS, ATTEMPTS, NEXT_ATTEMPT_ON,
+                   ROW_NUMBER() OVER (PARTITION BY TABLENAME
+                                      ORDER BY COALESCE(ENDED_ON, STARTED_ON) DESC NULLS LAST) AS LATEST
+            FROM {tasks_tbl}
+            WHERE STARTSWITH(TABLENAME, ?)
+        )
+        WHERE LATEST = 1
+        AND STATUS = 'FAILED'
+        AND ATTEMPTS < ?
+        AND COALESCE(NEXT_ATTEMPT_ON, CURRENT_TIMESTAMP()) <= CURRENT_TIMESTAMP()
+        UNION ALL
+        SELECT TABLENAME, 0
+        FROM {catalog_database}.{catalog_schema}.{catalog_table}
+        WHERE STARTSWITH(TABLENAME, ?)
+        AND ({legacy_errors})
+        AND TABLENAME NOT IN (SELECT TABLENAME FROM {tasks_tbl}) -- Afterwards governed by its tasks
+    )
+    GROUP BY TABLENAME
+    """
+    rows = session.sql(query, params=[prefix, max_attempts, prefix, *ERROR_PREFIXES]).collect()
+    return {row['TABLENAME']: row['ATTEMPTS'] for row in rows}
+
+def get_run_results(session, catalog_database, catalog_schema, run_id):
+    """Returns Snowpark dataframe of succeeded tasks of run not yet added to catalog with their cluster representative."""
+
+    import snowflake.snowpark.functions as F
+
+    _, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    return session.table(tasks_tbl)\
+                  .filter((F.col('RUN_ID') == run_id) & (F.col('STATUS') == 'SUCCEEDED'))\
+                  .select('TABLENAME', 'DESCRIPTION', 'CLUSTER_OF')
+
+def is_cancel_requested(session, catalog_database, catalog_schema, run_id):
+    """Returns True if run was marked CANCELLING (e.g. from run page) and no new tables should be dispatched."""
+
+    runs_tbl, _ = get_state_tables(catalog_database, catalog_schema)
+    rows = session.sql(f"SELECT STATUS FROM {runs_tbl} WHERE RUN_ID = ?", params=[run_id]).collect()
+    return bool(rows) and rows[0]['STATUS'] == 'CANCELLING'
+
+def exhausted_budget(limits, used):
+    """Returns name of first budget in BUDGETS whose limit is set and reached by used, or None."""
+
+    return next((b for b in BUDGETS if limits.get(b) and used.get(b, 0) >= limits[b]), None)
+
+def finish_run(session, catalog_database, catalog_schema, run_id, comment_statements = None, budget = None):
+    """Marks succeeded tasks as CATALOGED and closes run with final status and comment statement count.
+
+    Runs with tables left PENDING after cancellation are closed as CANCELLED and can be resumed. Runs that
+    left tables PENDING because budget was reached are closed as STOPPED with the budget in STOP_REASON.
+    """
+
+    runs_tbl, tasks_tbl = get_state_tables(catalog_database, catalog_schema)
+    session.sql(f"""
+    UPDATE {tasks_tbl}
+    SET STATUS = 'CATALOGED'
+    WHERE RUN_ID = ?
+    AND STATUS = 'SUCCEEDED'
+    """, params=[run_id]).collect()
+    counts = session.sql(f"""
+    SELECT SUM(IFF(STATUS = 'FAILED', 1, 0)) AS FAILED,
+           SUM(IFF(STATUS = 'PENDING', 1, 0)) AS PENDING
+    FROM {tasks_tbl} WHERE RUN_ID = ?
+    """, params=[run_id]).collect()[0]
+    if counts['PENDING']:
+        status = 'STOPPED' if budget else 'CANCELLED'
+    else:
+        status, budget = 'PARTIAL' if counts['FAILED'] else 'COMPLETED', None
+    session.sql(f"""
+    UPDATE {runs_tbl}
+    SET STATUS = ?,
+        STOP_REASON = ?,
+        COMMENT_STATEMENTS = ?,
+        ENDED_ON = CURRENT_TIMESTAMP()
+    WHERE RUN_ID = ?
+    """, params=[status, budget, comment_statements, run_id]).collect()
+
+def fail_run(session, catalog_database, catalog_schema, run_id, error):
+    """Closes run that raised as FAILED with its error. Unfinished tasks stay as they are and can be resumed."""
+
+    runs_tbl, _ = get_state_tables(catalog_database, catalog_schema)
+    session.sql(f"""
+    UPDATE {runs_tbl}
+    SET STATUS = 'FAILED',
+        ERROR = ?,
+        ENDED_ON = CURRENT_TIMESTAMP()
+    WHERE RUN_ID = ?
+    AND STATUS IN ('RUNNING', 'CANCELLING') -- Finished runs keep their status
+    """, params=[error, run_id]).collect()
+
+def get_metrics_table(catalog_database, catalog_schema):
+    """Returns fully qualified name of crawl metrics table"""
+
+    return f'{catalog_database}.{catalog_schema}.CRAWL_METRICS'
+
+@contextlib.contextmanager
+def span(spans, stage, tablename = None):
+    """Times stage and appends it to spans. BYTES/TOKENS of yielded span may be set inside block."""
+
+    record = {'STAGE': stage, 'TABLENAME': tablename, 'STARTED_ON': time.time(), 'BYTES': None, 'TOKENS': None}
+    try:
+        yield record
+    finally:
+        record['ENDED_ON'] = time.time()
+        spans.append(record)
+
+def set_query_tag(session, run_id, stage):
+    """Tags following statements of session so they can be joined to QUERY_HISTORY by run and stage.
+
+    Only the orchestrator tags: CATALOG_TABLE/CATALOG_BATCH run as caller on its session concurrently,
+    so their statements carry the dispatch stage tag and per table time is recorded as spans.
+    """
+
+    session.query_tag = json.dumps({'app': 'data_catalog', 'run_id': run_id, 'stage': stage})
+
+def write_spans(session, catalog_database, catalog_schema, run_id, spans):
+    """Appends timing spans of run to CRAWL_METRICS in one write."""
+
+    import datetime
+    from snowflake.snowpark.types import StructType, StructField, StringType, TimestampType, LongType
+
+    if not spans:
+        return
+    to_timestamp = lambda s: datetime.datetime.fromtimestamp(s, datetime.timezone.utc).replace(tzinfo = None)
+    schema = StructType([StructField('RUN_ID', StringType()),
+                         StructField('STAGE', StringType()),
+                         StructField('TABLENAME', StringType()),
+                         StructField('STARTED_ON', TimestampType()),
+                         StructField('ENDED_ON', TimestampType()),
+                         StructField('DURATION_MS', LongType()),
+                         StructField('BYTES', LongType()),
+                         StructField('TOKENS', LongType())])
+    rows = [[run_id, s['STAGE'], s['TABLENAME'], to_timestamp(s['STARTED_ON']), to_timestamp(s['ENDED_ON']),
+             round((s['ENDED_ON'] - s['STARTED_ON']) * 1000), s['BYTES'], s['TOKENS']] for s in spans]
+    session.create_dataframe(rows, schema = schema)\
+           .write.save_as_table(table_name = get_metrics_table(catalog_database, catalog_schema),
+                                mode = "append",
+                                column_order = "name")
@@ -0,0 +1,119 @@
+SUMMARY_MODES = ('ddl', 'llm')
+MAX_SUMMARY_BYTES = 4000 # Condensed DDL budget per schema
+MAX_SUMMARY_COLUMNS = 12 # Columns listed per table before falling back to key columns
+KEY_SUFFIXES = ('ID', '_KEY', '_CD', '_CODE', '_NO')
+
+def get_summary_table(catalog_database, catalog_schema):
+    """Returns fully qualified name of schema summary cache table"""
+
+    return f'{catalog_database}.{catalog_schema}.SCHEMA_SUMMARIES'
+
+def schema_fingerprint(table_ddls, mode, model = ''):
+    """Returns SHA-256 of schema's sorted table DDLs and summary mode, so any table or column change misses cache."""
+
+    import hashlib
+
+    payload = '\n'.join([mode, model if mode == 'llm' else ''] + sorted(table_ddls))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def is_key_column(name):
+    """Returns True if column name looks like an identifier or foreign key"""
+
+    return name.upper().endswith(KEY_SUFFIXES)
+
+def condense_ddl(schema_rows, max_bytes = MAX_SUMMARY_BYTES, max_columns = MAX_SUMMARY_COLUMNS):
+    """Returns deterministic condensed DDL of schema: one 'TABLE(col, ..., +rest)' line per table within max_bytes.
+
+    Key-like columns are listed first. Columns per table are halved down to one until the schema fits,
+    then tables beyond max_bytes are counted instead of listed.
+    """
+
+    import json
+
+    tables = []
+    for _, row in schema_rows.sort_values('TABLENAME').iterrows():
+        names = [name for name, _ in json.loads(row['COLUMN_TYPES'])]
+        keys = [n for n in names if is_key_column(n)]
+        tables.append((row['TABLENAME'].split('.')[-1], keys + [n for n in names if n not in keys]))
+    while True:
+        lines = [f"{table}({', '.join(names[:max_columns] + ([f'+{len(names) - max_columns}'] if len(names) > max_columns else []))})"
+                 for table, names in tables]
+        summary = '\n'.join(lines)
+        if len(summary.encode()) <= max_bytes or max_columns == 1:
+            break
+        max_columns = max(max_columns // 2, 1)
+    if len(summary.encode()) <= max_bytes:
+        return summary
+    kept, size = [], 0
+    for line in lines:
+        size += len(line.encode()) + 1
+        if size > max_bytes:
+            break
+        kept.append(line)
+    return '\n'.join(kept + [f'(+{len(lines) - len(kept)} tables)'])
+
+def summarize_with_llm(session, model, condensed):
+    """Returns dict of schema to LLM summary of its entities and keys from one set-based TRY_COMPLETE query.
+
+    Schemas whose completion fails are left out so caller keeps their condensed DDL.
+    """
+
+    import json
+
+    from prompts import schema_prompt
+
+    prompts = [{'SCHEMA_NAME': schema, 'PROMPT': schema_prompt.format(schema = schema, schema_ddl = ddl)}
+               for schema, ddl in condensed.items()]
+    rows = session.sql("""
+    SELECT
+        VALUE:SCHEMA_NAME::STRING AS SCHEMA_NAME,
+        SNOWFLAKE.CORTEX.TRY_COMPLETE(?, VALUE:PROMPT::STRING) AS RESPONSE
+    FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?)))
+    """, params=[model, json.dumps(prompts)]).collect()
+    return {row['SCHEMA_NAME']: str(row['RESPONSE']).strip() for row in rows if row['RESPONSE'] is not None}
+
+def add_schema_summaries(session, catalog_database, catalog_schema, schema_df, mode = 'ddl', model = ''):
+    """Returns schema_df with SCHEMA_SUMMARY column holding one summary per schema, reused across its tables.
+
+    Summaries are cached in SCHEMA_SUMMARIES by schema fingerprint, so unchanged schemas are not
+    summarized again by later runs. Mode 'ddl' uses condensed DDL, 'llm' asks model to summarize
+    condensed DDL into entities and keys. Schemas whose LLM summary fails use condensed DDL, cached
+    under the 'ddl' fingerprint so the next 'llm' run tries them again.
+    """
+
+    import json
+
+    import snowflake.snowpark.functions as F
+
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"schema_summary must be one of {list(SUMMARY_MODES)}.")
+    schemas = {schema: rows for schema, rows in schema_df.groupby('TABLE_SCHEMA')}
+    summary_tbl = get_summary_table(catalog_database, catalog_schema)
+    fingerprints = {schema: schema_fingerprint(rows['TABLE_DDL'], mode, model) for schema, rows in schemas.items()}
+    ddl_fingerprints = {schema: schema_fingerprint(rows['TABLE_DDL'], 'ddl') for schema, rows in schemas.items()}
+    cached = session.sql(f"""
+    SELECT FINGERPRINT, SUMMARY
+    FROM {summary_tbl}
+    WHERE ARRAY_CONTAINS(FINGERPRINT::VARIANT, PARSE_JSON(?))
+    """, params=[json.dumps(list(set(fingerprints.values()) | set(ddl_fingerprints.values())))]).collect()
+    cached = {row['FINGERPRINT']: row['SUMMARY'] for row in cached}
+    summaries = {schema: cached[f] for schema, f in fingerprints.items() if f in cached}
+    missing = {schema: condense_ddl(schemas[schema]) for schema in fingerprints if schema not in summaries}
+    if missing:
+        generated = summarize_with_llm(session, model, missing) if mode == 'llm' else dict(missing)
+        # Curly brackets would break formatting of table samples into prompt later
+        generated = {schema: s.replace('{', '').replace('}', '') for schema, s in generated.items()}
+        rows = [[schema, fingerprints[schema], mode, s] for schema, s in generated.items()]
+        fallbacks = {schema: ddl.replace('{', '').replace('}', '') for schema, ddl in missing.items()
+                     if schema not in generated}
+        rows += [[schema, ddl_fingerprints[schema], 'ddl', ddl] for schema, ddl in fallbacks.items()
+                 if ddl_fingerprints[schema] not in cached]
+        if rows:
+            session.create_dataframe(rows, schema=['SCHEMA_NAME', 'FINGERPRINT', 'MODE', 'SUMMARY'])\
+                   .withColumn('CREATED_ON', F.current_timestamp())\
+                   .write.save_as_table(table_name = summary_tbl,
+                                        mode = "append",
+                                        column_order = "name")
+        summaries.update(generated)
+        summaries.update(fallbacks)
+    return schema_df.assign(SCHEMA_SUMMARY = schema_df['TABLE_SCHEMA'].map(summaries))
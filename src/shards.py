@@ -0,0 +1,63 @@
+import re
+
+SHARD_SUFFIX = re.compile(r'(?:[_\-$]?\d+)+$') # Date/number suffix of shard such as _2024_01 or _20240101
+MIN_CLUSTER_SIZE = 2
+NAME_CHARS = 'A-Za-z0-9_$' # Characters of unquoted identifier; table names only match as whole tokens
+
+def split_shard_name(tablename):
+    """Returns (name pattern, shard suffix) of fully qualified table name, e.g. ('DB.S.EVENTS*', '2024_01').
+
+    Tables without numeric suffix are their own pattern with empty suffix.
+    """
+
+    prefix, _, name = tablename.rpartition('.')
+    match = SHARD_SUFFIX.search(name)
+    if not match or match.start() == 0:
+        return tablename, ''
+    return f'{prefix}.{name[:match.start()]}*', match.group(0).lstrip('_-$')
+
+def shard_key(tablename):
+    """Returns natural sort key of table by numeric parts of its shard suffix, so EVENTS_10 sorts after EVENTS_9"""
+
+    return tuple(int(part) for part in re.findall(r'\d+', split_shard_name(tablename)[1])), tablename
+
+def column_signature(column_types):
+    """Returns SHA-256 of ordered [column name, data type] list (JSON string as in COLUMN_TYPES)"""
+
+    import hashlib
+    import json
+
+    return hashlib.sha256(json.dumps(json.loads(column_types)).encode()).hexdigest()
+
+def cluster_tables(tablenames, schema_df, min_size = MIN_CLUSTER_SIZE):
+    """Returns dict of representative table to list of other tables sharing its name pattern and column signature.
+
+    Only clusters of at least min_size tables are returned. The last table by numeric suffix (usually the
+    latest shard) represents the cluster; tables missing from schema_df are never clustered.
+    """
+
+    column_types = dict(zip(schema_df['TABLENAME'], schema_df['COLUMN_TYPES']))
+    groups = {}
+    for t in tablenames:
+        pattern, suffix = split_shard_name(t)
+        if suffix and t in column_types:
+            groups.setdefault((pattern, column_signature(column_types[t])), []).append(t)
+    clusters = {}
+    for members in groups.values():
+        if len(members) >= min_size:
+            members = sorted(members, key = shard_key)
+            clusters[members[-1]] = members[:-1]
+    return clusters
+
+def variant_description(description, representative, member):
+    """Returns description of representative rewritten for member of its cluster without calling LLM.
+
+    Table name of representative is replaced by member's where it appears as a whole token, otherwise
+    member's suffix is appended. Other digits are left alone since they may be unrelated (counts, years).
+    """
+
+    rep_name, member_name = representative.split('.')[-1], member.split('.')[-1]
+    pattern = re.compile(f'(?<![{NAME_CHARS}]){re.escape(rep_name)}(?![{NAME_CHARS}])')
+    if pattern.search(description):
+        return pattern.sub(lambda _: member_name, description)
+    return f'{description}（{split_shard_name(member)[1]}）'
@@ -0,0 +1,200 @@
+SNAPSHOT_FILES = {'catalog': 'catalog.parquet', 'usage': 'usage.parquet'}
+USAGE_MONTHS = 3
+WATERMARK_FORMAT = 'YYYY-MM-DD HH24:MI:SS.FF3' # Explicit so watermark text does not follow session output format
+
+def get_snapshot_stage(catalog_database, catalog_schema):
+    """Returns fully qualified name of stage holding catalog snapshot files"""
+
+    return f'{catalog_database}.{catalog_schema}.SNAPSHOTS'
+
+def utc_text(expression, unit = None):
+    """Returns SQL of TIMESTAMP_LTZ expression (truncated to unit if given) as UTC text in WATERMARK_FORMAT.
+
+    Independent of session TIMEZONE and TIMESTAMP_OUTPUT_FORMAT, so snapshot procedure and app agree.
+    """
+
+    expression = f"CONVERT_TIMEZONE('UTC', {expression})"
+    if unit:
+        expression = f"DATE_TRUNC('{unit}', {expression})"
+    return f"TO_VARCHAR({expression}, '{WATERMARK_FORMAT}')"
+
+def watermarks_query(catalog_database = 'DATA_CATALOG', catalog_schema = 'TABLE_CATALOG'):
+    """Returns query of cache watermarks as KIND/NAME/WATERMARK rows.
+
+    'tables': MAX(LAST_ALTERED) and table count per database, 'catalog': MAX(CREATED_ON) of catalog per
+    database, 'usage': latest ACCESS_HISTORY time truncated to the hour (UTC). Shared by snapshot and app so
+    both compare identical strings.
+    """
+
+    return f"""
+    SELECT 'tables' AS KIND, TABLE_CATALOG AS NAME,
+           {utc_text('MAX(LAST_ALTERED)')} || '/' || COUNT(*) AS WATERMARK
+    FROM SNOWFLAKE.ACCOUNT_USAGE.TABLES
+    WHERE DELETED IS NULL
+    GROUP BY TABLE_CATALOG
+    UNION ALL
+    SELECT 'catalog', SPLIT_PART(TABLENAME, '.', 1), TO_VARCHAR(MAX(CREATED_ON), '{WATERMARK_FORMAT}') -- TIMESTAMP_NTZ
+    FROM {catalog_database}.{catalog_schema}.TABLE_CATALOG
+    GROUP BY 2
+    UNION ALL
+    SELECT 'usage', NULL, {utc_text('MAX(QUERY_START_TIME)', 'hour')}
+    FROM SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY
+    WHERE QUERY_START_TIME >= DATEADD(day, -1, CURRENT_TIMESTAMP())
+    """
+
+def usage_query(since = None):
+    """Returns query of table accesses per date/hour since ? (or last USAGE_MONTHS months) with ACCESS_HOUR.
+
+    since is a UTC watermark in WATERMARK_FORMAT; ACCESS_HOUR is formatted the same way.
+    """
+
+    start = f"TO_TIMESTAMP_TZ(? || ' +00:00', '{WATERMARK_FORMAT} TZH:TZM')" if since else \
+            f'DATEADD(month, -{USAGE_MONTHS}, CURRENT_TIMESTAMP())'
+    return f"""
+    WITH parsed_objects AS (
+        SELECT
+            query_id,
+            query_start_time,
+            f.value:objectDomain::STRING as obj_domain,
+            f.value:objectName::STRING as obj_name
+        FROM SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY,
+        TABLE(FLATTEN(direct_objects_accessed)) f
+        WHERE QUERY_START_TIME >= {start}
+    )
+    SELECT
+        TO_VARCHAR(DATE(query_start_time), 'YYYY-MM-DD') as ACCESS_DATE,
+        DAYNAME(query_start_time) as DAY_OF_WEEK,
+        HOUR(query_start_time) as HOUR_OF_DAY,
+        obj_name as TABLE_FULL_NAME,
+        COUNT(DISTINCT query_id) as ACCESS_COUNT,
+        {utc_text('MIN(query_start_time)', 'hour')} as ACCESS_HOUR
+    FROM parsed_objects
+    WHERE obj_domain = 'Table'
+    GROUP BY ACCESS_DATE, DAY_OF_WEEK, HOUR_OF_DAY, TABLE_FULL_NAME
+    """
+
+def catalog_query(catalog_database, catalog_schema):
+    """Returns query of table metadata merged with latest catalog description and per database watermarks.
+
+    Watermarks are read in the same statement so a snapshot is never newer than the watermark it records.
+    """
+
+    return f"""
+    WITH watermarks AS ({watermarks_query(catalog_database, catalog_schema)}),
+    descriptions AS (
+        SELECT TABLENAME, DESCRIPTION
+        FROM {catalog_database}.{catalog_schema}.TABLE_CATALOG
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY TABLENAME ORDER BY CREATED_ON DESC) = 1
+    )
+    SELECT t.COMMENT, t.TABLE_CATALOG, t.TABLE_SCHEMA, t.TABLE_NAME, t.TABLE_OWNER, t.ROW_COUNT,
+           d.DESCRIPTION,
+           tw.WATERMARK AS TABLES_WATERMARK,
+           cw.WATERMARK AS CATALOG_WATERMARK
+    FROM SNOWFLAKE.ACCOUNT_USAGE.TABLES t
+    LEFT JOIN descriptions d
+      ON d.TABLENAME = t.TABLE_CATALOG || '.' || t.TABLE_SCHEMA || '.' || t.TABLE_NAME
+    LEFT JOIN watermarks tw ON tw.KIND = 'tables' AND tw.NAME = t.TABLE_CATALOG
+    LEFT JOIN watermarks cw ON cw.KIND = 'catalog' AND cw.NAME = t.TABLE_CATALOG
+    WHERE t.DELETED IS NULL
+    AND t.TABLE_SCHEMA != 'INFORMATION_SCHEMA'
+    """
+
+def write_snapshot(session, catalog_database = 'DATA_CATALOG', catalog_schema = 'TABLE_CATALOG'):
+    """Writes catalog and usage snapshots as single Parquet files to snapshot stage. Returns row counts.
+
+    Usage rows record the usage watermark taken before the scan as USAGE_WATERMARK, so readers
+    fetch only accesses from that hour on.
+    """
+
+    stage = get_snapshot_stage(catalog_database, catalog_schema)
+    usage_watermark = session.sql(f"""
+    SELECT {utc_text('MAX(QUERY_START_TIME)', 'hour')} AS WATERMARK
+    FROM SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY
+    WHERE QUERY_START_TIME >= DATEADD(day, -1, CURRENT_TIMESTAMP())
+    """).collect()[0]['WATERMARK']
+    frames = {'catalog': session.sql(catalog_query(catalog_database, catalog_schema)),
+              'usage': session.sql(f"SELECT *, ? AS USAGE_WATERMARK FROM ({usage_query()})", params=[usage_watermark])}
+    counts = {}
+    for name, df in frames.items():
+        df = df.cache_result() # Row count and file from the same result
+        counts[name] = df.count()
+        df.write.copy_into_location(f'@{stage}/{SNAPSHOT_FILES[name]}',
+                                    file_format_type = 'parquet',
+                                    header = True,
+                                    overwrite = True,
+                                    single = True,
+                                    max_file_size = 5 * 2 ** 30)
+    return {'STAGE': stage, 'ROWS': counts, 'USAGE_WATERMARK': usage_watermark}
+
+# Columns of catalog/usage frames held by the app as categoricals (repeated per table or per access row)
+CATALOG_CATEGORIES = ('TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_OWNER', 'TABLES_WATERMARK', 'CATALOG_WATERMARK')
+USAGE_CATEGORIES = ('access_date', 'day_of_week', 'table_full_name', 'access_hour', 'usage_watermark')
+USAGE_DTYPES = {'hour_of_day': 'int8', 'access_count': 'int32'} # int32 so sums per day/table do not overflow
+
+def full_table_names(catalog):
+    """Returns series of fully qualified table names of catalog frame rows"""
+
+    return (catalog['TABLE_CATALOG'].astype(str) + '.' + catalog['TABLE_SCHEMA'].astype(str) + '.'
+            + catalog['TABLE_NAME'].astype(str))
+
+def table_names(catalog):
+    """Returns index of distinct fully qualified table names of catalog frame, position being TABLE_ID"""
+
+    import pandas as pd
+
+    if catalog.empty:
+        return pd.Index([], dtype = object)
+    return pd.Index(full_table_names(catalog).unique())
+
+def compact_catalog(catalog):
+    """Returns catalog frame with repeated strings as categoricals and int32 TABLE_ID (position in table_names)"""
+
+    if catalog.empty:
+        return catalog
+    catalog = catalog.astype({c: 'category' for c in CATALOG_CATEGORIES if c in catalog.columns})
+    return catalog.assign(TABLE_ID = table_names(catalog).get_indexer(full_table_names(catalog)).astype('int32'))
+
+def compact_usage(usage, names = None):
+    """Returns usage frame with repeated strings as categoricals and downcast counts.
+
+    Column names match case-insensitively so raw snapshot frames can be compacted. With names
+    (table_names of catalog) table_full_name categories start with them, so its codes equal TABLE_ID.
+    """
+
+    dtypes = {}
+    for column in usage.columns:
+        if column.lower() in USAGE_CATEGORIES:
+            dtypes[column] = 'category'
+        elif column.lower() in USAGE_DTYPES:
+            dtypes[column] = USAGE_DTYPES[column.lower()]
+    usage = usage.astype(dtypes)
+    if names is not None and 'table_full_name' in usage.columns:
+        tables = usage['table_full_name'].cat.categories
+        usage['table_full_name'] = usage['table_full_name'].cat.set_categories(
+            names.append(tables[~tables.isin(names)].sort_values()))
+    return usage
+
+def concat_usage(frames):
+    """Returns concatenation of compact usage frames with categoricals kept (pd.concat falls back to object)"""
+
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    if not frames:
+        return pd.DataFrame()
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([f[column] for f in frames], sort_categories = True).categories
+            frames = [f.assign(**{column: f[column].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index = True)
+
+def at_least(values, bound):
+    """Returns boolean mask of values >= bound; categoricals compare each distinct value once"""
+
+    import pandas as pd
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        return values.isin(categories[categories >= bound])
+    return values >= bound
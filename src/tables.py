@@ -1,26 +1,71 @@
-import snowflake.snowpark.functions as F
-import pandas as pd
+# No module-level imports: CATALOG_TABLE imports only what a call uses, on first use
+
+SAMPLE_MAX_VALUE_CHARS = 256 # Max characters kept per string/semi-structured sample value
+SAMPLE_MAX_BYTES = 8192 # Max size of serialized sample rows passed to LLM
+PRIORITY_DAYS = 30 # ACCESS_HISTORY window that orders crawl by recent access frequency
 
 def get_table_comment(tablename, session):
     """Returns current comment on table"""
 
     tbl_context = tablename.split('.')
     tbl, schema = tbl_context[-1], '.'.join(tbl_context[:-1])
-    return session.sql(f"SHOW TABLES LIKE '{tbl}' IN SCHEMA {schema} LIMIT 1").collect()[0]['comment']\
-                  .replace("'", "\\'")
+    return session.sql(f"SHOW TABLES LIKE '{tbl}' IN SCHEMA {schema} LIMIT 1").collect()[0]['comment']
 
-def convert_vec2array(tablename, session):
-    """Converts vector type columns of dataframe to arrays before sampling"""
+def get_column_types(tablename, session):
+    """Returns list of [column name, data type] of table using DESCRIBE.
 
-    import snowflake.snowpark.types as T
+    Only used when caller did not pass column types gathered from INFORMATION_SCHEMA.
+    """
+
+    return [[row['name'], row['type']] for row in session.sql(f"DESCRIBE TABLE {tablename}").collect()]
+
+def quote_identifier(name):
+    """Returns column name as quoted identifier"""
+
+    return '"' + name.replace('"', '""') + '"'
+
+def budget_columns(tablename, session, n, max_value_chars, max_bytes, column_types = None):
+    """Returns table projection with long values truncated and lowest priority columns dropped to fit sample budget.
+
+    Strings and semi-structured values are cut to max_value_chars and vectors to 10 elements.
+    Columns are kept by priority, scalar columns in table order first and semi-structured/binary/vector columns last,
+    until the estimated width of a sampled row exceeds max_bytes / n.
+    column_types is a list of [column name, data type] in table order, as in INFORMATION_SCHEMA.COLUMNS.
+    """
+
+    import snowflake.snowpark.functions as F
+
+    if column_types is None:
+        column_types = get_column_types(tablename, session)
+    row_budget = max_bytes / max(n, 1)
+
+    def truncate(name, data_type):
+        data_type = data_type.split('(')[0].strip().upper()
+        col = F.col(quote_identifier(name))
+        if data_type == 'VECTOR': # VectorType cannot be used in object_construct
+            expr, priority, width = F.array_slice(F.to_array(col), F.lit(0), F.lit(10)), 1, max_value_chars
+        elif data_type in ('TEXT', 'VARCHAR', 'STRING', 'CHAR', 'CHARACTER'):
+            expr, priority, width = F.substring(col, F.lit(1), F.lit(max_value_chars)), 0, max_value_chars
+        elif data_type in ('VARIANT', 'OBJECT', 'ARRAY'):
+            expr = F.iff(F.length(F.to_json(col)) > max_value_chars,
+                         F.to_variant(F.substring(F.to_json(col), F.lit(1), F.lit(max_value_chars))),
+                         F.to_variant(col))
+            priority, width = 1, max_value_chars
+        elif data_type in ('BINARY', 'VARBINARY'):
+            expr, priority, width = F.substring(F.to_varchar(col), F.lit(1), F.lit(max_value_chars)), 1, max_value_chars
+        else:
+            expr, priority, width = col, 0, 24
+        return expr.as_(quote_identifier(name)), priority, width
+
+    projections = [(i, name) + truncate(name, data_type) for i, (name, data_type) in enumerate(column_types)]
+    kept, width = [], 0
+    for i, name, expr, priority, est_width in sorted(projections, key = lambda p: (p[3], p[0])):
+        width += len(name) + est_width + 4 # Key, quotes and separators in serialized object
+        if kept and width > row_budget:
+            break
+        kept.append((i, expr))
+    return session.table(tablename).select([expr for _, expr in sorted(kept, key = lambda k: k[0])])
 
-    df = session.table(tablename)
-    vec_cols = [c.name for c in df.schema.fields if (type(c.datatype) == T.VectorType)]
-    if vec_cols:
-        return df.select([F.array_slice(F.to_array(x), F.lit(0), F.lit(10)).as_(x) if x in vec_cols else x for x in df.columns])
-    else:
-        return df
-    
 def pctg_nonnulls(df):
     """Returns float per row in dataframe indicating proportion of row values non-null/non-empty"""
 
@@ -28,86 +73,107 @@ def pctg_nonnulls(df):
     from _snowflake import vectorized
     return 1 - sum(el in [None, ''] for el in df)/len(df)
 
-def sample_tbl(tablename, sampling_mode, n, session):
-    """Returns n samples of table based on sampling_mode"""
+def sample_tbl(tablename, sampling_mode, n, session,
+               max_value_chars = SAMPLE_MAX_VALUE_CHARS,
+               max_bytes = SAMPLE_MAX_BYTES,
+               column_types = None):
+    """Returns n samples of table based on sampling_mode, serialized within max_bytes"""
 
+    import snowflake.snowpark.functions as F
     from snowflake.snowpark.window import Window
 
-    df = convert_vec2array(tablename, session) # VectorType cannot be used in object_construct
+    df = budget_columns(tablename, session, n, max_value_chars, max_bytes, column_types)
     if sampling_mode == "fast": # Randomly sample
-        samples = df.sample(n = n)\
-            .select(F.to_varchar(F.array_agg(F.object_construct('*'))))\
-            .to_pandas().values[0][0]
+        df = df.sample(n = n)
+        priority = F.lit(0)
     elif sampling_mode == 'nonnull': # Sort by least null and take first n
-        samples = df.withColumn('ROWNUMBER', 
-                            F.row_number().over(Window.partition_by().order_by(F.desc(F.call_udf('PCTG_NONNULL', F.array_construct('*'))))))\
-                .sort(F.col('ROWNUMBER')).drop(F.col('ROW_NUMBER'))\
-                .select(F.to_varchar(F.array_slice(F.array_agg(F.object_construct('*')), F.lit(0), F.lit(n))))\
-                .to_pandas().values[0][0]
+        priority = F.call_udf('PCTG_NONNULL', F.array_construct('*'))
     else:
         raise ValueError("sampling_mode must be one of ['fast' (Default), 'nonnull'].") 
-    return samples.replace("'", "\\'")
 
-def cortex_sql(session, model, prompt, temperature):
-    """Executes CORTEX COMPLETE using SQL in Python API.
+    # Keep ranked rows while serialized total stays within budget (first row always kept)
+    ranked = df.select(F.object_construct('*').as_('SAMPLE'), priority.as_('SAMPLE_PRIORITY'))\
+               .withColumn('SAMPLE_RANK', F.row_number().over(Window.order_by(F.desc('SAMPLE_PRIORITY'))))\
+               .filter(F.col('SAMPLE_RANK') <= n)
+    total_bytes = F.sum(F.length(F.to_json('SAMPLE')) + 1)\
+                   .over(Window.order_by('SAMPLE_RANK').rows_between(Window.UNBOUNDED_PRECEDING, Window.CURRENT_ROW))
+    samples = ranked.withColumn('SAMPLE_BYTES', total_bytes)\
+                    .filter((F.col('SAMPLE_BYTES') <= max_bytes) | (F.col('SAMPLE_RANK') == 1))\
+                    .select(F.to_varchar(F.array_agg('SAMPLE').within_group('SAMPLE_RANK')))\
+                    .collect()[0][0]
+    return samples
+
+def cortex_sql(session, model, prompt, temperature = None):
+    """Executes CORTEX COMPLETE using SQL with model, prompt and temperature bound as parameters.
     
-    Use if temperature passed. Python API does not support temperature.
+    Avoids importing snowflake-ml-python in CATALOG_TABLE and supports temperature.
+    Returns (response, total tokens) as SQL API reports token usage.
     """
+    import json
+
+    options, params = "OBJECT_CONSTRUCT()", [model, prompt] # Options always passed so COMPLETE returns usage
+    if temperature is not None:
+        options = "OBJECT_CONSTRUCT('temperature', ?::FLOAT)"
+        params.append(temperature)
     query = f"""
-    SELECT TRIM(SNOWFLAKE.CORTEX.COMPLETE(
-    '{model}', 
-    [
-        {{
-            'role': 'user',
-            'content': '{prompt}'
-        }}
-    ],
-    {{
-        'temperature': {temperature}
-    }}
-    ):choices[0]:messages) AS RESPONSE
+    SELECT SNOWFLAKE.CORTEX.COMPLETE(
+    ?, 
+    ARRAY_CONSTRUCT(OBJECT_CONSTRUCT('role', 'user', 'content', ?)),
+    {options}
+    ) AS RESPONSE
     """
-    result = session.sql(query).collect()[0][0]
-    return result
+    result = json.loads(session.sql(query, params=params).collect()[0][0])
+    return result['choices'][0]['messages'].strip(), result.get('usage', {}).get('total_tokens')
 
-def run_complete(session, tablename, model, sampling_mode, n, prompt, temperature = None):
-    
-    """Returns (success/failed LLM-generated description) of table given least empty sample records."""
+def fill_prompt(session, tablename, sampling_mode, n, prompt, column_types = None, spans = None):
+    """Returns final prompt of table with sample records filled in. Sample stage is appended to spans."""
 
     import textwrap
-    from snowflake.cortex import Complete
-    from snowflake.snowpark.exceptions import SnowparkSQLException
+    from runs import span
+
+    spans = [] if spans is None else spans
+    # Sample only if template kept {table_samples} placeholder for this stage
+    if '{table_samples}' in prompt:
+        with span(spans, 'sample', tablename) as sample_span:
+            samples = sample_tbl(tablename, sampling_mode, n, session, column_types = column_types)
+            sample_span['BYTES'] = len(samples.encode())
+        prompt = prompt.format(table_samples = samples)
+    return textwrap.dedent(prompt)
 
-    samples = sample_tbl(tablename, sampling_mode, n, session)
+def run_complete(session, tablename, model, sampling_mode, n, prompt, temperature = None, column_types = None, spans = None):
+    
+    """Returns ('success', LLM-generated description) of table given least empty sample records,
+    or (error type, error message) with error type 'sample' or 'complete' if the stage failed.
+
+    Timing of sample and complete stages is appended to spans if passed.
+    """
 
+    from snowflake.snowpark.exceptions import SnowparkSQLException
+    from runs import span
+
+    spans = [] if spans is None else spans
     try:
-        # Escape curly braces for SQL translation to avoid error
-        prompt = textwrap.dedent(prompt.format(table_samples = samples))
-        
-        if isinstance(temperature, float):
-            if temperature > 0 and temperature < 1: 
-                response = cortex_sql(session,
-                                    model,
-                                    prompt,
-                                    temperature)
-            else: # Use default temperature if non-valid temperature passed
-                response = Complete(model, 
-                                    prompt,
-                                    session = session)
-        else:
-            response = Complete(model, 
-                                prompt,
-                                session = session)
-        response = str(response).strip().replace("'", "\\'")
+        prompt = fill_prompt(session, tablename, sampling_mode, n, prompt, column_types, spans)
+    except Exception as e:
+        return ("sample", str(e))
+    try:
+        with span(spans, 'complete', tablename) as complete_span:
+            complete_span['BYTES'] = len(prompt.encode())
+            if not (isinstance(temperature, float) and temperature > 0 and temperature < 1):
+                temperature = None # Use default temperature if none or non-valid temperature passed
+            response, complete_span['TOKENS'] = cortex_sql(session,
+                                                           model,
+                                                           prompt,
+                                                           temperature)
+        response = str(response).strip()
         
         return ("success", response)
     except SnowparkSQLException as e:
         if 'max tokens' in str(e):
-            raise NotImplementedError(f"{e}.\nCortex token counter will be added once available. Try a different model or fewer sample rows.")
-        else:
-            return ("fail", f"""LLM-generation Error Encountered: {e}""")
+            return ("complete", f"{e}.\nCortex token counter will be added once available. Try a different model or fewer sample rows.")
+        return ("complete", str(e))
     except Exception as e:
-        return ("fail", f"""LLM-generation Error Encountered: {e}""")
+        return ("complete", str(e))
     
 def get_crawlable_tbls(session,
                      database,
@@ -147,6 +213,25 @@ def get_crawlable_tbls(session,
     """
     return session.sql(query).to_pandas()['TABLENAME'].values.tolist()
 
+def get_table_access_counts(session, database, schema = '', days = PRIORITY_DAYS):
+    """Returns dict of fully qualified table name to distinct queries accessing it in last days from ACCESS_HISTORY.
+
+    Tables without recent access are missing from the dict.
+    """
+
+    prefix = f'{database}.{schema}.%' if schema else f'{database}.%'
+    query = f"""
+    SELECT f.value:objectName::STRING AS TABLENAME,
+           COUNT(DISTINCT query_id) AS ACCESS_COUNT
+    FROM SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY,
+    TABLE(FLATTEN(direct_objects_accessed)) f
+    WHERE QUERY_START_TIME >= DATEADD(day, -?, CURRENT_TIMESTAMP())
+    AND f.value:objectDomain::STRING = 'Table'
+    AND f.value:objectName::STRING LIKE ?
+    GROUP BY 1
+    """
+    return {row['TABLENAME']: row['ACCESS_COUNT'] for row in session.sql(query, params=[int(days), prefix]).collect()}
+
 def get_unique_context(tablenames):
     """Returns target database and unique set of qualified schema names for crawling context."""
     schemas = {".".join(t.split(".")[:-1]) for t in tablenames}
@@ -154,7 +239,7 @@ def get_unique_context(tablenames):
     return db, schemas
 
 def get_all_tables(session, target_database, target_schemas):
-    """Returns pandas dataframe of [schema, table, table comment, column info]."""
+    """Returns pandas dataframe of [schema, table, table comment, column info, column types]."""
     target_schema_str = ','.join(f"'{t.split('.')[1]}'" for t in target_schemas)
     query = f"""
         WITH T AS 
@@ -176,6 +261,7 @@ def get_all_tables(session, target_database, target_schemas):
             TABLE_SCHEMA
             ,TABLE_CATALOG || '.' || TABLE_SCHEMA || '.' || TABLE_NAME AS TABLENAME
             ,LISTAGG(CONCAT(COLUMN_NAME, ' ', DATA_TYPE, COALESCE(concat(' (', REGEXP_REPLACE(COMMENT, '{{|}}',''), ')'), '')), ', ') as COLUMN_INFO
+            ,ARRAY_AGG(ARRAY_CONSTRUCT(COLUMN_NAME, DATA_TYPE)) WITHIN GROUP (ORDER BY ORDINAL_POSITION) as COLUMN_TYPES
         FROM {target_database}.INFORMATION_SCHEMA.COLUMNS
         WHERE 1=1 
             AND TABLE_SCHEMA <> 'INFORMATION_SCHEMA'
@@ -198,35 +284,115 @@ def add_records_to_catalog(session,
                            new_df,
                            replace_catalog = True):
     
+    import snowflake.snowpark.functions as F
+
     if replace_catalog:
         current_df = session.table(f'{catalog_database}.{catalog_schema}.{catalog_table}')
         _ = current_df.merge(new_df, current_df['TABLENAME'] == new_df['TABLENAME'],
                  [F.when_matched().update({'DESCRIPTION': new_df['DESCRIPTION'],
                                            'CREATED_ON': new_df['CREATED_ON'],
-                                           'EMBEDDINGS': F.call_udf('SNOWFLAKE.CORTEX.EMBED_TEXT_1024',
-                                                                   'multilingual-e5-large',
-                                                                    new_df['DESCRIPTION'])}),
+                                           'EMBEDDINGS': new_df['EMBEDDINGS']}), # Embedded once by caller
                   F.when_not_matched().insert({'TABLENAME': new_df['TABLENAME'],
                                                'DESCRIPTION': new_df['DESCRIPTION'],
                                                'CREATED_ON': new_df['CREATED_ON'],
-                                               'EMBEDDINGS': F.call_udf('SNOWFLAKE.CORTEX.EMBED_TEXT_1024',
-                                                                   'multilingual-e5-large',
-                                                                    new_df['DESCRIPTION'])})])
+                                               'EMBEDDINGS': new_df['EMBEDDINGS']})])
     else:
         new_df.write.save_as_table(table_name = [catalog_database, catalog_schema, catalog_table],
                                 mode = "append",
                                 column_order = "name")
 
+# Errors are recorded in CRAWL_TASKS.ERROR/ERROR_TYPE. Earlier versions wrote them as DESCRIPTION with these
+# prefixes, so catalog rows starting with them are treated as failed (and queued by retry_failed runs)
+ERROR_PREFIXES = ('LLM-generation Error Encountered', 'Error encountered')
+ERROR_TYPES = ('sample', 'complete', 'comment', 'call', 'escalated') # Stage a failed task stopped at
+
+# INFORMATION_SCHEMA.TABLES.TABLE_TYPE to COMMENT object type
+COMMENT_OBJECT_TYPES = {
+    'VIEW': 'VIEW',
+    'MATERIALIZED VIEW': 'MATERIALIZED VIEW',
+    'EXTERNAL TABLE': 'EXTERNAL TABLE',
+}
+
+def get_table_types(session, tablenames):
+    """Returns dict of fully qualified table name to TABLE_TYPE from INFORMATION_SCHEMA."""
+
+    target_database, target_schemas = get_unique_context(tablenames)
+    target_schema_str = ','.join(f"'{t.split('.')[1]}'" for t in target_schemas)
+    query = f"""
+    SELECT
+        TABLE_CATALOG || '.' || TABLE_SCHEMA || '.' || TABLE_NAME AS TABLENAME
+        ,TABLE_TYPE
+    FROM {target_database}.INFORMATION_SCHEMA.tables
+    WHERE TABLE_SCHEMA IN ({target_schema_str})
+    """
+    tablenames = set(tablenames)
+    return {row['TABLENAME']: row['TABLE_TYPE'] for row in session.sql(query).collect()
+            if row['TABLENAME'] in tablenames}
+
+def apply_comments(session, descriptions, dry_run = False, batch_size = 100):
+    """Writes descriptions as object comments in batched statements.
+
+    Returns (number of COMMENT statements, dict of table name to error of comments that failed).
+    descriptions is a dict of fully qualified table name to description.
+    Object types are looked up once so views are commented with ON VIEW directly.
+    Statements are grouped into Snowflake Scripting blocks of batch_size so each batch is one round trip.
+    Each COMMENT has its own exception handler, so a failing table (e.g. not owned by caller) does not stop
+    the rest of its batch; a batch that fails as a whole is retried statement by statement.
+    If dry_run, no statement is executed.
+    """
+
+    import json
+
+    descriptions = {t: d for t, d in descriptions.items() if d and not d.startswith(ERROR_PREFIXES)}
+    if not descriptions:
+        return 0, {}
+    table_types = get_table_types(session, list(descriptions))
+    statements = {}
+    for t, d in descriptions.items():
+        if t in table_types:
+            object_type = COMMENT_OBJECT_TYPES.get(table_types[t], 'TABLE')
+            comment = d.replace("'", "''").replace('$$', '$ $') # Escaped once; $$ delimits the block
+            statements[t] = f"COMMENT IF EXISTS ON {object_type} {t} IS '{comment}';"
+    failed = {}
+    if not dry_run:
+        tablenames = list(statements)
+        for i in range(0, len(tablenames), batch_size):
+            batch = tablenames[i:i + batch_size]
+            block = '\n'.join(f"""BEGIN
+{statements[t]}
+EXCEPTION
+WHEN OTHER THEN
+failed := ARRAY_APPEND(failed, OBJECT_CONSTRUCT('TABLENAME', '{t.replace("'", "''")}', 'ERROR', SQLERRM));
+END;""" for t in batch)
+            try:
+                result = session.sql(f"""EXECUTE IMMEDIATE $$
+DECLARE
+failed ARRAY DEFAULT ARRAY_CONSTRUCT();
+BEGIN
+{block}
+RETURN TO_JSON(failed);
+END;
+$$""").collect()
+                failed.update({f['TABLENAME']: f['ERROR'] for f in json.loads(result[0][0] or '[]')})
+            except Exception: # Block rejected as a whole
+                for t in batch:
+                    try:
+                        session.sql(statements[t]).collect()
+                    except Exception as e:
+                        failed[t] = str(e)
+    return len(statements), failed
+
 def generate_description(session,
                          tablename,
                          prompt,
                          sampling_mode,
                          n,
                          model,
-                         update_comment
+                         update_comment,
+                         column_types = ''
                          ):
     
-    from snowflake.snowpark.exceptions import SnowparkSQLException
+    import json
     
     """
     Catalogs table objects in Snowflake.
@@ -243,33 +409,105 @@ def generate_description(session,
         n (int): Number of records to sample from table. Defaults to 5.
         model (string): Cortex model to generate table descriptions. Defaults to 'mistral-7b'.
         update_comment (bool): If True, update table's current comments. Defaults to False
+        column_types (string, Optional): JSON list of [column name, data type] from INFORMATION_SCHEMA.
+                                         Avoids describing table before sampling when passed.
+
+    Runs as caller, so its statements carry the caller's run level QUERY_TAG; per table timing is returned
+    in SPANS instead of tagging the shared session.
 
     Returns:
-        Dict
+        Dict with TABLENAME, DESCRIPTION, ERROR and ERROR_TYPE (one of ERROR_TYPES) of table
+        and timing spans of sample/complete stages under SPANS. DESCRIPTION is None if table failed.
     """
 
 
-    response = ''
+    response, error, error_type = '', None, None
+    spans = []
     try:
         ctx_response, response = run_complete(session,
                                               tablename,
                                               model, 
                                               sampling_mode,
                                               n,
-                                              prompt)
-        if update_comment and ctx_response == 'success':
+                                              prompt,
+                                              column_types = json.loads(column_types) if column_types else None,
+                                              spans = spans)
+        if ctx_response != 'success':
+            error, error_type = response, ctx_response
+        elif update_comment:
+            _, failed = apply_comments(session, {tablename: response})
+            if tablename in failed:
+                error, error_type = failed[tablename], 'comment'
+    except Exception as e: # Sample and complete failures are typed by run_complete; left are bad call arguments
+        error, error_type = str(e), 'call'
+    return {
+        'TABLENAME': tablename,
+        'DESCRIPTION': None if error is not None else response,
+        'ERROR': error,
+        'ERROR_TYPE': error_type,
+        'SPANS': spans
+        }
+
+def generate_descriptions(session,
+                          tablenames,
+                          prompts,
+                          sampling_mode,
+                          n,
+                          model,
+                          column_types = None
+                          ):
+    
+    """
+    Catalogs batch of table objects in Snowflake in one procedure call.
+
+    Tables are sampled one by one, then all descriptions are generated by a single set-based
+    CORTEX.TRY_COMPLETE query so sandbox start and imports are paid once per batch.
+
+    Args:
+        session (Snowpark session) : ignore parameter
+        tablenames (list): Fully qualified Snowflake table names
+        prompts (list): Prompt of each table in format of f-string to pass to LLM
+        sampling_mode (string): How to retrieve sample data records for table. One of ['fast' (Default), 'nonnull']
+        n (int): Number of records to sample from table. Defaults to 5.
+        model (string): Cortex model to generate table descriptions.
+        column_types (list, Optional): JSON list of [column name, data type] of each table.
+
+    Returns:
+        Dict with TABLENAME/DESCRIPTION/ERROR/ERROR_TYPE of each table under RESULTS and timing spans under SPANS
+    """
+
+    import json
+    from runs import span
+
+    spans = []
+    descriptions, errors, filled = {}, {}, []
+    for i, tablename in enumerate(tablenames):
+        try:
+            types = json.loads(column_types[i]) if column_types and column_types[i] else None
+            filled.append({'TABLENAME': tablename,
+                           'PROMPT': fill_prompt(session, tablename, sampling_mode, n, prompts[i], types, spans)})
+        except Exception as e:
+            errors[tablename] = (str(e), 'sample')
+    if filled:
+        with span(spans, 'complete') as complete_span:
+            complete_span['BYTES'] = sum(len(p['PROMPT'].encode()) for p in filled)
             try:
-                session.sql(f"COMMENT IF EXISTS ON TABLE {tablename} IS '{response}'").collect()
-            except SnowparkSQLException as e:
-                try: # Table may actually be a view
-                    session.sql(f"COMMENT IF EXISTS ON VIEW {tablename} IS '{response}'").collect()
-                except Exception as e:
-                    response = f'Error encountered: {str(e)}'
+                rows = session.sql("""
+                SELECT
+                    VALUE:TABLENAME::STRING AS TABLENAME,
+                    SNOWFLAKE.CORTEX.TRY_COMPLETE(?, VALUE:PROMPT::STRING) AS RESPONSE
+                FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?)))
+                """, params=[model, json.dumps(filled)]).collect()
+                for row in rows:
+                    if row['RESPONSE'] is None:
+                        errors[row['TABLENAME']] = ('TRY_COMPLETE returned NULL', 'complete')
+                    else:
+                        descriptions[row['TABLENAME']] = str(row['RESPONSE']).strip()
             except Exception as e:
-                response = f'Error encountered: {str(e)}'
-    except Exception as e:
-        response = f'Error encountered: {str(e)}'
+                for p in filled:
+                    errors[p['TABLENAME']] = (str(e), 'complete')
     return {
-        'TABLENAME': tablename,
-        'DESCRIPTION': response.replace("\\", "")
+        'RESULTS': [{'TABLENAME': t, 'DESCRIPTION': descriptions.get(t), 'ERROR': errors.get(t, (None, None))[0],
+                     'ERROR_TYPE': errors.get(t, (None, None))[1]} for t in tablenames],
+        'SPANS': spans
         }
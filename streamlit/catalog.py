@@ -1,26 +1,112 @@
 # 既存のインポートに追加
 import streamlit as st
-from snowflake.snowpark.context import get_active_session
-import plotly.express as px
-import re
-import ast
+from query_stats import get_session, show_query_stats
 import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+# plotly と ast は初回描画を速くするため使用する関数内でインポート
 
 # ページ設定：幅広レイアウトを使用
 st.set_page_config(layout="wide")
 
-# 現在のSnowflakeセッションを取得
-session = get_active_session()
+# 現在のSnowflakeセッションを取得（?debug=queries でクエリ統計を表示）
+session = get_session('catalog')
 
 with st.sidebar:
     lang_model = st.radio("使用したい言語モデルを選んでください",
             ("claude-4-opus","claude-4-sonnet","claude-3-7-sonnet","claude-3-5-sonnet","deepseek-r1","gemma-7b","jamba-1.5-mini","jamba-1.5-large","jamba-instruct","llama2-70b-chat","llama3-8b","llama3-70b","llama3.1-8b","llama3.1-70b","llama3.1-405b","llama3.2-1b","llama3.2-3b","llama3.3-70b","llama4-maverick","llama4-scout","mistral-large","mistral-large2","mistral-7b","mixtral-8x7b","openai-gpt-4.1","openai-o4-mini","reka-core","reka-flash","snowflake-arctic","snowflake-llama-3.1-405b","snowflake-llama-3.3-70b"))
 
 
+# キャッシュの上限。鮮度はウォーターマークで判定し、TTLと件数は取りこぼしに対する保険
+WATERMARK_TTL = 60 # 秒。ウォーターマーク自体を確認する間隔
+CACHE_TTL = 3600 # 秒
+CACHE_MAX_ENTRIES = 100
+
+# データベースごとの更新時刻、カタログの追加時刻、利用統計の最新時刻を1ステートメントで取得
+@st.cache_data(ttl=WATERMARK_TTL)
+def get_watermarks():
+    """(種別, データベース名) をキーとするウォーターマークの辞書"""
+    from snapshot import watermarks_query
+
+    try:
+        rows = session.sql(watermarks_query()).collect()
+        return {(row['KIND'], row['NAME']): row['WATERMARK'] for row in rows}
+    except Exception:
+        # ウォーターマークが取れない場合は TTL のみで更新
+        return {}
+
+def catalog_watermark(watermarks, database_name):
+    """テーブル一覧のキャッシュキー（テーブルの更新とカタログへの追加で変化）"""
+    return (watermarks.get(('tables', database_name)), watermarks.get(('catalog', database_name)))
+
+def usage_watermark(watermarks):
+    """利用統計のキャッシュキー（ACCESS_HISTORY の最新時刻を1時間単位で）"""
+    return watermarks.get(('usage', None))
+
+# スナップショット（CATALOG_SNAPSHOT がステージに書き出す Parquet）を起動時に1回だけ読み込む
+@st.cache_data(ttl=CACHE_TTL)
+def get_snapshot():
+    """(テーブル一覧, 利用統計) のスナップショット。未作成の場合は (None, None)"""
+    from snapshot import SNAPSHOT_FILES, get_snapshot_stage, compact_catalog, compact_usage
+
+    try:
+        stage = get_snapshot_stage('DATA_CATALOG', 'TABLE_CATALOG')
+        catalog, usage = (pd.read_parquet(session.file.get_stream(f"@{stage}/{SNAPSHOT_FILES[name]}"))
+                          for name in ('catalog', 'usage'))
+        # 起動中ずっと保持するので、繰り返し現れる文字列はカテゴリ型にして保持
+        return compact_catalog(catalog), compact_usage(usage)
+    except Exception:
+        return None, None
+
+# データベースのテーブル一覧（スナップショット時点からウォーターマークが動いていなければスナップショットを使用）
+def get_catalog_slice(database_name, watermarks):
+    watermark = catalog_watermark(watermarks, database_name)
+    catalog_snapshot, _ = get_snapshot()
+    if catalog_snapshot is not None:
+        rows = catalog_snapshot[catalog_snapshot['TABLE_CATALOG'] == database_name]
+        recorded = (None, None)
+        if not rows.empty:
+            recorded = tuple(None if pd.isna(v) else v for v in rows.iloc[0][['TABLES_WATERMARK', 'CATALOG_WATERMARK']])
+        # ウォーターマークが取れず (None, None) の場合、スナップショットにないデータベースは最新の一覧を取得
+        if not rows.empty and recorded == watermark:
+            return rows[['COMMENT', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'TABLE_OWNER', 'ROW_COUNT']]\
+                .reset_index(drop=True)
+    return get_table_catalog(database_name, watermark)
+
+# スナップショット以降（since の時刻から）の利用統計
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def get_usage_delta(since, watermark):
+    from snapshot import usage_query, compact_usage
+
+    usage_stats = session.sql(usage_query(since), params=[since]).toPandas()
+    usage_stats.columns = usage_stats.columns.str.lower()
+    return compact_usage(usage_stats)
+
+# スナップショットの利用統計に以降の差分だけを追加（スナップショットがない場合は None）
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def get_snapshot_usage(watermark):
+    from snapshot import at_least, concat_usage
+
+    _, usage_snapshot = get_snapshot()
+    if usage_snapshot is None or usage_snapshot.empty or pd.isna(usage_snapshot['USAGE_WATERMARK'].iloc[0]):
+        return None
+    since = usage_snapshot['USAGE_WATERMARK'].iloc[0]
+    usage_stats = usage_snapshot.drop(columns=['USAGE_WATERMARK'])
+    usage_stats.columns = usage_stats.columns.str.lower()
+    if watermark != since:
+        # スナップショットの最終時間帯は途中までなので差分で置き換える
+        usage_stats = concat_usage([usage_stats[~at_least(usage_stats['access_hour'], since)],
+                                    get_usage_delta(since, watermark)])
+    cutoff = (pd.Timestamp.now() - pd.DateOffset(months=3)).strftime('%Y-%m-%d')
+    return usage_stats[at_least(usage_stats['access_date'], cutoff)].drop(columns=['access_hour']).reset_index(drop=True)
+
+# データベースの利用統計（スナップショットがあれば差分更新したものを使用）
+def get_usage_slice(database_name, watermarks):
+    usage_stats = get_snapshot_usage(usage_watermark(watermarks))
+    if usage_stats is None:
+        return get_table_usage_stats(database_name, usage_watermark(watermarks))
+    return usage_stats[usage_stats['table_full_name'].str.startswith(f"{database_name}.")].reset_index(drop=True)
+
 # データベース一覧を取得する関数（キャッシュ付き）
-@st.cache_data
+@st.cache_data(ttl=CACHE_TTL)
 def get_databases():
     try:
         # データベース一覧をSnowflakeから取得
@@ -39,8 +125,11 @@ def get_databases():
         return pd.DataFrame({'DATABASE_NAME': ['<Select>']})
 
 # 全データベースのテーブルカタログを取得する関数（キャッシュ付き）
-@st.cache_data
-def get_all_table_catalogs():
+# ウォーターマークが動いたデータベースのカタログだけを再取得
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def get_all_table_catalogs(watermarks):
+    from snapshot import compact_catalog
+
     try:
         all_catalogs = []
         # '<Select>'を除外したデータベース一覧を取得
@@ -54,20 +143,28 @@ def get_all_table_catalogs():
         for _, row in databases.iterrows():
             database_name = row['DATABASE_NAME']
             # 既存のget_table_catalog関数を使用
-            catalog = get_table_catalog(database_name)
+            catalog = get_catalog_slice(database_name, watermarks)
             if not catalog.empty:
                 all_catalogs.append(catalog)
         
         if all_catalogs:
-            return pd.concat(all_catalogs, ignore_index=True)
+            # TABLE_ID は利用統計の table_full_name のカテゴリ番号と共通
+            return compact_catalog(pd.concat(all_catalogs, ignore_index=True))
         return pd.DataFrame()
     except Exception as e:
         st.error(f"テーブルカタログの取得中にエラーが発生しました: {str(e)}")
         return pd.DataFrame()
 
 # 全データベースの利用統計を取得する関数（キャッシュ付き）
-@st.cache_data
-def get_all_usage_stats():
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def get_all_usage_stats(watermarks):
+    from snapshot import compact_usage, concat_usage, table_names
+
+    # table_full_name のカテゴリ番号をテーブルカタログの TABLE_ID にそろえる（カタログはキャッシュ済み）
+    names = table_names(get_all_table_catalogs(watermarks))
+    usage_stats = get_snapshot_usage(usage_watermark(watermarks))
+    if usage_stats is not None:
+        return compact_usage(usage_stats, names)
     try:
         all_stats = []
         # '<Select>'を除外したデータベース一覧を取得
@@ -81,19 +178,20 @@ def get_all_usage_stats():
         for _, row in databases.iterrows():
             database_name = row['DATABASE_NAME']
             # 既存のget_table_usage_stats関数を使用
-            stats = get_table_usage_stats(database_name)
+            stats = get_table_usage_stats(database_name, usage_watermark(watermarks))
             if not stats.empty:
                 all_stats.append(stats)
         
         if all_stats:
-            return pd.concat(all_stats, ignore_index=True)
+            return compact_usage(concat_usage(all_stats), names)
         return pd.DataFrame()
     except Exception as e:
         st.error(f"利用統計の取得中にエラーが発生しました: {str(e)}")
         return pd.DataFrame()
 
-# テーブルカタログを取得する関数
-def get_table_catalog(databasename):
+# テーブルカタログを取得する関数（キャッシュ付き、watermark が変わると再取得）
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def get_table_catalog(databasename, watermark=None):
     try:
         df = session.sql(f"""
             SELECT DISTINCT 
@@ -112,7 +210,7 @@ def get_table_catalog(databasename):
         return pd.DataFrame()
 
 # テーブルの統計情報を取得する関数（キャッシュ付き）
-@st.cache_data()
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
 def get_table_stats(database_name, schema_name, table_name):
     try:
         stats = session.sql(f"""
@@ -143,7 +241,7 @@ def get_table_stats(database_name, schema_name, table_name):
         return pd.DataFrame()
 
 # テーブルの行数を取得する関数（キャッシュ付き）
-@st.cache_data()
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
 def get_count(tablename):
     try:
         df = session.sql(f"SELECT COUNT(*) as count_rows FROM {tablename}")
@@ -155,19 +253,53 @@ def get_count(tablename):
         return "N/A"
 
 # カラム情報を取得する関数（キャッシュ付き）
-@st.cache_data()
-def get_column_data(databasename, tablename):
+# クロール時に作成した COLUMN_CATALOG を参照し、未登録のテーブルだけ INFORMATION_SCHEMA を参照
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def get_column_data(full_table_name):
     df = session.sql("""
+        SELECT
+            SPLIT_PART(TABLENAME, '.', 3) AS TABLE_NAME,
+            COLUMN_NAME,
+            DESCRIPTION AS COMMENT
+        FROM DATA_CATALOG.TABLE_CATALOG.COLUMN_CATALOG
+        WHERE TABLENAME = ?
+    """, params=[full_table_name]).toPandas()
+    if not df.empty:
+        return df
+    databasename, schemaname, tablename = full_table_name.split('.')
+    df = session.sql(f"""
         select 
             TABLE_NAME, 
             COLUMN_NAME, 
             COMMENT 
-        from """ + databasename + """.information_schema.columns 
-        where table_name = '""" + tablename + "'")
+        from {databasename}.information_schema.columns 
+        where table_schema = ? and table_name = ?""", params=[schemaname, tablename])
     return df.toPandas()
-    
+
+# カラムを検索する関数（COLUMN_CATALOG の埋め込みとの類似度順、キャッシュ付き）
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def search_columns(search_term, limit=20):
+    try:
+        return session.sql(f"""
+            SELECT
+                TABLENAME,
+                COLUMN_NAME,
+                DATA_TYPE,
+                DESCRIPTION,
+                VECTOR_COSINE_SIMILARITY(EMBEDDINGS,
+                    SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', ?)
+                ) AS SIMILARITY
+            FROM DATA_CATALOG.TABLE_CATALOG.COLUMN_CATALOG
+            ORDER BY SIMILARITY DESC
+            LIMIT {int(limit)}
+        """, params=[search_term]).toPandas()
+    except Exception as e:
+        st.error(f"カラムの検索中にエラーが発生しました: {str(e)}")
+        return pd.DataFrame()
 
 def get_response(session, prompt):
+    import ast
+
     # cortex.completeはroleがuserでないと動作しないので注意
     response = session.sql(f'''
     SELECT SNOWFLAKE.CORTEX.COMPLETE('{lang_model}',
@@ -224,10 +356,12 @@ def get_cosine_similarity():
     return search_results
 
 
-# テーブルの利用統計を取得する関数（キャッシュ付き）
-@st.cache_data()
-def get_table_usage_stats(database_name):
+# テーブルの利用統計を取得する関数（キャッシュ付き、watermark が変わると再取得）
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def get_table_usage_stats(database_name, watermark=None):
     """テーブルの詳細な利用統計を取得する関数"""
+    from snapshot import compact_usage
+
     try:
         usage_stats = session.sql(f"""
             WITH parsed_objects AS (
@@ -242,7 +376,7 @@ def get_table_usage_stats(database_name):
                 AND f.value:objectName::STRING LIKE '{database_name}.%'
             )
             SELECT 
-                TO_VARCHAR(DATE(query_start_time)) as ACCESS_DATE,
+                TO_VARCHAR(DATE(query_start_time), 'YYYY-MM-DD') as ACCESS_DATE,
                 DAYNAME(query_start_time) as DAY_OF_WEEK,
                 HOUR(query_start_time) as HOUR_OF_DAY,
                 obj_name as TABLE_FULL_NAME,
@@ -253,9 +387,9 @@ def get_table_usage_stats(database_name):
             ORDER BY ACCESS_DATE
         """).toPandas()
         
-        # 列名を小文字に統一
+        # 列名を小文字に統一し、繰り返し現れる文字列はカテゴリ型に
         usage_stats.columns = usage_stats.columns.str.lower()
-        return usage_stats
+        return compact_usage(usage_stats)
     except Exception as e:
         st.error(f"テーブル利用統計の取得中にエラーが発生しました: {str(e)}")
         # エラー時は空のDataFrameを返す
@@ -283,13 +417,15 @@ def display_usage_analytics(usage_stats, table_name=None):
     if table_name:
         usage_stats = usage_stats[usage_stats['table_full_name'] == table_name]
 
-    # 利用統計の可視化
+    # 利用統計の可視化（plotly はグラフを描画する時だけ読み込む）
+    import plotly.express as px
+
     st.subheader(f"{database_name} の利用統計分析")
     
     col1, col2 = st.columns(2)
     with col1:
         # 日次での利用推移
-        daily_usage = usage_stats.groupby('access_date')['access_count'].sum().reset_index()
+        daily_usage = usage_stats.groupby('access_date', observed=True)['access_count'].sum().reset_index()
         fig_daily = px.line(daily_usage, 
                            x='access_date', 
                            y='access_count',
@@ -299,7 +435,7 @@ def display_usage_analytics(usage_stats, table_name=None):
 
     with col2:
         # 時間帯別の利用傾向
-        hourly_usage = usage_stats.groupby('hour_of_day')['access_count'].sum().reset_index()
+        hourly_usage = usage_stats.groupby('hour_of_day', observed=True)['access_count'].sum().reset_index()
         fig_hourly = px.bar(hourly_usage, 
                            x='hour_of_day', 
                            y='access_count',
@@ -314,7 +450,7 @@ def display_usage_analytics(usage_stats, table_name=None):
     with col3:
         # よく利用されるテーブルのランキング
         if not table_name:  # 全体表示の場合のみ表示
-            table_ranking = usage_stats.groupby('table_full_name')['access_count'].sum() \
+            table_ranking = usage_stats.groupby('table_full_name', observed=True)['access_count'].sum() \
                                      .sort_values(ascending=False).head(10)
             fig_ranking = px.bar(table_ranking,
                                 title='よく利用されるテーブル TOP10',
@@ -370,7 +506,7 @@ def get_popular_tables(usage_stats, table_catalog, limit=5):
     if usage_stats.empty:
         return pd.DataFrame()
     
-    popular_tables = usage_stats.groupby('table_full_name')['access_count'].sum() \
+    popular_tables = usage_stats.groupby('table_full_name', observed=True)['access_count'].sum() \
                               .sort_values(ascending=False) \
                               .head(limit)
     return popular_tables
@@ -439,6 +575,111 @@ def search_tables(table_catalog, search_term):
     ]
     return filtered
 
+# アクセス数のバッジ
+ACCESS_BADGE = """
+<div style='
+    background-color: #eef1f6;
+    padding: 8px 15px;
+    border-radius: 5px;
+    margin: 10px 0;
+    display: inline-block;
+    border: 1px solid #e0e4eb;
+'>
+    <span style='font-size: 0.9em; color: #666;'>👥 過去3ヶ月のアクセス数:</span>
+    <span style='font-size: 1.1em; font-weight: bold; margin-left: 8px; color: #2c3e50;'>{table_access}</span>
+</div>
+"""
+
+# 詳細を表示するテーブルを選択（ボタンのコールバック）
+def select_table(full_table_name):
+    st.session_state.selected_table = full_table_name
+
+# データベース全体の利用統計（フラグメント内の操作はこの部分だけ再実行）
+@st.fragment
+def show_usage_analytics(database_name):
+    with st.expander("データベース全体の利用統計", expanded=False):
+        with st.spinner('利用統計を分析中'):
+            usage_stats = get_usage_slice(database_name, get_watermarks())
+        display_usage_analytics(usage_stats)
+
+# テーブル一覧（「詳細」ボタンは一覧と詳細パネルだけを再実行）
+@st.fragment
+def show_table_grid(database_name):
+    watermarks = get_watermarks()
+    with st.spinner('テーブルデータを分析中'):
+        table_catalog = get_catalog_slice(database_name, watermarks)
+
+    # 4列レイアウトでテーブルを表示
+    st.header("📑 テーブル一覧")
+    columns = st.columns(4)
+    badges = {}
+
+    for index, row in table_catalog.iterrows():
+        with columns[index % 4]:
+            with st.expander("**"+row['TABLE_NAME']+"**", expanded=True):
+                full_table_name = f"{row['TABLE_CATALOG']}.{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}"
+                st.write(row['COMMENT'])
+                # アクセス数は一覧を描画した後に埋める
+                badges[full_table_name] = st.empty()
+                st.button("詳細", key=full_table_name, type="primary", on_click=select_table, args=(full_table_name,))
+
+    # 詳細情報の表示
+    selected_table = st.session_state.get('selected_table')
+    if selected_table and selected_table.startswith(f"{database_name}."):
+        show_table_details(selected_table)
+
+    # 一覧の描画後に利用統計を取得し、テーブルごとのアクセス数を一度に集計
+    usage_stats = get_usage_slice(database_name, watermarks)
+    if not usage_stats.empty:
+        access_counts = usage_stats.groupby('table_full_name', observed=True)['access_count'].sum()
+        for full_table_name, badge in badges.items():
+            badge.markdown(ACCESS_BADGE.format(table_access=access_counts.get(full_table_name, 0)),
+                           unsafe_allow_html=True)
+
+# テーブルの詳細パネル（LLMの分析結果はテーブルとモデルごとにセッションに保持）
+@st.fragment
+def show_table_details(key_details):
+    # 「詳細を閉じる」後のフラグメント再実行では何も表示しない
+    if st.session_state.get('selected_table') != key_details:
+        return
+
+    count_rows = get_count(key_details)
+    table_parts = key_details.split('.')
+    database_name = table_parts[0]
+    schema_name = table_parts[1]
+    table_name = table_parts[2]
+
+    with st.expander(str(key_details) + " の概要", expanded=True):
+        st.success("レコード数 : " + str(count_rows))
+
+        st.info("📊 テーブル統計情報")
+        stats_df = get_table_stats(database_name, schema_name, table_name)
+        if not stats_df.empty:
+            st.dataframe(stats_df, use_container_width=True)
+
+        st.info("テーブル内のカラム名と説明")
+        sql = session.sql(f"select * from {key_details} limit 10")
+        st.dataframe(sql, use_container_width=True)
+
+    with st.expander("LLMを使ったテーブルの詳細分析"):
+        analyses = st.session_state.setdefault('table_analyses', {})
+        if (lang_model, key_details) not in analyses:
+            st.session_state.messages = []
+            column_data = get_column_data(key_details)
+            prompt = get_system_prompt(table_name, column_data)
+            st.session_state.messages.append({"role": 'user', "content": prompt})
+
+            response = get_response(session, st.session_state.messages)
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            analyses[(lang_model, key_details)] = response
+        st.markdown(analyses[(lang_model, key_details)])
+
+    with st.expander("マーケットプレイスで役立ちそうなデータ上位10件"):
+        results = get_cosine_similarity()
+        st.dataframe(results, use_container_width=True)
+
+    st.button("詳細を閉じる", key="close_details", on_click=select_table, args=(None,))
+
 # メインアプリケーション
 st.title("Snowflake データカタログ ❄️")
 st.subheader(f"ようこそ  :blue[{str(st.experimental_user.user_name)}] さん")
@@ -453,88 +694,12 @@ with tab1:
     
     if not '<Select>' in filter_database:
         database_name = filter_database.split(' ')[0].replace('(','').replace(')','')
-        
-        with st.spinner('テーブルデータを分析中'):
-            # 既存のテーブル一覧表示コード...
-            # (以下、既存のコードをそのまま維持)
-            table_catalog = get_table_catalog(database_name)
-            usage_stats = get_table_usage_stats(database_name)
-
-            # 全体の利用統計を表示
-            with st.expander("データベース全体の利用統計", expanded=False):
-                display_usage_analytics(usage_stats)
-            
-            # 4列レイアウトでテーブルを表示
-            st.header("📑 テーブル一覧")
-            col1, col2, col3, col4 = st.columns(4)
-            
-            for index, row in table_catalog.iterrows():
-                current_col = [col1, col2, col3, col4][index % 4]
-                with current_col:
-                    with st.expander("**"+row['TABLE_NAME']+"**", expanded=True):
-                        full_table_name = f"{row['TABLE_CATALOG']}.{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}"
-                        
-                        st.write(row['COMMENT'])
-                        
-                        if not usage_stats.empty:
-                            table_access = usage_stats[
-                                usage_stats['table_full_name'] == full_table_name
-                            ]['access_count'].sum()
-                            
-                            st.markdown(
-                                f"""
-                                <div style='
-                                    background-color: #eef1f6;
-                                    padding: 8px 15px;
-                                    border-radius: 5px;
-                                    margin: 10px 0;
-                                    display: inline-block;
-                                    border: 1px solid #e0e4eb;
-                                '>
-                                    <span style='font-size: 0.9em; color: #666;'>👥 過去3ヶ月のアクセス数:</span>
-                                    <span style='font-size: 1.1em; font-weight: bold; margin-left: 8px; color: #2c3e50;'>{table_access}</span>
-                                </div>
-                                """,
-                                unsafe_allow_html=True
-                            )
-                        
-                        key_details = full_table_name
-                        get_data_details = st.button("詳細", key=key_details, type="primary")
-                        
-                # 詳細情報の表示
-                if get_data_details:
-                    st.session_state.messages = []
-                    
-                    count_rows = get_count(key_details)
-                    table_parts = key_details.split('.')
-                    database_name = table_parts[0]
-                    schema_name = table_parts[1]
-                    table_name = table_parts[2]
-
-                    with st.expander(str(key_details) + " の概要", expanded=True):
-                        st.success("レコード数 : " + str(count_rows))
-
-                        st.info("📊 テーブル統計情報")
-                        stats_df = get_table_stats(database_name, schema_name, table_name)
-                        if not stats_df.empty:
-                            st.dataframe(stats_df, use_container_width=True)
-
-                        st.info("テーブル内のカラム名と説明")
-                        sql = session.sql(f"select * from {key_details} limit 10")
-                        st.dataframe(sql, use_container_width=True)
 
-                    with st.expander("LLMを使ったテーブルの詳細分析"):
-                        column_data = get_column_data(database_name, table_name)
-                        prompt = get_system_prompt(table_name, column_data)
-                        st.session_state.messages.append({"role": 'user', "content": prompt})
-
-                        response = get_response(session, st.session_state.messages)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
-                        st.markdown(response)
-
-                    with st.expander("マーケットプレイスで役立ちそうなデータ上位10件"):
-                        results = get_cosine_similarity()
-                        st.dataframe(results, use_container_width=True)
+        # 利用統計はテーブル一覧の描画後に読み込み、一覧の上に表示
+        usage_container = st.container()
+        show_table_grid(database_name)
+        with usage_container:
+            show_usage_analytics(database_name)
 
 with tab2:
     st.markdown("### キーワードからデータを探す")
@@ -570,8 +735,9 @@ with tab2:
     
     with st.spinner('テーブルデータを分析中...'):
         # 全データベースからテーブル情報を取得
-        table_catalog = get_all_table_catalogs()
-        usage_stats = get_all_usage_stats()
+        watermarks = get_watermarks()
+        table_catalog = get_all_table_catalogs(watermarks)
+        usage_stats = get_all_usage_stats(watermarks)
         
         # 検索結果とフィルタリング結果の統合
         filtered_catalog = table_catalog
@@ -582,22 +748,33 @@ with tab2:
         
         if len(filtered_catalog) > 0:
             st.markdown(f"### 検索結果: {len(filtered_catalog)}件のテーブルが見つかりました")
+
+            # テーブルごとのアクセス数を一度に集計（table_full_name のカテゴリ番号 = TABLE_ID）
+            if not usage_stats.empty:
+                access_counts = usage_stats.groupby(usage_stats['table_full_name'].cat.codes)['access_count'].sum()
             
             # テーブル一覧の表示
             for _, row in filtered_catalog.iterrows():
                 with st.expander(f"**{row['TABLE_CATALOG']}.{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}**", expanded=False):
                     st.write(row['COMMENT'])
-                    full_table_name = f"{row['TABLE_CATALOG']}.{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}"
                     
                     if not usage_stats.empty:
-                        table_access = usage_stats[
-                            usage_stats['table_full_name'] == full_table_name
-                        ]['access_count'].sum()
+                        table_access = access_counts.get(row['TABLE_ID'], 0)
                         st.metric("👥 過去3ヶ月のアクセス数", table_access)
                     
         else:
             st.info("条件に一致するテーブルが見つかりませんでした。")
+
+        # カラム単位の検索結果（クロール時に作成したカラムの説明と埋め込みを使用）
+        if search_term:
+            column_results = search_columns(search_term)
+            if not column_results.empty:
+                st.markdown("### カラムの検索結果")
+                st.dataframe(column_results, use_container_width=True, hide_index=True)
         
         # おすすめのテーブル表示
         if not search_term and not selected_purposes:
             display_recommended_tables(table_catalog, usage_stats)
+
+# クエリ統計（debug=queries 指定時のみ）
+show_query_stats(session)
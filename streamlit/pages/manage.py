@@ -1,69 +1,152 @@
 import pandas as pd
 import streamlit as st
 import time
-import snowflake.snowpark.functions as F
 
-from snowflake.snowpark.context import get_active_session
+from query_stats import get_session, show_query_stats
 
-# Get the current credentials
-session = get_active_session()
+# Get the current credentials (query stats shown in sidebar with ?debug=queries)
+session = get_session('manage')
 
 # ページ設定
 st.set_page_config(layout="wide", page_title="データカタログ", page_icon="🧮")
 st.title("作成したメタデータの管理")
 st.subheader("テーブルの説明を並べ替えて更新する")
 
-def get_dataset(table, columns=None):
-    df = session.table(table)
-    if columns:
-        return df.select(columns)
-    else:
-        return df
-
-def filter_embeddings(question):
-    cmd = """
-        WITH results AS (
-            SELECT 
-                TABLENAME, 
-                DESCRIPTION, 
-                CREATED_ON, 
-                EMBEDDINGS, 
-                VECTOR_COSINE_SIMILARITY(TABLE_CATALOG.EMBEDDINGS,
-                    SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', ?)
-                ) AS similarity
-            FROM TABLE_CATALOG
-            ORDER BY similarity DESC
-        )
-        SELECT TABLENAME, DESCRIPTION, CREATED_ON 
-        FROM results
+def get_changes(page, edited):
+    """編集前のページと比較し、説明が変更された行（TABLENAME, DESCRIPTION）だけを返す"""
+    changed = edited['DESCRIPTION'].fillna('') != page['DESCRIPTION'].fillna('')
+    return edited.loc[changed, ['TABLENAME', 'DESCRIPTION']]
+
+def save_changes(changes):
     """
-    
-    ordered_results = session.sql(cmd, params=[question])      
-    return ordered_results
+    変更行だけを一時テーブルにアップロードし、1回の MERGE で説明と埋め込みを更新
+    Args:
+        changes: get_changes の結果
+    Returns:
+        str: 更新件数と所要時間のメッセージ
+    """
+    start = time.perf_counter()
+    session.create_dataframe(changes).write.save_as_table("MANAGE_EDITS", mode="overwrite", table_type="temporary")
+    # 埋め込みは変更行に対してだけ、MERGE の中でまとめて計算
+    result = session.sql("""
+        MERGE INTO TABLE_CATALOG t
+        USING (
+            SELECT
+                TABLENAME,
+                DESCRIPTION,
+                SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', DESCRIPTION) AS EMBEDDINGS
+            FROM MANAGE_EDITS
+        ) e
+        ON t.TABLENAME = e.TABLENAME
+        WHEN MATCHED THEN UPDATE SET
+            DESCRIPTION = e.DESCRIPTION,
+            EMBEDDINGS = e.EMBEDDINGS,
+            CREATED_ON = CURRENT_TIMESTAMP()
+    """).collect()
+    updated = result[0][0] if result else 0
+    return f"{updated}件のテーブルの説明を更新しました（{len(changes)}行をアップロード、{time.perf_counter() - start:.1f} 秒）"
+
+# 前回の保存結果（保存後の再実行で表示）
+if 'manage_saved' in st.session_state:
+    st.success(st.session_state.pop('manage_saved'))
+
+# 1ページあたりの件数（EMBEDDINGS は取得せず、TABLENAME のキーセットでサーバー側でページング）
+PAGE_SIZE = 50
 
-descriptions_dataset = get_dataset("TABLE_CATALOG")
+def get_filter(text_filter):
+    """テーブル名・説明の絞り込み条件（サーバー側）とバインド変数"""
+    if not text_filter:
+        return "", []
+    return "WHERE (TABLENAME ILIKE ? OR DESCRIPTION ILIKE ?)", [f"%{text_filter}%"] * 2
+
+def count_rows(text_filter):
+    """絞り込み後の件数（再実行ごとに1回だけ実行）"""
+    where, params = get_filter(text_filter)
+    return session.sql(f"SELECT COUNT(*) AS N FROM TABLE_CATALOG {where}", params=params).collect()[0]['N']
+
+def get_page(text_filter, question, cursor):
+    """
+    cursor（前ページ最終行のソートキー）の次から1ページ分を取得
+    Args:
+        text_filter: テーブル名・説明の絞り込み文字列
+        question: 指定した場合は説明の埋め込みとの類似度順（SIMILARITY, TABLENAME）、なければ TABLENAME 順
+        cursor: 前ページ最終行の (TABLENAME,) または (SIMILARITY, TABLENAME)。先頭ページは None
+    Returns:
+        pandas.DataFrame: TABLENAME, DESCRIPTION, CREATED_ON（類似度順の場合は SIMILARITY も）
+    """
+    where, params = get_filter(text_filter)
+    if question:
+        after = ""
+        if cursor:
+            after = "WHERE SIMILARITY < ? OR (SIMILARITY = ? AND TABLENAME > ?)"
+            params = params + [cursor[0], cursor[0], cursor[1]]
+        query = f"""
+            WITH results AS (
+                SELECT
+                    TABLENAME,
+                    DESCRIPTION,
+                    CREATED_ON,
+                    VECTOR_COSINE_SIMILARITY(TABLE_CATALOG.EMBEDDINGS,
+                        SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', ?)
+                    ) AS SIMILARITY
+                FROM TABLE_CATALOG
+                {where}
+            )
+            SELECT TABLENAME, DESCRIPTION, CREATED_ON, SIMILARITY
+            FROM results
+            {after}
+            ORDER BY SIMILARITY DESC, TABLENAME
+            LIMIT {PAGE_SIZE}
+        """
+        return session.sql(query, params=[question] + params).to_pandas()
+    if cursor:
+        where = (where + " AND" if where else "WHERE") + " TABLENAME > ?"
+        params = params + [cursor[0]]
+    query = f"""
+        SELECT TABLENAME, DESCRIPTION, CREATED_ON
+        FROM TABLE_CATALOG
+        {where}
+        ORDER BY TABLENAME
+        LIMIT {PAGE_SIZE}
+    """
+    return session.sql(query, params=params).to_pandas()
 
 # テキスト入力（検索）
 text_search = st.text_input(
     label="",
     placeholder="データの内容に応じてテーブルを並べ替える",
-    value=""
+    value="",
+    key="text_search"
 )
+text_filter = st.text_input(
+    label="",
+    placeholder="テーブル名・説明で絞り込む",
+    value="",
+    key="text_filter"
+)
+
+# 検索条件が変わったら先頭ページに戻る（cursors は各ページ先頭のカーソル）
+if st.session_state.get('manage_query') != (text_search, text_filter):
+    st.session_state.manage_query = (text_search, text_filter)
+    st.session_state.manage_cursors = [None]
+cursors = st.session_state.manage_cursors
 
-if text_search and descriptions_dataset.count() > 0:
-    descriptions_dataset = filter_embeddings(text_search)
-    
+total_rows = count_rows(text_filter)
+page = get_page(text_filter, text_search, cursors[-1]) if total_rows > 0 else pd.DataFrame()
 
 with st.form("data_editor_form"):
     st.caption("説明を編集したい場合は手動で編集が可能です")
 
-    if descriptions_dataset.count() == 0:
+    if total_rows == 0 and text_filter:
+        st.write("条件に一致するテーブルがありません。")
+        submit_disabled = True
+    elif total_rows == 0:
         st.write("テーブルがカタログに登録されていません。**run** ページに移動してカタログを作成してください。")
         submit_disabled = True
     else:
-        # データエディタでテーブルを編集
+        # データエディタでテーブルを編集（表示中のページのみ）
         edited = st.data_editor(
-            descriptions_dataset,
+            page,
             use_container_width=True,
             disabled=['TABLENAME', 'CREATED_ON'],
             hide_index=True,
@@ -95,33 +178,30 @@ with st.form("data_editor_form"):
     # 送信ボタン
     submit_button = st.form_submit_button("送信", disabled=submit_disabled)
 
-# 「送信」クリック時の処理
-if submit_button:
-    try:
-        new_df = session.create_dataframe(edited)
-        current_df = get_dataset("TABLE_CATALOG")
-        _ = current_df.merge(
-            new_df,
-            (current_df['TABLENAME'] == new_df['TABLENAME']) &
-            (current_df['DESCRIPTION'] != new_df['DESCRIPTION']),
-            [
-                F.when_matched().update({
-                    'DESCRIPTION': new_df['DESCRIPTION'],
-                    'EMBEDDINGS': F.call_udf(
-                        'SNOWFLAKE.CORTEX.EMBED_TEXT_1024',
-                        'multilingual-e5-large',
-                        F.col('DESCRIPTION')
-                    ),
-                    'CREATED_ON': F.current_timestamp()
-                })
-            ]
-        )
+# ページ送り（次ページは表示中の最終行をカーソルにする。コールバックなので再実行は1回）
+n_pages = max(1, -(-total_rows // PAGE_SIZE))
+col_prev, col_page, col_next = st.columns([1, 2, 1])
+col_prev.button("◀ 前へ", disabled=len(cursors) == 1, on_click=cursors.pop)
+col_page.caption(f"ページ {len(cursors)} / {n_pages}（{total_rows:,} 件）")
+if len(cursors) < n_pages and len(page) == PAGE_SIZE:
+    last = page.iloc[-1]
+    next_cursor = (float(last['SIMILARITY']), last['TABLENAME']) if text_search else (last['TABLENAME'],)
+    col_next.button("次へ ▶", on_click=cursors.append, args=(next_cursor,))
+else:
+    col_next.button("次へ ▶", disabled=True)
 
-        st.success("テーブルが更新されました。")
-        time.sleep(5)
-    except:
-        st.warning("テーブルの更新中にエラーが発生しました。")
+show_query_stats(session)
 
-    # 成功メッセージを 5 秒間表示し、Snowflake 上の最新情報を反映するために再読み込み
-    # st.experimental_rerun() # v1.38.0から廃止
-    st.rerun() # v1.38.0以降
\ No newline at end of file
+# 「送信」クリック時の処理
+if submit_button:
+    changes = get_changes(page, edited)
+    if changes.empty:
+        st.info("変更はありません。")
+    else:
+        try:
+            st.session_state.manage_saved = save_changes(changes)
+        except Exception as e:
+            st.warning(f"テーブルの更新中にエラーが発生しました: {e}")
+        else:
+            # Snowflake 上の最新情報を反映するために再読み込み（結果は再実行後に表示）
+            st.rerun()
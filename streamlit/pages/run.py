@@ -1,13 +1,14 @@
 # 必要なライブラリのインポート
 import time  # 時間操作用
+import uuid  # 実行ID生成用
 import streamlit as st  # WebUI作成用
 import pandas as pd  # データフレーム操作用
 from snowflake.cortex import Complete  # Snowflake Cortex LLM機能
 from snowflake.snowpark.exceptions import SnowparkSQLException  # Snowflake例外処理
-from snowflake.snowpark.context import get_active_session  # Snowflakeセッション管理
+from query_stats import get_session, show_query_stats  # Snowflakeセッション管理とクエリ統計
 
-# 現在のセッションを取得
-session = get_active_session()
+# 現在のセッションを取得（?debug=queries でクエリ統計を表示）
+session = get_session('run')
 
 # 利用可能なLLMモデルのリスト定義
 models = [
@@ -90,6 +91,242 @@ def get_schemas(session):
     else:
         return []
 
+def get_recent_runs(session):
+    """
+    直近のクロール実行を取得
+    Args:
+        session: Snowflakeセッション
+    Returns:
+        DataFrame: 実行ID、対象、状態、開始日時
+    """
+    query = """
+    SELECT RUN_ID, TARGET_DATABASE, TARGET_SCHEMA, STATUS, STARTED_ON
+    FROM DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS
+    ORDER BY STARTED_ON DESC
+    LIMIT 10
+    """
+    return session.sql(query).to_pandas()
+
+def get_run_progress(session, run_id):
+    """
+    クロール実行の状態とテーブルの状態別件数を1回のクエリで取得
+    Args:
+        session: Snowflakeセッション
+        run_id: クロール実行ID
+    Returns:
+        tuple: (実行の状態, {テーブルの状態: 件数}, 実行のエラー)。実行が未登録の場合は (None, {}, None)
+    """
+    query = """
+    SELECT r.STATUS AS RUN_STATUS, r.ERROR AS RUN_ERROR, t.STATUS, COUNT(t.TABLENAME) AS TABLES
+    FROM DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS r
+    LEFT JOIN DATA_CATALOG.TABLE_CATALOG.CRAWL_TASKS t ON r.RUN_ID = t.RUN_ID
+    WHERE r.RUN_ID = ?
+    GROUP BY r.STATUS, r.ERROR, t.STATUS
+    """
+    rows = session.sql(query, params=[run_id]).collect()
+    if not rows:
+        return None, {}, None
+    return rows[0]['RUN_STATUS'], {row['STATUS']: row['TABLES'] for row in rows if row['STATUS']}, rows[0]['RUN_ERROR']
+
+def get_job_error(job):
+    """
+    非同期で送信したDATA_CATALOG呼び出しのエラーを取得（結果は終了後に1回だけ取得）
+    Args:
+        job: 非同期で送信したDATA_CATALOG呼び出し
+    Returns:
+        str: 実行中の場合はNone、正常終了の場合は空文字、失敗した場合はエラー内容
+    """
+    if 'run_job_error' not in st.session_state:
+        if not job.is_done():
+            return None
+        try:
+            job.result()
+            st.session_state['run_job_error'] = ''
+        except Exception as e:
+            st.session_state['run_job_error'] = str(e)
+    return st.session_state['run_job_error']
+
+def get_finished_tasks(session, run_id, since):
+    """
+    前回の取得以降に完了したテーブルのみを取得
+    Args:
+        session: Snowflakeセッション
+        run_id: クロール実行ID
+        since: 前回取得した最新の完了日時
+    Returns:
+        DataFrame: テーブル名、状態、説明、エラー、完了日時
+    """
+    query = """
+    SELECT TABLENAME, STATUS, DESCRIPTION, ERROR, ENDED_ON
+    FROM DATA_CATALOG.TABLE_CATALOG.CRAWL_TASKS
+    WHERE RUN_ID = ?
+    AND STATUS IN ('SUCCEEDED', 'CATALOGED', 'FAILED')
+    AND ENDED_ON >= ?
+    ORDER BY ENDED_ON
+    """
+    return session.sql(query, params=[run_id, since]).to_pandas()
+
+def cancel_run(session, run_id):
+    """
+    クロール実行の中止を要求（実行中のテーブルは完了まで処理され、未処理のテーブルは再開可能なまま残ります）
+    Args:
+        session: Snowflakeセッション
+        run_id: クロール実行ID
+    """
+    session.sql("""
+    UPDATE DATA_CATALOG.TABLE_CATALOG.CRAWL_RUNS
+    SET STATUS = 'CANCELLING'
+    WHERE RUN_ID = ? AND STATUS = 'RUNNING'
+    """, params=[run_id]).collect()
+
+def watch_run(run_id, job = None):
+    """
+    進捗表示の対象とするクロール実行を設定
+    Args:
+        run_id: クロール実行ID
+        job: 非同期で送信したDATA_CATALOG呼び出し（このブラウザセッションから開始した場合）
+    """
+    st.session_state['run_id'] = run_id
+    st.session_state['run_job'] = job
+    st.session_state.pop('run_job_error', None)
+    st.session_state['run_active'] = True
+    st.session_state['run_results'] = {}
+    st.session_state['run_since'] = '1970-01-01'
+
+def show_progress(run_id):
+    """
+    クロール実行の進捗と完了したテーブルの説明を表示（実行中は定期的に再実行されるフラグメント）
+    Args:
+        run_id: クロール実行ID
+    """
+    job = st.session_state.get('run_job')
+    run_status, counts, run_error = get_run_progress(session, run_id)
+    if run_status is None:
+        # DATA_CATALOGが実行を登録する前、またはクロール対象がなく終了した場合
+        if job is not None and job.is_done():
+            try:
+                st.info(job.result()[0]['TABLENAME'])
+            except Exception as e:
+                st.warning(f"説明の生成中にエラーが発生しました。エラー: {str(e)}")
+            finish_watch()
+        else:
+            st.info("クロールを開始しています...")
+        return
+
+    # 前回以降に完了したテーブルのみ取得して結果に追加
+    finished = get_finished_tasks(session, run_id, st.session_state['run_since'])
+    if not finished.empty:
+        st.session_state['run_since'] = str(finished['ENDED_ON'].max())
+        for row in finished.itertuples():
+            st.session_state['run_results'][row.TABLENAME] = {
+                'TABLENAME': row.TABLENAME,
+                'STATUS': '失敗' if row.STATUS == 'FAILED' else '完了',
+                'DESCRIPTION': row.ERROR if row.STATUS == 'FAILED' else row.DESCRIPTION,
+            }
+
+    total = sum(counts.values())
+    failed = counts.get('FAILED', 0)
+    done = counts.get('SUCCEEDED', 0) + counts.get('CATALOGED', 0) + failed
+    st.progress(done / total if total else 0.0,
+                text = f"{done} / {total} テーブル完了（失敗 {failed}）・状態: {run_status}")
+    if run_status == 'RUNNING':
+        if st.button("中止", help = "新しいテーブルの送信を停止します。未処理のテーブルは後で再開できます。"):
+            cancel_run(session, run_id)
+            st.toast("中止を要求しました。実行中のテーブルの完了を待っています。")
+
+    st.dataframe(pd.DataFrame(list(st.session_state['run_results'].values()),
+                              columns=['TABLENAME', 'STATUS', 'DESCRIPTION']),
+                use_container_width=True,
+                hide_index = True,
+                column_config={
+    "TABLENAME": st.column_config.Column(
+        "テーブル名",
+        help="Snowflakeテーブル名",
+        width=None,
+        required=True,
+    ),
+    "STATUS": st.column_config.Column(
+        "状態",
+        width="small",
+    ),
+    "DESCRIPTION": st.column_config.Column(
+        "テーブル説明",
+        help="LLMが生成したテーブルの説明",
+        width="large",
+        required=True,
+    )                   
+    })
+
+    # 呼び出しが実行の終了を記録できずに失敗した場合も、呼び出しの終了をもって監視を終える
+    job_error = get_job_error(job) if job is not None else None
+    if run_status not in ('RUNNING', 'CANCELLING') or job_error is not None:
+        if job_error or run_status == 'FAILED':
+            st.error(f"クロール中にエラーが発生しました。未処理のテーブルは resume_run_id => '{run_id}' で再開できます。エラー: {job_error or run_error}")
+        elif run_status == 'CANCELLED':
+            st.caption(f"未処理のテーブルは resume_run_id => '{run_id}' で再開できます。")
+        elif run_status == 'STOPPED':
+            st.caption(f"予算に達したため停止しました。未処理のテーブルは次回の実行、または resume_run_id => '{run_id}' で処理できます。")
+        elif failed:
+            st.caption("失敗したテーブルは「失敗したテーブルのみ再試行する」（retry_failed => TRUE）で再試行できます。")
+        st.write("説明を更新するには**manage**ページを参照してください。")
+        show_run_metrics(session, run_id)
+        finish_watch()
+
+def finish_watch():
+    """実行の終了後、定期的な再実行を止めるためにページ全体を再実行"""
+    if st.session_state.get('run_active'):
+        st.session_state['run_active'] = False
+        st.rerun()
+
+def get_run_metrics(session, run_id):
+    """
+    クロール実行のステージ別処理時間をCRAWL_METRICSから集計
+    Args:
+        session: Snowflakeセッション
+        run_id: クロール実行ID
+    Returns:
+        DataFrame: ステージごとのスパン数、合計時間、経過時間、バイト数、トークン数
+    """
+    query = """
+    SELECT
+        STAGE,
+        COUNT(*) AS SPANS,
+        SUM(DURATION_MS) / 1000 AS TOTAL_SECONDS,
+        DATEDIFF('millisecond', MIN(STARTED_ON), MAX(ENDED_ON)) / 1000 AS WALL_SECONDS,
+        SUM(BYTES) AS BYTES,
+        SUM(TOKENS) AS TOKENS
+    FROM DATA_CATALOG.TABLE_CATALOG.CRAWL_METRICS
+    WHERE RUN_ID = ?
+    GROUP BY STAGE
+    ORDER BY MIN(STARTED_ON)
+    """
+    return session.sql(query, params=[run_id]).to_pandas()
+
+def show_run_metrics(session, run_id):
+    """
+    クロール実行のステージ別内訳を表示
+    Args:
+        session: Snowflakeセッション
+        run_id: クロール実行ID
+    """
+    metrics_df = get_run_metrics(session, run_id)
+    if metrics_df.empty:
+        return
+    with st.expander("ステージ別の処理時間"):
+        st.caption(f"実行ID: {run_id}（QUERY_HISTORYのQUERY_TAGで各ステートメントと結合できます）")
+        st.bar_chart(metrics_df, x = 'STAGE', y = 'TOTAL_SECONDS')
+        st.dataframe(metrics_df,
+                     use_container_width=True,
+                     hide_index = True,
+                     column_config={
+                         "STAGE": "ステージ",
+                         "SPANS": "回数",
+                         "TOTAL_SECONDS": "合計時間（秒）",
+                         "WALL_SECONDS": "経過時間（秒）",
+                         "BYTES": "バイト数",
+                         "TOKENS": "トークン数",
+                     })
+
 def specify_tables(session):
     """
     テーブル選択UIコンポーネントの生成
@@ -156,6 +393,54 @@ with p_col3:
                                 models,
                                 placeholder="mistral-7b",
                                 help = "テーブル説明の生成に使用するLLMを選択してください。")
+column_catalog = st.checkbox("カラムの説明も生成する",
+                             value = True,
+                             help = "テーブルごとに1回のLLM呼び出しで全カラムを説明し、カラム検索用の COLUMN_CATALOG に保存します。")
+retry_failed = st.checkbox("失敗したテーブルのみ再試行する",
+                           value = False,
+                           help = "過去のクロールで説明の生成に失敗したテーブルのうち、再試行の待ち時間が過ぎ、試行回数が上限（3回）未満のものだけを処理します。")
+cluster_shards = st.checkbox("シャードテーブルをまとめて説明する",
+                             value = True,
+                             help = "EVENTS_2024_01 のように名前の末尾の数字だけが異なり、カラム構成が同じテーブルは最新のテーブルだけをLLMで説明し、他のテーブルはその説明と埋め込みを再利用します。")
+# 小さいテーブルは軽量なLLMで説明し、不確か・長すぎる説明のみ上で選択したLLMで再生成
+r_col1, r_col2 = st.columns(2)
+with r_col1:
+    small_model = st.selectbox("小さいテーブル用のLLM",
+                               [''] + models,
+                               format_func = lambda m: m or "使用しない",
+                               help = "カラム数が少ないテーブルをこのLLMで説明します。選択結果は CRAWL_ROUTES に記録されます。")
+with r_col2:
+    small_max_columns = st.number_input("小さいテーブルの最大カラム数",
+                                        min_value = 1,
+                                        max_value = 1000,
+                                        value = 20,
+                                        step = 1,
+                                        format = '%i',
+                                        disabled = not small_model)
+# よく参照されるテーブルから順に説明し、予算に達したら残りを次回の実行に回す
+with st.expander("実行の予算（オプション）"):
+    st.caption("ACCESS_HISTORY で直近によく参照されているテーブルから順に処理します。0は無制限です。")
+    b_col1, b_col2, b_col3 = st.columns(3)
+    with b_col1:
+        max_tables = st.number_input("最大テーブル数",
+                                     min_value = 0,
+                                     value = 0,
+                                     step = 100,
+                                     format = '%i')
+    with b_col2:
+        max_prompt_tokens = st.number_input("最大プロンプトトークン数",
+                                            min_value = 0,
+                                            value = 0,
+                                            step = 100000,
+                                            format = '%i',
+                                            help = "送信したプロンプトのサイズから見積もり、LLMが使用量を返した場合はその値で置き換えます。")
+    with b_col3:
+        max_runtime_s = st.number_input("最大実行時間（秒）",
+                                        min_value = 0,
+                                        value = 0,
+                                        step = 600,
+                                        format = '%i',
+                                        help = "経過後は新しいテーブルを送信せず、処理中のテーブルの完了を待って終了します。")
 
 # 実行ボタンとプロセス処理
 submit_button = st.button("実行",
@@ -164,7 +449,7 @@ submit_button = st.button("実行",
 if submit_button:
     # モデル利用可能性チェック
     with st.status('モデル利用可能性を確認中') as status:
-        model_available = test_complete(session, model)
+        model_available = test_complete(session, model) and (not small_model or test_complete(session, small_model))
         if model_available:
             status.update(
             label="OK", state="complete", expanded=True
@@ -174,44 +459,54 @@ if submit_button:
             label="このリージョンではモデルが利用できません。別のモデルを選択してください。", state="error", expanded=False
             )
     if model_available:    
-        # データクロールと説明生成プロセス
-        with st.spinner('データをクロールし説明を生成中'):
-            if not st.session_state['schema']:
-                st.session_state['schema'] = ''
-            try:
-                query = f"""
-                CALL DATA_CATALOG(target_database => '{st.session_state["db"]}',
-                                        catalog_database => 'DATA_CATALOG',
-                                        catalog_schema => 'TABLE_CATALOG',
-                                        catalog_table => 'TABLE_CATALOG',
-                                        target_schema => '{st.session_state["schema"]}',
-                                        include_tables => {st.session_state["include_tables"]},
-                                        exclude_tables => {st.session_state["exclude_tables"]},
-                                        sampling_mode => '{sampling_mode}', 
-                                        n => {int(n)},
-                                        model => '{model}'
-                                        )
-                """
-                # 結果の表示
-                df = session.sql(query)
-                st.dataframe(df,
-                            use_container_width=True,
-                            hide_index = True,
-                            column_order=['TABLENAME', 'DESCRIPTION'],
-                            column_config={
-                "TABLENAME": st.column_config.Column(
-                    "テーブル名",
-                    help="Snowflakeテーブル名",
-                    width=None,
-                    required=True,
-                ),
-                "DESCRIPTION": st.column_config.Column(
-                    "テーブル説明",
-                    help="LLMが生成したテーブルの説明",
-                    width="large",
-                    required=True,
-                )                   
-                })
-                st.write("説明を更新するには**manage**ページを参照してください。")
-            except Exception as e:
-                st.warning(f"説明の生成中にエラーが発生しました。エラー: {str(e)}")
+        # データクロールと説明生成を非同期で開始し、実行IDで進捗を追跡
+        if not st.session_state['schema']:
+            st.session_state['schema'] = ''
+        try:
+            run_id = str(uuid.uuid4())
+            query = f"""
+            CALL DATA_CATALOG(target_database => '{st.session_state["db"]}',
+                                    catalog_database => 'DATA_CATALOG',
+                                    catalog_schema => 'TABLE_CATALOG',
+                                    catalog_table => 'TABLE_CATALOG',
+                                    target_schema => '{st.session_state["schema"]}',
+                                    include_tables => {st.session_state["include_tables"]},
+                                    exclude_tables => {st.session_state["exclude_tables"]},
+                                    sampling_mode => '{sampling_mode}', 
+                                    n => {int(n)},
+                                    model => '{model}',
+                                    column_catalog => {column_catalog},
+                                    cluster_shards => {cluster_shards},
+                                    small_model => '{small_model}',
+                                    small_max_columns => {int(small_max_columns)},
+                                    retry_failed => {retry_failed},
+                                    max_tables => {int(max_tables)},
+                                    max_prompt_tokens => {int(max_prompt_tokens)},
+                                    max_runtime_s => {int(max_runtime_s)},
+                                    run_id => '{run_id}'
+                                    )
+            """
+            watch_run(run_id, session.sql(query).collect_nowait())
+        except Exception as e:
+            st.warning(f"クロールの開始中にエラーが発生しました。エラー: {str(e)}")
+
+# 実行中または過去のクロールに再接続（ブラウザを閉じても実行は継続します）
+with st.expander("実行中・過去のクロールを表示"):
+    recent_runs = get_recent_runs(session)
+    if recent_runs.empty:
+        st.caption("クロールの実行履歴がありません。")
+    else:
+        selected_run = st.selectbox("実行ID",
+                                    options = recent_runs['RUN_ID'],
+                                    format_func = lambda x: " / ".join(str(v) for v in recent_runs[recent_runs.RUN_ID == x]
+                                                                       [['STARTED_ON', 'TARGET_DATABASE', 'TARGET_SCHEMA', 'STATUS']]
+                                                                       .iloc[0] if v))
+        if st.button("進捗を表示"):
+            watch_run(selected_run)
+
+if st.session_state.get('run_id'):
+    # 実行中は5秒ごとに進捗部分のみ再実行
+    st.fragment(show_progress, run_every = 5 if st.session_state.get('run_active') else None)(st.session_state['run_id'])
+
+# クエリ統計（debug=queries 指定時のみ）
+show_query_stats(session)
@@ -0,0 +1,166 @@
+# Streamlit ページごとのクエリ往復回数の計測（オプトイン）
+# URL に ?debug=queries を付けるとサイドバーに再実行ごとの集計を表示します。
+import time # streamlit はオフラインベンチマークからも予算を確認できるよう関数内でインポート
+
+# 1回の再実行あたりの上限（statements: ステートメント数、rows: 取得行数、seconds: 合計時間）
+PAGE_BUDGETS = {
+    'catalog': {'statements': 15, 'rows': 200000, 'seconds': 30},
+    'manage': {'statements': 5, 'rows': 50000, 'seconds': 10},
+    'run': {'statements': 10, 'rows': 10000, 'seconds': 600},
+}
+
+# 計測対象のDataFrameアクション
+ACTIONS = ('collect', 'collect_nowait', 'to_pandas', 'toPandas', 'count', 'first')
+
+
+class QueryBudgetExceeded(Exception):
+    """ページの再実行がクエリ予算を超えた場合に送出"""
+
+
+class QueryStats:
+    """再実行ごとの sql()/table()/アクション呼び出しの記録"""
+
+    def __init__(self, page):
+        self.page = page
+        self.calls = [] # (種別, 対象, 取得行数, 秒)
+        self.history = None # Snowpark の QueryHistory（利用可能な場合）
+
+    @property
+    def statements(self):
+        """送信したステートメント数（QueryHistory があればDataFrame経由以外も含む）"""
+        if self.history is not None:
+            return len(self.history.queries)
+        return sum(1 for kind, _, _, _ in self.calls if kind in ACTIONS)
+
+    @property
+    def rows(self):
+        return sum(rows for _, _, rows, _ in self.calls)
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, _, _, seconds in self.calls)
+
+    def totals(self):
+        return {'statements': self.statements, 'rows': self.rows, 'seconds': round(self.seconds, 3)}
+
+
+def fetched_rows(result):
+    """アクション結果の取得行数"""
+    if result is None:
+        return 0
+    if hasattr(result, '__len__'):
+        return len(result)
+    return 1 # count() や非同期ジョブ
+
+
+class CountingSession:
+    """Snowpark セッションをラップし、sql()/table() とDataFrameアクションの回数・行数・時間を記録"""
+
+    def __init__(self, session, stats):
+        self._session = session
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def _timed(self, kind, label, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            rows = 0 if kind in ('sql', 'table', 'collect_nowait') else fetched_rows(result)
+            self.stats.calls.append((kind, label, rows, time.perf_counter() - start))
+            return result
+        return wrapper
+
+    def _track(self, df, label):
+        """返されたDataFrameのアクションを計測対象にする"""
+        for action in ACTIONS:
+            if hasattr(df, action):
+                setattr(df, action, self._timed(action, label, getattr(df, action)))
+        return df
+
+    def sql(self, query, *args, **kwargs):
+        label = ' '.join(query.split())[:80]
+        return self._track(self._timed('sql', label, self._session.sql)(query, *args, **kwargs), label)
+
+    def table(self, name, *args, **kwargs):
+        label = name if isinstance(name, str) else '.'.join(name)
+        return self._track(self._timed('table', label, self._session.table)(name, *args, **kwargs), label)
+
+
+def debug_enabled():
+    """URL パラメータ debug=queries で計測を有効化"""
+    import streamlit as st
+
+    try:
+        return st.query_params.get('debug') == 'queries'
+    except Exception:
+        return False
+
+
+def get_session(page, session = None):
+    """
+    ページ用のセッションを取得（計測が有効な場合は CountingSession）
+    Args:
+        page: PAGE_BUDGETS のページ名
+        session: ラップするセッション（省略時は get_active_session()）
+    Returns:
+        Snowpark セッション または CountingSession
+    """
+    import streamlit as st
+
+    if session is None:
+        from snowflake.snowpark.context import get_active_session
+        session = get_active_session()
+    if not debug_enabled():
+        return session
+
+    # 前回の再実行のリスナーを外してから新しい集計を開始
+    previous = st.session_state.pop(f'query_stats_{page}', None)
+    if previous is not None and previous.history is not None:
+        previous.history.__exit__(None, None, None)
+    stats = QueryStats(page)
+    if hasattr(session, 'query_history'):
+        stats.history = session.query_history() # DataFrame以外（st.dataframe内部など）のステートメントも記録
+    st.session_state[f'query_stats_{page}'] = stats
+    return CountingSession(session, stats)
+
+
+def check_budget(stats, budget = None):
+    """
+    集計が予算内か確認
+    Args:
+        stats: QueryStats
+        budget: 上限の辞書（省略時は PAGE_BUDGETS[stats.page]）
+    Raises:
+        QueryBudgetExceeded: いずれかの上限を超えた場合
+    """
+    budget = PAGE_BUDGETS.get(stats.page, {}) if budget is None else budget
+    totals = stats.totals()
+    exceeded = {k: (totals[k], limit) for k, limit in budget.items() if totals[k] > limit}
+    if exceeded:
+        details = ', '.join(f'{k}={value} (上限 {limit})' for k, (value, limit) in exceeded.items())
+        raise QueryBudgetExceeded(f'{stats.page}: {details}')
+
+
+def show_query_stats(session):
+    """計測が有効な場合、再実行ごとの集計をサイドバーに表示"""
+    if not isinstance(session, CountingSession):
+        return
+    import pandas as pd
+    import streamlit as st
+
+    stats = session.stats
+    with st.sidebar.expander("🐞 クエリ統計", expanded=True):
+        totals = stats.totals()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("ステートメント", totals['statements'])
+        c2.metric("取得行数", f"{totals['rows']:,}")
+        c3.metric("時間（秒）", totals['seconds'])
+        try:
+            check_budget(stats)
+        except QueryBudgetExceeded as e:
+            st.warning(f"クエリ予算を超えています: {e}")
+        st.dataframe(pd.DataFrame(stats.calls, columns=['種別', '対象', '行数', '秒']),
+                     use_container_width=True,
+                     hide_index=True)